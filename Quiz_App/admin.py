@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import Category, Question, Answer
+from django.contrib.admin.views.main import ORDER_VAR
+from django.db import transaction
+from .forms import BaseAnswerFormSet
+from .models import Category, Question, Answer, Attempt
+from . import search
+from .signals import questions_bulk_changed
 
 
 # To make the admin interface more user-friendly, we can customize how models are displayed.
@@ -10,9 +15,16 @@ class AnswerInline(admin.TabularInline):
     This is more efficient than managing Questions and Answers separately.
     """
     model = Answer
+    # Allows one correct answer and saves a change of correct answer safely.
+    formset = BaseAnswerFormSet
     extra = 3 # Provides 3 empty slots for new answers by default.
     fields = ('answer_text', 'is_correct')
 
+    def get_queryset(self, request):
+        # Each inline row prints its answer, which shows the question text.
+        return super().get_queryset(request).select_related('question')
+
+
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     """
@@ -22,11 +34,25 @@ class QuestionAdmin(admin.ModelAdmin):
     list_display = ('question_text', 'category', 'marks', 'created_at')
     # Adds a filter sidebar to filter questions by category.
     list_filter = ('category',)
-    # Adds a search bar to search by question text.
+    # Adds a search bar to search by question text, answers and category.
+    # The lookups go through the full-text index, see get_search_results().
     search_fields = ('question_text', 'category__name')
     # Integrates the inline Answer editor into the Question detail page.
     inlines = [AnswerInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Match through the search index instead of LIKE '%...%' scans, best
+        match first unless a column is sorted.
+        """
+        if not search_term:
+            return queryset, False
+        results = search.ranked(queryset, search_term)
+        if not request.GET.get(ORDER_VAR):
+            results = results.order_by('search_rank', '-pk')
+        return results, False
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     """
@@ -38,7 +64,53 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
-# Note: We don't need to register the Answer model separately
-# because it is already managed through the QuestionAdmin via AnswerInline.
-# If you wanted to manage Answers independently, you would use:
-# admin.site.register(Answer)
+@admin.register(Attempt)
+class AttemptAdmin(admin.ModelAdmin):
+    """
+    Read-only admin view for stored quiz attempts.
+    """
+    list_display = ('user', 'category', 'score', 'total_marks', 'finished_at')
+    list_filter = ('category',)
+    # Avoids one query per row for the user and category columns.
+    list_select_related = ('user', 'category')
+    date_hierarchy = 'finished_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Answer)
+class AnswerAdmin(admin.ModelAdmin):
+    """
+    Read-only list of every answer. Answers are edited through the
+    QuestionAdmin via AnswerInline.
+    """
+    list_display = ('answer_text', 'question', 'category', 'is_correct')
+    list_filter = ('is_correct', 'question__category')
+    search_fields = ('answer_text',)
+    # One query for the page, question and category included.
+    list_select_related = ('question', 'question__category')
+
+    @admin.display(ordering='question__category__name')
+    def category(self, obj):
+        return obj.question.category
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_queryset(self, request, queryset):
+        # A queryset delete leaves the derived data to questions_bulk_changed.
+        rows = list(queryset.values_list('question_id', 'question__category_id'))
+        with transaction.atomic():
+            super().delete_queryset(request, queryset)
+            questions_bulk_changed.send(
+                sender=Answer,
+                category_ids=sorted({category_id for _, category_id in rows}),
+                question_ids=sorted({question_id for question_id, _ in rows}),
+            )
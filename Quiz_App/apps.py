@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class QuizAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Quiz_App'
+
+    def ready(self):
+        # Connect signal handlers that keep cached data in sync.
+        from . import signals  # noqa: F401
+        # Register the deployment checks.
+        from . import checks  # noqa: F401
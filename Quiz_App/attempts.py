@@ -0,0 +1,46 @@
+"""
+Persisting finished quiz attempts.
+
+A finished quiz is written as one Attempt row plus a single bulk insert of
+its AttemptAnswer rows, inside one transaction. If the transaction loses
+the race for the database write lock it is run again (see retry.py).
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Attempt, AttemptAnswer
+from .retry import retry_on_busy
+
+
+@retry_on_busy
+@transaction.atomic
+def record_attempt(user, category_id, graded, total_marks, started_at=None, nonce=None):
+    """
+    Store a finished attempt.
+
+    ``graded`` is a sequence of scoring.GradedAnswer, one per question served
+    (skipped questions included). ``nonce`` identifies the submission; an
+    attempt with the same nonce raises IntegrityError. Returns the new
+    Attempt.
+    """
+    attempt = Attempt.objects.create(
+        user=user,
+        category_id=category_id,
+        score=sum(g.marks_awarded for g in graded),
+        total_marks=total_marks,
+        total_questions=len(graded),
+        started_at=started_at,
+        finished_at=timezone.now(),
+        nonce=nonce,
+    )
+    AttemptAnswer.objects.bulk_create([
+        AttemptAnswer(
+            attempt=attempt,
+            question_id=g.question_id,
+            answer_id=g.answer_id,
+            is_correct=g.is_correct,
+            marks_awarded=g.marks_awarded,
+        )
+        for g in graded
+    ])
+    return attempt
@@ -0,0 +1,379 @@
+"""
+Reproducible load test of the candidate quiz flow.
+
+``seed_banks()`` creates synthetic question banks ("Benchmark 10", "Benchmark
+1000", ...) through the bulk importer, from a seeded generator, so the same
+sizes and seed always produce the same questions. Re-seeding skips banks
+that are already complete.
+
+``run()`` then drives many simulated candidates at once. Each one registers,
+logs out and back in, opens the home page, takes a quiz in every benchmark
+category answering each question at random, and opens the results page.
+Every request is timed and, where the server reports it, its query count is
+recorded. The run is summarised per step (p50/p95/p99 latency, queries per
+request, errors) and overall (requests per second).
+
+Candidates talk to the site either over HTTP (``HttpSession``, against a
+running server) or in-process through the Django test client
+(``ClientSession``, against the configured database). Over HTTP the query
+count comes from the X-Quiz-Queries header, so start the server with
+QUIZ_PROFILING=1 and DEBUG (or QUIZ_PROFILING_HEADERS) on to get it.
+
+``compare()`` checks a report against a stored baseline. Latencies and
+throughput depend on the machine (with 20 candidates on one CPU, register
+and login are dominated by 20 queued PBKDF2 password hashes), so only the
+machine-independent part of a default run is checked in, as
+QUERY_BASELINE_PATH: queries per request for each step. ``manage.py
+benchmark`` compares against that by default; latency comparisons need a
+full report saved on the same machine with ``--save-baseline --baseline``.
+"""
+import http.cookiejar
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .importer import QuestionRecord, import_questions
+from .metrics import percentile
+from .models import Category
+
+CATEGORY_PREFIX = 'Benchmark'
+DEFAULT_SIZES = (10, 1000, 100000)
+# Larger banks are drawn from rather than taken whole, as a real host would.
+DRAW_COUNT = 20
+PASSWORD = 'Bench-mark-Passw0rd!'
+
+# The checked-in baseline: queries per request of a default run.
+QUERY_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_queries.json')
+
+# Default regression thresholds for compare().
+LATENCY_TOLERANCE = 0.25
+THROUGHPUT_TOLERANCE = 0.25
+QUERY_TOLERANCE = 0.5
+# Percentiles of fewer requests than this are too noisy to compare.
+MIN_SAMPLES = 20
+
+_WORDS = (
+    'amplitude', 'balance', 'bandwidth', 'buffer', 'channel', 'chorus', 'clipping', 'compressor',
+    'condenser', 'crossover', 'decibel', 'delay', 'diffusion', 'distortion', 'dither', 'driver',
+    'dynamic', 'echo', 'envelope', 'equaliser', 'expander', 'fader', 'feedback', 'filter', 'flanger',
+    'frequency', 'gain', 'gate', 'harmonic', 'headroom', 'impedance', 'latency', 'limiter', 'loudness',
+    'masking', 'microphone', 'mixer', 'monitor', 'noise', 'octave', 'oscillator', 'overtone', 'panning',
+    'phase', 'pitch', 'plosive', 'preamp', 'quantisation', 'ratio', 'release', 'resonance', 'reverb',
+    'sample', 'sidechain', 'signal', 'spectrum', 'speaker', 'stereo', 'sustain', 'threshold', 'timbre',
+    'tremolo', 'transient', 'vibrato', 'voltage', 'waveform', 'wavelength', 'attack', 'bus', 'cable',
+)
+_STEMS = (
+    'Which statement about {} and {} is correct?',
+    'What happens to {} when the {} is increased?',
+    'How does {} relate to {} in a typical studio?',
+    'Which device controls {} before the {} stage?',
+    'Why is {} measured alongside {}?',
+)
+_ANSWER_ID = re.compile(r'name="answer" value="(\d+)"')
+
+
+def category_name(size):
+    return f'{CATEGORY_PREFIX} {size}'
+
+
+def _size(name):
+    size = name.rsplit(' ', 1)[-1]
+    return int(size) if size.isdigit() else 0
+
+
+def synthetic_records(category, count, seed=0):
+    """
+    Yield ``count`` QuestionRecords for ``category``, the same ones for the
+    same arguments. Questions are random enough not to be near-duplicates
+    of each other and have four answers, one correct, worth 1 to 3 marks.
+    """
+    rng = random.Random(f'{category}:{seed}')
+    for n in range(1, count + 1):
+        words = rng.sample(_WORDS, 6)
+        text = f'{rng.choice(_STEMS).format(words[0], words[1])} ({words[2]}, {words[3]} #{n})'
+        answers = ((f'{words[4]} {words[0]} {n}', True),) + tuple(
+            (f'{rng.choice(_WORDS)} {rng.choice(_WORDS)} {n}.{k}', False) for k in range(3)
+        )
+        answers = list(answers)
+        rng.shuffle(answers)
+        yield QuestionRecord(category, text, rng.randint(1, 3), tuple(answers), f'synthetic {n}')
+
+
+def seed_banks(sizes=DEFAULT_SIZES, seed=0, progress=None):
+    """
+    Create one benchmark category per size, filled with synthetic questions.
+    Returns {category name: number of questions created}.
+    """
+    created = {}
+    for size in sizes:
+        name = category_name(size)
+        category, _ = Category.objects.get_or_create(name=name)
+        have = category.questions.count()
+        if have >= size:
+            created[name] = 0
+            continue
+        result = import_questions(synthetic_records(name, size, seed), create_categories=False, progress=progress)
+        created[name] = result.created
+        draw_count = DRAW_COUNT if size > DRAW_COUNT else None
+        if category.draw_count != draw_count:
+            Category.objects.filter(pk=category.pk).update(draw_count=draw_count)
+    return created
+
+
+def benchmark_categories():
+    """(id, name) of every seeded benchmark category, smallest first."""
+    rows = Category.objects.filter(name__startswith=f'{CATEGORY_PREFIX} ').values_list('id', 'name')
+    return sorted(rows, key=lambda row: _size(row[1]))
+
+
+# --- Sessions ---
+
+class Response:
+    __slots__ = ('status', 'body', 'location', 'elapsed', 'queries')
+
+    def __init__(self, status, body, location, elapsed, queries):
+        self.status = status
+        self.body = body
+        self.location = location
+        self.elapsed = elapsed
+        self.queries = queries
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """One simulated browser against a running server. Redirects are not followed."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect,
+        )
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        headers = {}
+        body = None
+        if method == 'POST':
+            data = dict(data or {}, csrfmiddlewaretoken=self._csrf_token())
+            body = urllib.parse.urlencode(data).encode()
+            headers = {'Content-Type': 'application/x-www-form-urlencoded', 'Referer': url}
+        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                status, content, resp_headers = resp.status, resp.read(), resp.headers
+        except urllib.error.HTTPError as exc:
+            status, content, resp_headers = exc.code, exc.read(), exc.headers
+        elapsed = time.perf_counter() - started
+        queries = resp_headers.get('X-Quiz-Queries')
+        return Response(
+            status, content.decode('utf-8', 'replace'), resp_headers.get('Location'), elapsed,
+            int(queries) if queries is not None else None,
+        )
+
+
+class ClientSession:
+    """One simulated browser using the Django test client in this process."""
+
+    def __init__(self):
+        # Outside the test runner 'testserver' is not an allowed host.
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        self.client = Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+
+    def request(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            if method == 'POST':
+                resp = self.client.post(path, data or {})
+            else:
+                resp = self.client.get(path)
+            elapsed = time.perf_counter() - started
+        body = b''.join(resp.streaming_content) if resp.streaming else resp.content
+        return Response(resp.status_code, body.decode('utf-8', 'replace'), resp.get('Location'), elapsed,
+                        len(ctx.captured_queries))
+
+
+# --- The scenario ---
+
+class BenchmarkError(Exception):
+    """A simulated candidate got a response it could not continue from."""
+
+
+class Recorder:
+    """Thread-safe collection of (step, elapsed, queries, ok) samples."""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, step, response, ok):
+        with self._lock:
+            self.samples.append((step, response.elapsed, response.queries, ok))
+
+
+def _expect(recorder, step, response, *statuses):
+    ok = response.status in statuses
+    recorder.add(step, response, ok)
+    if not ok:
+        raise BenchmarkError(f'{step}: expected {statuses}, got {response.status}')
+    return response
+
+
+def candidate(session, recorder, username, categories, rng):
+    """Walk one candidate through the whole flow."""
+    _expect(recorder, 'register_form', session.request('GET', reverse('register')), 200)
+    _expect(recorder, 'register', session.request('POST', reverse('register'), {
+        'username': username, 'email': f'{username}@example.com',
+        'password1': PASSWORD, 'password2': PASSWORD,
+    }), 302)
+    _expect(recorder, 'logout', session.request('GET', reverse('logout')), 302)
+    _expect(recorder, 'login_form', session.request('GET', reverse('login')), 200)
+    _expect(recorder, 'login', session.request('POST', reverse('login'), {
+        'username': username, 'password': PASSWORD,
+    }), 302)
+    _expect(recorder, 'home', session.request('GET', reverse('home')), 200)
+
+    for category_id, _ in categories:
+        quiz_url = reverse('quiz', args=[category_id])
+        while True:
+            page = _expect(recorder, 'quiz', session.request('GET', quiz_url), 200, 302)
+            if page.status == 302:
+                break
+            choices = _ANSWER_ID.findall(page.body)
+            if not choices:
+                raise BenchmarkError(f'quiz: no answers on {quiz_url}')
+            _expect(recorder, 'answer', session.request('POST', quiz_url, {'answer': rng.choice(choices)}), 302)
+        _expect(recorder, 'results', session.request('GET', reverse('results', args=[category_id])), 200)
+        _expect(recorder, 'leaderboard', session.request('GET', reverse('category_leaderboard', args=[category_id])), 200)
+
+
+def run(users=10, concurrency=None, base_url=None, categories=None, seed=0):
+    """
+    Run ``users`` simulated candidates, ``concurrency`` at a time (default:
+    all at once), and return the report from ``summarise()``. Over HTTP if
+    ``base_url`` is given, in-process otherwise.
+    """
+    if categories is None:
+        categories = benchmark_categories()
+    if not categories:
+        raise BenchmarkError('No benchmark categories; run manage.py seed_benchmark first.')
+    recorder = Recorder()
+    errors = []
+    run_id = uuid.uuid4().hex[:8]
+
+    def one(n):
+        session = HttpSession(base_url) if base_url else ClientSession()
+        try:
+            candidate(session, recorder, f'bench-{run_id}-{n}', categories, random.Random(f'{seed}:{n}'))
+        except (BenchmarkError, OSError) as exc:
+            errors.append(f'candidate {n}: {exc}')
+        finally:
+            if base_url is None:
+                close_old_connections()
+                connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency or users) as pool:
+        list(pool.map(one, range(users)))
+    wall = time.perf_counter() - started
+    return summarise(recorder.samples, wall, users=users, errors=errors, categories=categories)
+
+
+def summarise(samples, wall, users=0, errors=(), categories=()):
+    """
+    Per-step latency percentiles (ms), mean queries per request and error
+    counts, plus overall requests per second.
+    """
+    by_step = {}
+    for step, elapsed, queries, ok in samples:
+        by_step.setdefault(step, []).append((elapsed, queries, ok))
+    steps = {}
+    for step, rows in by_step.items():
+        latencies = sorted(elapsed for elapsed, _, _ in rows)
+        counted = [queries for _, queries, _ in rows if queries is not None]
+        steps[step] = {
+            'requests': len(rows),
+            'errors': sum(1 for _, _, ok in rows if not ok),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'avg_queries': round(sum(counted) / len(counted), 2) if counted else None,
+        }
+    return {
+        'users': users,
+        'categories': [name for _, name in categories],
+        'requests': len(samples),
+        'seconds': round(wall, 3),
+        'requests_per_second': round(len(samples) / wall, 2) if wall else 0.0,
+        'errors': list(errors),
+        'steps': steps,
+    }
+
+
+def machine_independent(report):
+    """The parts of a report that do not depend on the machine it ran on."""
+    return {
+        'users': report['users'],
+        'categories': report['categories'],
+        'steps': {
+            step: {'requests': row['requests'], 'avg_queries': row['avg_queries']}
+            for step, row in report['steps'].items()
+        },
+    }
+
+
+def compare(report, baseline, latency_tolerance=LATENCY_TOLERANCE,
+            throughput_tolerance=THROUGHPUT_TOLERANCE, query_tolerance=QUERY_TOLERANCE, min_samples=MIN_SAMPLES):
+    """
+    Return a list of regressions of ``report`` against ``baseline``: a step
+    whose p95 latency grew by more than ``latency_tolerance`` (a fraction),
+    whose mean query count grew by more than ``query_tolerance`` queries, a
+    step that failed, or throughput that fell by more than
+    ``throughput_tolerance``. Latency is only compared for steps with at
+    least ``min_samples`` requests in both runs, and latency and throughput
+    only if the baseline has them (see machine_independent()).
+    """
+    regressions = []
+    for step, base in baseline.get('steps', {}).items():
+        current = report['steps'].get(step)
+        if current is None:
+            regressions.append(f'{step}: not exercised')
+            continue
+        if current['errors']:
+            regressions.append(f"{step}: {current['errors']} failed requests")
+        sampled = min(current['requests'], base['requests']) >= min_samples
+        if sampled and base.get('p95_ms') and current['p95_ms'] > base['p95_ms'] * (1 + latency_tolerance):
+            regressions.append(f"{step}: p95 {current['p95_ms']} ms, baseline {base['p95_ms']} ms")
+        if (base.get('avg_queries') is not None and current['avg_queries'] is not None
+                and current['avg_queries'] > base['avg_queries'] + query_tolerance):
+            regressions.append(f"{step}: {current['avg_queries']} queries per request, baseline {base['avg_queries']}")
+    base_rps = baseline.get('requests_per_second')
+    if base_rps and report['requests_per_second'] < base_rps * (1 - throughput_tolerance):
+        regressions.append(f"throughput: {report['requests_per_second']} req/s, baseline {base_rps} req/s")
+    return regressions
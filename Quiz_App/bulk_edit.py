@@ -0,0 +1,374 @@
+"""
+Bulk question editing for the host panel.
+
+A change set is a list of question changes, each a dict like::
+
+    {"id": 12, "category": 3, "question_text": "What is EQ?", "marks": 2,
+     "answers": [{"id": 5, "answer_text": "Equalization", "is_correct": true},
+                 {"answer_text": "A new choice", "is_correct": false},
+                 {"id": 7, "delete": true}]}
+
+A change without ``id`` creates a question and needs ``category``,
+``question_text`` and ``answers``; ``{"id": 12, "delete": true}`` deletes
+one. Fields left out of an existing question or answer keep their value and
+answers that are not listed are kept.
+
+``apply()`` checks the whole change set against the current rows before
+writing anything, with the same rules as the importer (see
+importer.validate), and raises BulkEditError listing every problem. A valid
+change set is written in one transaction with a bulk_create, bulk_update
+and delete per table, skipping questions and answers that did not actually
+change, and derived data is refreshed once through questions_bulk_changed.
+Answers that stop being correct are cleared first, as the database allows
+only one correct answer per question at any moment (see models.Answer).
+
+``save_answer_formset()`` writes a host panel AnswerFormSet the same way.
+"""
+from django.db import transaction
+
+from .importer import QuestionRecord, parse_marks, validate
+from .models import Category, Question, Answer
+from .signals import questions_bulk_changed
+
+QUESTION_FIELDS = ('category_id', 'question_text', 'marks')
+ANSWER_FIELDS = ('answer_text', 'is_correct')
+
+
+class BulkEditError(ValueError):
+    """
+    The change set was rejected. ``errors`` is a list of dicts with the
+    ``index`` of the question change, the ``field`` and a ``message``.
+    """
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} invalid changes')
+        self.errors = errors
+
+
+class BulkEditResult:
+
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.deleted = []
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'deleted': self.deleted}
+
+    def __str__(self):
+        return f'{len(self.created)} created, {len(self.updated)} updated, {len(self.deleted)} deleted'
+
+
+class _Errors(list):
+
+    def add(self, index, field, message):
+        self.append({'index': index, 'field': field, 'message': message})
+
+
+def _as_id(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return int(value)
+
+
+def _plan(changes):
+    """Check ``changes`` and work out the writes. Raises BulkEditError."""
+    errors = _Errors()
+    if not isinstance(changes, list) or not all(isinstance(c, dict) for c in changes):
+        raise BulkEditError([{'index': None, 'field': 'questions', 'message': 'expected a list of objects'}])
+
+    question_ids, category_ids = set(), set()
+    for index, change in enumerate(changes):
+        for key, ids in (('id', question_ids), ('category', category_ids)):
+            if change.get(key) is not None:
+                try:
+                    ids.add(_as_id(change[key]))
+                except (TypeError, ValueError):
+                    errors.add(index, key, f'{change[key]!r} is not a valid id')
+    if errors:
+        raise BulkEditError(errors)
+
+    existing = Question.objects.in_bulk(question_ids)
+    answers_of = {}
+    for answer in Answer.objects.filter(question_id__in=question_ids).order_by('id'):
+        answers_of.setdefault(answer.question_id, {})[answer.pk] = answer
+    known_categories = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+
+    plan = {
+        'new': [],                 # (Question, [Answer])
+        'changed_questions': [],
+        'new_answers': [],
+        'changed_answers': [],
+        'deleted_answers': [],
+        'uncorrected_answers': [],  # ids of answers that stop being correct
+        'deleted_questions': [],
+        'touched': set(),          # ids of existing questions with any change
+        'category_ids': set(),
+    }
+    seen = set()
+    for index, change in enumerate(changes):
+        question_id = _as_id(change['id']) if change.get('id') is not None else None
+        if question_id is not None:
+            if question_id not in existing:
+                errors.add(index, 'id', f'question {question_id} does not exist')
+                continue
+            if question_id in seen:
+                errors.add(index, 'id', f'question {question_id} is changed more than once')
+                continue
+            seen.add(question_id)
+            question = existing[question_id]
+        else:
+            question = Question(marks=1)
+
+        if change.get('delete'):
+            if question_id is None:
+                errors.add(index, 'delete', 'only existing questions can be deleted')
+            else:
+                plan['deleted_questions'].append(question_id)
+                plan['category_ids'].add(question.category_id)
+            continue
+
+        before = {field: getattr(question, field) for field in QUESTION_FIELDS}
+        if change.get('category') is not None:
+            category_id = _as_id(change['category'])
+            if category_id not in known_categories:
+                errors.add(index, 'category', f'category {category_id} does not exist')
+            question.category_id = category_id
+        elif question_id is None:
+            errors.add(index, 'category', 'a new question needs a category')
+        if 'question_text' in change:
+            question.question_text = str(change['question_text'] or '').strip()
+        if 'marks' in change:
+            question.marks = change['marks']
+
+        # The answers as they will be after this change, in order.
+        current = dict(answers_of.get(question_id, {}))
+        new_answers, changed_answers, deleted_answers, uncorrected = [], [], [], []
+        answer_changes = change.get('answers', [])
+        if not isinstance(answer_changes, list):
+            errors.add(index, 'answers', 'expected a list')
+            answer_changes = []
+        for position, answer_change in enumerate(answer_changes):
+            field = f'answers[{position}]'
+            if not isinstance(answer_change, dict):
+                errors.add(index, field, 'expected an object')
+                continue
+            if answer_change.get('id') is not None:
+                try:
+                    answer = current.get(_as_id(answer_change['id']))
+                except (TypeError, ValueError):
+                    answer = None
+                if answer is None:
+                    errors.add(index, f'{field}.id', f'answer {answer_change["id"]!r} is not an answer of this question')
+                    continue
+                if answer_change.get('delete'):
+                    del current[answer.pk]
+                    deleted_answers.append(answer.pk)
+                    continue
+                answer_before = (answer.answer_text, answer.is_correct)
+            else:
+                if answer_change.get('delete'):
+                    continue
+                answer = Answer(is_correct=False)
+                answer_before = None
+            if 'answer_text' in answer_change:
+                answer.answer_text = str(answer_change['answer_text'] or '').strip()
+            if 'is_correct' in answer_change:
+                answer.is_correct = bool(answer_change['is_correct'])
+            if answer.pk is None:
+                new_answers.append(answer)
+            elif (answer.answer_text, answer.is_correct) != answer_before:
+                changed_answers.append(answer)
+                if answer_before[1] and not answer.is_correct:
+                    uncorrected.append(answer.pk)
+        final_answers = list(current.values()) + new_answers
+
+        message = validate(QuestionRecord(
+            str(question.category_id), question.question_text, question.marks,
+            tuple((a.answer_text, a.is_correct) for a in final_answers), None,
+        ))
+        if message:
+            errors.add(index, 'question', message)
+            continue
+        question.marks = parse_marks(question.marks)
+
+        if question_id is None:
+            plan['new'].append((question, new_answers))
+            plan['category_ids'].add(question.category_id)
+            continue
+        question_changed = any(getattr(question, field) != before[field] for field in QUESTION_FIELDS)
+        answers_changed = bool(new_answers or changed_answers or deleted_answers)
+        if question_changed:
+            plan['changed_questions'].append(question)
+            plan['category_ids'].add(before['category_id'])
+        if answers_changed:
+            for answer in new_answers:
+                answer.question = question
+            plan['new_answers'] += new_answers
+            plan['changed_answers'] += changed_answers
+            plan['deleted_answers'] += deleted_answers
+            plan['uncorrected_answers'] += uncorrected
+        if question_changed or answers_changed:
+            plan['touched'].add(question_id)
+            plan['category_ids'].add(question.category_id)
+
+    if errors:
+        raise BulkEditError(errors)
+    return plan
+
+
+def apply(changes):
+    """Validate and apply a change set atomically. Returns a BulkEditResult."""
+    plan = _plan(changes)
+    result = BulkEditResult()
+    with transaction.atomic():
+        if plan['deleted_answers']:
+            Answer.objects.filter(pk__in=plan['deleted_answers']).delete()
+        if plan['deleted_questions']:
+            Question.objects.filter(pk__in=plan['deleted_questions']).delete()
+        Question.objects.bulk_update(plan['changed_questions'], ['category', 'question_text', 'marks'])
+        clear_correct(plan['uncorrected_answers'])
+        Answer.objects.bulk_update(plan['changed_answers'], list(ANSWER_FIELDS))
+
+        created = Question.objects.bulk_create([question for question, _ in plan['new']])
+        for question, answers in plan['new']:
+            for answer in answers:
+                answer.question = question
+            plan['new_answers'] += answers
+        Answer.objects.bulk_create(plan['new_answers'])
+
+        result.created = [question.pk for question in created]
+        result.updated = sorted(plan['touched'])
+        result.deleted = sorted(plan['deleted_questions'])
+        changed_ids = result.created + result.updated
+        if changed_ids or plan['category_ids']:
+            questions_bulk_changed.send(
+                sender=Question, category_ids=sorted(plan['category_ids']), question_ids=changed_ids,
+            )
+    return result
+
+
+def clear_correct(answer_ids):
+    """
+    Unmark the given answers as correct ahead of the rest of a write.
+    SQLite checks the one-correct-answer constraint row by row, even within
+    one UPDATE, so a question whose correct answer moves to another choice
+    would otherwise briefly have two.
+    """
+    if answer_ids:
+        Answer.objects.filter(pk__in=answer_ids).update(is_correct=False)
+
+
+def save_answer_formset(formset):
+    """
+    Save a valid AnswerFormSet for ``formset.instance`` (which must be saved)
+    with at most one delete, bulk_update and bulk_create, then refresh
+    derived data once, instead of a save and a round of signal handlers per
+    answer.
+    """
+    question = formset.instance
+    deleted_forms = set(formset.deleted_forms) if formset.can_delete else set()
+    new, changed, deleted = [], [], []
+    for form in formset.forms:
+        answer = form.instance
+        if form in deleted_forms:
+            if answer.pk is not None:
+                deleted.append(answer.pk)
+        elif answer.pk is None:
+            if form.has_changed():
+                answer.question = question
+                new.append(answer)
+        elif form.has_changed():
+            changed.append(answer)
+    if not (new or changed or deleted):
+        return
+    with transaction.atomic():
+        if deleted:
+            Answer.objects.filter(pk__in=deleted).delete()
+        clear_correct(formset.uncorrected_answers())
+        Answer.objects.bulk_update(changed, list(ANSWER_FIELDS))
+        Answer.objects.bulk_create(new)
+        questions_bulk_changed.send(sender=Answer, category_ids=[question.category_id], question_ids=[question.pk])
+
+
+# --- The spreadsheet form ---
+
+def sheet_rows(questions):
+    """Rows for the bulk editor from questions with their answers prefetched."""
+    return [
+        {
+            'id': question.pk,
+            'category': question.category_id,
+            'question_text': question.question_text,
+            'marks': question.marks,
+            'delete': False,
+            'answers': [
+                {'id': a.pk, 'answer_text': a.answer_text, 'is_correct': a.is_correct, 'delete': False}
+                for a in question.answers.all()
+            ],
+        }
+        for question in questions
+    ]
+
+
+def rows_from_form(data):
+    """
+    Rows for the bulk editor from its submitted form (see
+    question_bulk_edit.html for the field names).
+    """
+    def number(name):
+        try:
+            return max(0, int(data.get(name, 0)))
+        except (TypeError, ValueError):
+            return 0
+
+    rows = []
+    for i in range(number('rows')):
+        prefix = f'q-{i}-'
+        correct = data.get(prefix + 'correct')
+        answers = []
+        for j in range(number(prefix + 'answers')):
+            answer_prefix = f'{prefix}a-{j}-'
+            answers.append({
+                'id': data.get(answer_prefix + 'id') or None,
+                'answer_text': data.get(answer_prefix + 'answer_text', ''),
+                'is_correct': correct == str(j),
+                'delete': bool(data.get(answer_prefix + 'delete')),
+            })
+        rows.append({
+            'id': data.get(prefix + 'id') or None,
+            'category': data.get(prefix + 'category') or None,
+            'question_text': data.get(prefix + 'question_text', ''),
+            'marks': data.get(prefix + 'marks', ''),
+            'delete': bool(data.get(prefix + 'delete')),
+            'answers': answers,
+        })
+    return rows
+
+
+def changes_from_rows(rows):
+    """
+    Turn sheet rows into a change set, leaving out blank new rows and blank
+    new answers. Returns (changes, row numbers), the row number (from 1) of
+    each change, for reporting errors.
+    """
+    changes, numbers = [], []
+    for number, row in enumerate(rows, start=1):
+        if row['id'] is None and not row['question_text'].strip():
+            continue
+        if row['delete']:
+            if row['id'] is not None:
+                changes.append({'id': row['id'], 'delete': True})
+                numbers.append(number)
+            continue
+        change = {key: row[key] for key in ('category', 'question_text', 'marks')}
+        if row['id'] is not None:
+            change['id'] = row['id']
+        change['answers'] = [
+            {key: answer[key] for key in ('id', 'answer_text', 'is_correct', 'delete')}
+            for answer in row['answers']
+            if answer['id'] is not None or answer['answer_text'].strip()
+        ]
+        changes.append(change)
+        numbers.append(number)
+    return changes, numbers
@@ -0,0 +1,98 @@
+"""
+The category listing on the home page.
+
+The listing is rendered inside a ``{% cache %}`` fragment whose key contains
+two version tokens kept in the QUIZ_CACHE_ALIAS cache:
+
+* the catalogue version, replaced whenever a category or question changes,
+  since that changes names, question counts or total marks for everyone;
+* a per-user version, replaced when that user finishes an attempt, since
+  the listing shows their last score in each category.
+
+The view only reads the two tokens (one cache round trip) and hands the
+template a lazy queryset, which is evaluated, as one query, only when the
+fragment is not cached. Old fragments are never deleted, just no longer
+looked up, and expire after FRAGMENT_TIMEOUT.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import OuterRef, Subquery
+
+from .models import Attempt, Category
+
+FRAGMENT_TIMEOUT = 60 * 60
+CATALOGUE_KEY = 'quiz:catalogue-version'
+
+
+def cache_alias():
+    return getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')
+
+
+def _cache():
+    return caches[cache_alias()]
+
+
+def _user_key(user_id):
+    return f'quiz:catalogue-version:user:{user_id}'
+
+
+def versions(user_id):
+    """Return (catalogue version, user version), creating missing tokens."""
+    cache = _cache()
+    keys = [CATALOGUE_KEY, _user_key(user_id)]
+    found = cache.get_many(keys)
+    tokens = []
+    for key in keys:
+        token = found.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            # add() so concurrent requests agree on a single token.
+            if not cache.add(key, token, None):
+                token = cache.get(key, token)
+        tokens.append(token)
+    return tuple(tokens)
+
+
+async def aversions(user_id):
+    """Async versions()."""
+    cache = _cache()
+    keys = [CATALOGUE_KEY, _user_key(user_id)]
+    found = await cache.aget_many(keys)
+    tokens = []
+    for key in keys:
+        token = found.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            if not await cache.aadd(key, token, None):
+                token = await cache.aget(key, token)
+        tokens.append(token)
+    return tuple(tokens)
+
+
+def invalidate():
+    """Make every user's cached listing stale."""
+    _cache().set(CATALOGUE_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_user(user_id):
+    """Make one user's cached listing stale."""
+    _cache().set(_user_key(user_id), uuid.uuid4().hex, None)
+
+
+def categories_for(user):
+    """
+    Lazy queryset of every category with its counters (from CategoryStats)
+    and ``last_score``/``last_total_marks`` of the user's latest attempt,
+    in a single query.
+    """
+    latest = Attempt.objects.filter(user=user, category=OuterRef('pk')).order_by('-finished_at')
+    return (
+        Category.objects
+        .select_related('stats')
+        .annotate(
+            last_score=Subquery(latest.values('score')[:1]),
+            last_total_marks=Subquery(latest.values('total_marks')[:1]),
+        )
+    )
@@ -0,0 +1,44 @@
+"""
+System checks for the quiz app's deployment settings.
+
+Version tokens, question banks, answer keys, cached roles and the home page
+fragments all live in the QUIZ_CACHE_ALIAS cache. Invalidating them only
+reaches the processes that share that cache, so a per-process backend is
+only correct with a single process.
+"""
+import os
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Backends whose entries are private to one process.
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_alias():
+    return getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')
+
+
+def cache_is_shared(alias=None):
+    """Whether every process sees the same entries in the cache ``alias``."""
+    backend = settings.CACHES[alias or cache_alias()]['BACKEND']
+    return backend not in PROCESS_LOCAL_BACKENDS
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    try:
+        workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    except ValueError:
+        workers = 1
+    if workers > 1 and not cache_is_shared():
+        return [Warning(
+            f'WEB_CONCURRENCY is {workers} but the {cache_alias()!r} cache is private to each process.',
+            hint='Set QUIZ_CACHE_URL to a shared Redis cache, or the workers will serve stale '
+                 'questions, scores and leaderboards after changes.',
+            id='Quiz_App.W001',
+        )]
+    return []
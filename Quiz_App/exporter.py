@@ -0,0 +1,103 @@
+"""
+Streaming bulk export of categories, questions and answers.
+
+Both formats are the ones read by importer.py, so an export can be loaded
+into another environment with ``manage.py import_questions``. Rows come from
+a single joined query read with ``iterator()``, and output is produced line
+by line, so memory use does not grow with the size of the bank.
+
+Under ASGI, Django buffers a streaming response built on a sync iterator
+in full before sending it, so ``aexport()`` wraps the same generator in an
+async one that pulls a batch of lines at a time in a thread.
+"""
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from .importer import CSV_FIELDS
+from .models import Question
+
+CHUNK_SIZE = 2000
+# Lines read per thread hop by aexport().
+ASYNC_BATCH_LINES = 500
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _rows(category_ids=None):
+    """Yield one row per answer (or per question without answers), grouped by question."""
+    questions = Question.objects.all()
+    if category_ids:
+        questions = questions.filter(category_id__in=category_ids)
+    return (
+        questions
+        .order_by('category__name', 'id', 'answers__id')
+        .values_list('category__name', 'id', 'question_text', 'marks', 'answers__answer_text', 'answers__is_correct')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def export_csv(category_ids=None):
+    """Yield CSV lines, one row per answer, starting with the header."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for category, _, question_text, marks, answer_text, is_correct in _rows(category_ids):
+        if answer_text is None:
+            continue
+        yield writer.writerow([category, question_text, marks, answer_text, 'true' if is_correct else 'false'])
+
+
+def export_jsonl(category_ids=None):
+    """Yield JSON lines, one question (with its answers) per line."""
+    current = None
+    answers = []
+    for category, question_id, question_text, marks, answer_text, is_correct in _rows(category_ids):
+        if current is not None and current[1] != question_id:
+            yield _jsonl_line(current, answers)
+            answers = []
+        current = (category, question_id, question_text, marks)
+        if answer_text is not None:
+            answers.append({'text': answer_text, 'correct': is_correct})
+    if current is not None:
+        yield _jsonl_line(current, answers)
+
+
+def _jsonl_line(question, answers):
+    category, _, question_text, marks = question
+    record = {'category': category, 'question': question_text, 'marks': marks, 'answers': answers}
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export(fmt, category_ids=None):
+    """Dispatch to the exporter for ``fmt`` ('csv' or 'jsonl')."""
+    if fmt == 'csv':
+        return export_csv(category_ids)
+    if fmt == 'jsonl':
+        return export_jsonl(category_ids)
+    raise ValueError(f'Unknown format: {fmt}')
+
+
+async def aexport(fmt, category_ids=None, batch_lines=ASYNC_BATCH_LINES):
+    """
+    export() as an async iterator, for StreamingHttpResponse under ASGI.
+    Every batch is read in the same (thread-sensitive) thread, which owns the
+    database cursor, and sent before the next one is read.
+    """
+    lines = export(fmt, category_ids)
+    next_batch = sync_to_async(lambda: list(islice(lines, batch_lines)))
+    try:
+        while batch := await next_batch():
+            yield ''.join(batch)
+    finally:
+        await sync_to_async(lines.close)()
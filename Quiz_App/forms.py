@@ -1,8 +1,9 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
 from .models import Category, Question, Answer
+from . import similarity
 
 class RegistrationForm(UserCreationForm):
     """
@@ -53,7 +54,7 @@ class LoginForm(AuthenticationForm):
 class CategoryForm(forms.ModelForm):
     class Meta:
         model = Category
-        fields = ['name']
+        fields = ['name', 'draw_count', 'stratify_by_marks']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -63,16 +64,38 @@ class CategoryForm(forms.ModelForm):
 
 
 class QuestionForm(forms.ModelForm):
+    allow_duplicate = forms.BooleanField(
+        required=False,
+        label='Save even if a similar question exists',
+    )
+
     class Meta:
         model = Question
         fields = ['category', 'question_text', 'marks']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.similar_questions = []
         for f in self.fields.values():
             existing = f.widget.attrs.get('class', '')
             f.widget.attrs['class'] = existing.replace('form-control', 'input') if existing else 'input'
 
+    def clean(self):
+        """Flag near-duplicates of existing questions in the same category."""
+        cleaned_data = super().clean()
+        category = cleaned_data.get('category')
+        text = cleaned_data.get('question_text')
+        if category and text and not cleaned_data.get('allow_duplicate'):
+            matches = similarity.find_similar(text, category.id, exclude_id=self.instance.pk)
+            if matches:
+                by_id = Question.objects.in_bulk([question_id for question_id, _ in matches])
+                self.similar_questions = [by_id[question_id] for question_id, _ in matches if question_id in by_id]
+                raise forms.ValidationError(
+                    "This looks like a near-duplicate of an existing question. "
+                    "Review the similar questions below, or tick the box to save anyway."
+                )
+        return cleaned_data
+
 
 class AnswerForm(forms.ModelForm):
     class Meta:
@@ -87,4 +110,69 @@ class AnswerForm(forms.ModelForm):
 
 
 # Inline formset: Answers tied to a Question
-AnswerFormSet = inlineformset_factory(Question, Answer, form=AnswerForm, extra=3, can_delete=True)
+class BaseAnswerFormSet(BaseInlineFormSet):
+    """
+    The formset only sets ``question_id`` on each answer; this also caches
+    the question itself, so nothing that prints or validates an answer
+    queries its question once per form.
+
+    A question can have only one correct answer (see models.Answer), so the
+    formset rejects more than one, and saving it clears the old correct
+    answer before the new one is written.
+    """
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        Answer.question.field.set_cached_value(form.instance, self.instance)
+        return form
+
+    def clean(self):
+        super().clean()
+        deleted = set(self.deleted_forms) if self.can_delete else set()
+        correct = [
+            form for form in self.forms
+            if form not in deleted and getattr(form, 'cleaned_data', {}).get('is_correct')
+        ]
+        if len(correct) > 1:
+            raise forms.ValidationError("Only one answer can be marked correct.")
+
+    def uncorrected_answers(self):
+        """Ids of saved answers that are correct now and will not be after saving."""
+        deleted = set(self.deleted_forms) if self.can_delete else set()
+        return [
+            form.instance.pk for form in self.initial_forms
+            if form.initial.get('is_correct') and (form in deleted or not form.cleaned_data.get('is_correct'))
+        ]
+
+    def save_existing_objects(self, commit=True):
+        # Existing answers are saved one at a time in form order.
+        uncorrected = self.uncorrected_answers() if commit else []
+        if uncorrected:
+            Answer.objects.filter(pk__in=uncorrected).update(is_correct=False)
+        return super().save_existing_objects(commit)
+
+
+AnswerFormSet = inlineformset_factory(
+    Question, Answer, form=AnswerForm, formset=BaseAnswerFormSet, extra=3, can_delete=True
+)
+
+
+class ImportJobForm(forms.Form):
+    """Upload a question bank to be imported by a background job."""
+    file = forms.FileField(help_text='CSV or JSONL, see Quiz_App/importer.py for the columns.')
+    format = forms.ChoiceField(choices=[('auto', 'By file extension'), ('csv', 'CSV'), ('jsonl', 'JSONL')], initial='auto')
+    create_categories = forms.BooleanField(required=False, initial=True, label='Create missing categories')
+    skip_near_duplicates = forms.BooleanField(required=False, label='Skip near-duplicates')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for f in self.fields.values():
+            existing = f.widget.attrs.get('class', '')
+            f.widget.attrs['class'] = existing.replace('form-control', 'input') if existing else 'input'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = cleaned_data.get('file')
+        if upload and cleaned_data.get('format') == 'auto':
+            cleaned_data['format'] = 'csv' if upload.name.lower().endswith('.csv') else 'jsonl'
+        return cleaned_data
@@ -1,125 +1,408 @@
+import json
+import os
+from urllib.parse import urlencode
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import user_passes_test, login_required
-from django.contrib.auth.mixins import UserPassesTestMixin
 from django.urls import reverse
-from django.forms import modelform_factory
-from .models import Category, Question, Answer
-from .forms import CategoryForm, QuestionForm, AnswerFormSet
-from django.http import HttpResponseForbidden
-
-
-def host_required(view_func):
-    """Decorator that allows only staff users or users in 'Host' group."""
-    def _wrapped(request, *args, **kwargs):
-        user = request.user
-        if not user.is_authenticated:
-            return redirect('login')
-        if not (user.is_staff or user.groups.filter(name='Host').exists()):
-            return HttpResponseForbidden('You do not have permission to access this page.')
-        return view_func(request, *args, **kwargs)
-    return _wrapped
-
-
-@host_required
-def dashboard(request):
-    categories_count = Category.objects.count()
-    questions_count = Question.objects.count()
-    answers_count = Answer.objects.count()
-    return render(request, 'host_panel/dashboard.html', {
-        'categories_count': categories_count,
-        'questions_count': questions_count,
-        'answers_count': answers_count,
-    })
+from .models import Category, Question, Answer, Job
+from .forms import CategoryForm, QuestionForm, AnswerFormSet, ImportJobForm
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from . import bulk_edit, exporter, item_stats, jobs, metrics, search, stats
+from .pagination import KeysetPage, keyset_page
+from .permissions import HostView
+
+# Every view here is a HostView, so only hosts reach it (see permissions.py).
+
+
+class DashboardView(HostView):
+
+    def get(self, request):
+        # One cache read: the counters are maintained incrementally by stats.py.
+        data = stats.dashboard()
+        totals = data['totals']
+        return render(request, 'host_panel/dashboard.html', {
+            'categories_count': totals['category_count'],
+            'questions_count': totals['question_count'],
+            'answers_count': totals['answer_count'],
+            'totals': totals,
+            'category_stats': data['categories'],
+        })
+
+
+class MetricsView(HostView):
+    """
+    Request metrics of this worker process, aggregated by URL name, as JSON
+    (see middleware.py). POST clears them.
+    """
+
+    def get(self, request):
+        return JsonResponse({
+            'profiling': getattr(settings, 'QUIZ_PROFILING', False),
+            'routes': metrics.snapshot(),
+        })
+
+    def post(self, request):
+        metrics.reset()
+        return self.get(request)
 
 
 # Category CRUD
-@host_required
-def category_list(request):
-    categories = Category.objects.all()
-    return render(request, 'host_panel/category_list.html', {'categories': categories})
+class CategoryListView(HostView):
 
+    def get(self, request):
+        categories = Category.objects.annotate(question_count=Count('questions'))
+        page = keyset_page(categories, ('name', 'id'), request.GET.get('after'))
+        return render(request, 'host_panel/category_list.html', {'categories': page, 'page': page})
 
-@host_required
-def category_create(request):
-    if request.method == 'POST':
-        form = CategoryForm(request.POST)
-        if form.is_valid():
-            form.save()
-            return redirect('host_category_list')
-    else:
-        form = CategoryForm()
-    return render(request, 'host_panel/category_form.html', {'form': form, 'title': 'Create Category'})
 
+class CategoryFormView(HostView):
+    """Creates a category, or edits the one given by ``pk``."""
 
-@host_required
-def category_edit(request, pk):
-    category = get_object_or_404(Category, pk=pk)
-    if request.method == 'POST':
+    def get_object(self, pk):
+        return None if pk is None else get_object_or_404(Category, pk=pk)
+
+    def render_form(self, request, form, category):
+        title = 'Create Category' if category is None else 'Edit Category'
+        return render(request, 'host_panel/category_form.html', {'form': form, 'title': title})
+
+    def get(self, request, pk=None):
+        category = self.get_object(pk)
+        return self.render_form(request, CategoryForm(instance=category), category)
+
+    def post(self, request, pk=None):
+        category = self.get_object(pk)
         form = CategoryForm(request.POST, instance=category)
         if form.is_valid():
             form.save()
             return redirect('host_category_list')
-    else:
-        form = CategoryForm(instance=category)
-    return render(request, 'host_panel/category_form.html', {'form': form, 'title': 'Edit Category'})
+        return self.render_form(request, form, category)
+
 
+class CategoryDeleteView(HostView):
 
-@host_required
-def category_delete(request, pk):
-    category = get_object_or_404(Category, pk=pk)
-    if request.method == 'POST':
-        category.delete()
+    def get(self, request, pk):
+        category = get_object_or_404(Category, pk=pk)
+        return render(request, 'host_panel/confirm_delete.html', {'object': category, 'type': 'Category'})
+
+    def post(self, request, pk):
+        get_object_or_404(Category, pk=pk).delete()
         return redirect('host_category_list')
-    return render(request, 'host_panel/confirm_delete.html', {'object': category, 'type': 'Category'})
 
 
 # Question CRUD with Answer inline formset
-@host_required
-def question_list(request):
-    questions = Question.objects.select_related('category').all()
-    return render(request, 'host_panel/question_list.html', {'questions': questions})
+QUESTION_ORDERING = ('-created_at', '-id')
 
 
-@host_required
-def question_create(request):
-    if request.method == 'POST':
-        form = QuestionForm(request.POST)
-        if form.is_valid():
-            question = form.save()
-            formset = AnswerFormSet(request.POST, instance=question)
-            if formset.is_valid():
-                formset.save()
-                return redirect('host_question_list')
+class QuestionListView(HostView):
+    """
+    Lists questions a page at a time, newest first, with an optional
+    category filter. Each page, answer counts and item statistics included,
+    is one query. With a search term, shows the best-ranked matches instead.
+
+    Answers are counted per row in a subquery rather than by joining and
+    grouping, so the page is read in order straight from the
+    question_cat_created or question_created index and stops after one page,
+    instead of grouping and sorting every question first.
+    """
+
+    def get(self, request):
+        answer_counts = (
+            Answer.objects
+            .filter(question=OuterRef('pk'))
+            .order_by()
+            .values('question')
+            .annotate(n=Count('id'))
+            .values('n')
+        )
+        questions = (
+            Question.objects
+            .select_related('category', 'item_stats')
+            .annotate(answer_count=Coalesce(Subquery(answer_counts), 0))
+        )
+        category_id = request.GET.get('category', '')
+        if category_id.isdigit():
+            questions = questions.filter(category_id=category_id)
+        query = request.GET.get('q', '').strip()
+        if query:
+            # Ranked search results form a single page, best match first.
+            results = search.search_questions(
+                query, int(category_id) if category_id.isdigit() else None, queryset=questions,
+            )
+            page = KeysetPage(results, None)
+        else:
+            page = keyset_page(questions, QUESTION_ORDERING, request.GET.get('after'))
+        for question in page:
+            question.stats = getattr(question, 'item_stats', None)
+            question.flags = item_stats.flags(question.stats)
+
+        # Keep the filters in the "next page" link.
+        params = request.GET.copy()
+        params.pop('after', None)
+        return render(request, 'host_panel/question_list.html', {
+            'questions': page,
+            'page': page,
+            'categories': Category.objects.only('id', 'name'),
+            'selected_category': int(category_id) if category_id.isdigit() else None,
+            'search': query,
+            'filter_query': params.urlencode(),
+        })
+
+
+class QuestionExportView(HostView):
+    """
+    Stream the question bank as CSV or JSONL, optionally for one category.
+    Under ASGI the response gets an async iterator, as a sync one would be
+    buffered in full before the first byte is sent.
+    """
+
+    def get(self, request):
+        fmt = request.GET.get('format', 'jsonl')
+        if fmt not in exporter.CONTENT_TYPES:
+            fmt = 'jsonl'
+        category_id = request.GET.get('category')
+        category_ids = [int(category_id)] if category_id and category_id.isdigit() else None
+        if isinstance(request, ASGIRequest):
+            lines = exporter.aexport(fmt, category_ids)
         else:
-            formset = AnswerFormSet(request.POST)
-    else:
-        form = QuestionForm()
-        formset = AnswerFormSet()
+            lines = exporter.export(fmt, category_ids)
+        response = StreamingHttpResponse(lines, content_type=exporter.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="questions.{fmt}"'
+        return response
+
+
+class QuestionCreateView(HostView):
+
+    def render_form(self, request, form, formset):
+        return render(request, 'host_panel/question_form.html', {'form': form, 'formset': formset, 'title': 'Create Question'})
+
+    def get(self, request):
+        return self.render_form(request, QuestionForm(), AnswerFormSet())
+
+    def post(self, request):
+        # Both are validated before anything is saved, so an invalid answer
+        # never leaves a question without its answers behind.
+        form = QuestionForm(request.POST)
+        formset = AnswerFormSet(request.POST, instance=Question())
+        if form.is_valid() and formset.is_valid():
+            with transaction.atomic():
+                formset.instance = form.save()
+                bulk_edit.save_answer_formset(formset)
+            return redirect('host_question_list')
+        return self.render_form(request, form, formset)
+
+
+class QuestionEditView(HostView):
 
-    return render(request, 'host_panel/question_form.html', {'form': form, 'formset': formset, 'title': 'Create Question'})
+    def render_form(self, request, form, formset):
+        return render(request, 'host_panel/question_form.html', {'form': form, 'formset': formset, 'title': 'Edit Question'})
 
+    def get(self, request, pk):
+        question = get_object_or_404(Question, pk=pk)
+        return self.render_form(request, QuestionForm(instance=question), AnswerFormSet(instance=question))
 
-@host_required
-def question_edit(request, pk):
-    question = get_object_or_404(Question, pk=pk)
-    if request.method == 'POST':
+    def post(self, request, pk):
+        question = get_object_or_404(Question, pk=pk)
         form = QuestionForm(request.POST, instance=question)
         formset = AnswerFormSet(request.POST, instance=question)
         if form.is_valid() and formset.is_valid():
-            form.save()
-            formset.save()
+            with transaction.atomic():
+                form.save()
+                bulk_edit.save_answer_formset(formset)
             return redirect('host_question_list')
-    else:
-        form = QuestionForm(instance=question)
-        formset = AnswerFormSet(instance=question)
-    return render(request, 'host_panel/question_form.html', {'form': form, 'formset': formset, 'title': 'Edit Question'})
+        return self.render_form(request, form, formset)
+
 
+class QuestionDeleteView(HostView):
 
-@host_required
-def question_delete(request, pk):
-    question = get_object_or_404(Question, pk=pk)
-    if request.method == 'POST':
-        question.delete()
+    def get(self, request, pk):
+        question = get_object_or_404(Question, pk=pk)
+        return render(request, 'host_panel/confirm_delete.html', {'object': question, 'type': 'Question'})
+
+    def post(self, request, pk):
+        get_object_or_404(Question, pk=pk).delete()
         return redirect('host_question_list')
-    return render(request, 'host_panel/confirm_delete.html', {'object': question, 'type': 'Question'})
 
+
+class QuestionBulkEditView(HostView):
+    """
+    Spreadsheet-style editor for every question of one category: edit,
+    move, add and delete questions and answers, and save them all in one
+    request (see bulk_edit.py). Nothing is saved unless every row is valid.
+    """
+    NEW_ROWS = 5
+    NEW_ANSWERS = 4
+
+    def render_sheet(self, request, category, rows, errors=(), saved=None):
+        for row in rows:
+            # One blank answer slot on existing rows, a few on new ones.
+            row['answers'] = row['answers'] + [
+                {'id': None, 'answer_text': '', 'is_correct': False, 'delete': False}
+                for _ in range(1 if row['id'] is not None else max(0, self.NEW_ANSWERS - len(row['answers'])))
+            ]
+        return render(request, 'host_panel/question_bulk_edit.html', {
+            'category': category,
+            'categories': Category.objects.only('id', 'name'),
+            'rows': rows,
+            'errors': errors,
+            'saved': saved,
+        }, status=400 if errors else 200)
+
+    def blank_rows(self, category):
+        return [
+            {'id': None, 'category': category.pk, 'question_text': '', 'marks': 1, 'delete': False, 'answers': []}
+            for _ in range(self.NEW_ROWS)
+        ]
+
+    def get(self, request, category_id):
+        category = get_object_or_404(Category, pk=category_id)
+        questions = category.questions.order_by('id').prefetch_related('answers')
+        rows = bulk_edit.sheet_rows(questions) + self.blank_rows(category)
+        return self.render_sheet(request, category, rows, saved=request.GET.get('saved'))
+
+    def post(self, request, category_id):
+        category = get_object_or_404(Category, pk=category_id)
+        rows = bulk_edit.rows_from_form(request.POST)
+        changes, numbers = bulk_edit.changes_from_rows(rows)
+        try:
+            result = bulk_edit.apply(changes)
+        except bulk_edit.BulkEditError as exc:
+            errors = [
+                {**error, 'row': numbers[error['index']] if error['index'] is not None else None}
+                for error in exc.errors
+            ]
+            return self.render_sheet(request, category, rows, errors)
+        return redirect(f"{reverse('host_question_bulk_edit', args=[category.pk])}?{urlencode({'saved': str(result)})}")
+
+
+class QuestionBulkApiView(HostView):
+    """
+    JSON endpoint for bulk edits. POST ``{"questions": [...]}`` with a change
+    set as described in bulk_edit.py. Answers with the ids created, updated
+    and deleted, or with status 400 and the list of errors, in which case
+    nothing was changed.
+    """
+
+    def post(self, request):
+        try:
+            changes = json.loads(request.body)['questions']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'errors': [{'index': None, 'field': 'questions', 'message': 'Malformed request.'}]}, status=400)
+        try:
+            result = bulk_edit.apply(changes)
+        except bulk_edit.BulkEditError as exc:
+            return JsonResponse({'errors': exc.errors}, status=400)
+        return JsonResponse(result.as_dict())
+
+
+# Background jobs (see jobs.py)
+def _job_output(job):
+    """The file a finished job wrote, if any."""
+    if job.status == Job.SUCCEEDED and isinstance(job.result, dict) and job.result.get('file'):
+        return job.result['file']
+    return None
+
+
+class JobListView(HostView):
+    """
+    Recent background jobs with their progress, and the forms that queue
+    new ones. POST queues one of QUEUEABLE (an export takes ``format`` and
+    an optional ``category``); imports go through JobImportView.
+    """
+    QUEUEABLE = {
+        'export_questions': 'Export questions',
+        'recount_stats': 'Recount dashboard totals',
+        'compute_item_stats': 'Compute item statistics',
+        'rebuild_leaderboards': 'Rebuild leaderboards',
+        'rebuild_search_index': 'Rebuild search index',
+    }
+    RECENT = 50
+
+    def render_list(self, request, import_form=None, status=200):
+        recent = list(Job.objects.select_related('created_by')[:self.RECENT])
+        return render(request, 'host_panel/job_list.html', {
+            'jobs': recent,
+            # The page refreshes itself while any of them is still going.
+            'active': any(not job.finished for job in recent),
+            'actions': [(kind, label) for kind, label in self.QUEUEABLE.items() if kind != 'export_questions'],
+            'categories': Category.objects.only('id', 'name'),
+            'export_formats': list(exporter.CONTENT_TYPES),
+            'import_form': import_form or ImportJobForm(),
+        }, status=status)
+
+    def get(self, request):
+        return self.render_list(request)
+
+    def post(self, request):
+        kind = request.POST.get('kind')
+        if kind not in self.QUEUEABLE:
+            return HttpResponseBadRequest('Unknown job.')
+        params = {}
+        if kind == 'export_questions':
+            fmt = request.POST.get('format', 'jsonl')
+            params['format'] = fmt if fmt in exporter.CONTENT_TYPES else 'jsonl'
+            category_id = request.POST.get('category', '')
+            if category_id.isdigit():
+                params['category_ids'] = [int(category_id)]
+        jobs.enqueue(kind, params, user=request.user)
+        return redirect('host_job_list')
+
+
+class JobImportView(JobListView):
+    """Store an uploaded question bank and queue its import."""
+    http_method_names = ['post']
+
+    def post(self, request):
+        form = ImportJobForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return self.render_list(request, import_form=form, status=400)
+        data = form.cleaned_data
+        name = jobs.store_upload(data['file'], f".{data['format']}")
+        jobs.enqueue('import_questions', {
+            'file': name,
+            'format': data['format'],
+            'create_categories': data['create_categories'],
+            'skip_near_duplicates': data['skip_near_duplicates'],
+        }, user=request.user)
+        return redirect('host_job_list')
+
+
+class JobStatusView(HostView):
+    """One job's status and progress as JSON, for polling."""
+
+    def get(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        return JsonResponse({
+            'id': job.pk,
+            'kind': job.kind,
+            'status': job.status,
+            'finished': job.finished,
+            'progress': {'done': job.progress_done, 'total': job.progress_total, 'percent': job.percent},
+            'message': job.message,
+            'result': job.result,
+            'error': job.error.strip().splitlines()[-1] if job.error else '',
+            'attempts': job.attempts,
+            'download': reverse('host_job_download', args=[job.pk]) if _job_output(job) else None,
+        })
+
+
+
+class JobDownloadView(HostView):
+    """Download the file written by a finished export job."""
+
+    def get(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        name = _job_output(job)
+        if name is None or not os.path.exists(jobs.job_file(name)):
+            raise Http404('This job has no file to download.')
+        fmt = job.result.get('format', 'jsonl')
+        return FileResponse(
+            open(jobs.job_file(name), 'rb'),
+            as_attachment=True,
+            filename=f'questions.{fmt}',
+            content_type=exporter.CONTENT_TYPES.get(fmt, 'application/octet-stream'),
+        )
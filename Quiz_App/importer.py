@@ -0,0 +1,287 @@
+"""
+Bulk question import.
+
+Question banks are read as a stream of QuestionRecord objects from either:
+
+* JSONL, one question per line::
+
+    {"category": "Audio", "question": "What is EQ?", "marks": 1,
+     "answers": [{"text": "Equalization", "correct": true}, {"text": "Echo", "correct": false}]}
+
+* CSV with a header row and one row per answer; consecutive rows with the
+  same category and question form one question::
+
+    category,question,marks,answer,is_correct
+    Audio,What is EQ?,1,Equalization,true
+    Audio,What is EQ?,1,Echo,false
+
+Records are validated (text where text is expected, whole-number marks,
+exactly one correct answer), deduplicated against
+existing questions of the same category by a hash of their normalised text,
+checked for near-duplicates (see similarity.py), and written in chunks with one ``bulk_create`` for questions and one for
+answers per chunk, each chunk in its own transaction.
+"""
+import csv
+import hashlib
+import json
+import re
+from collections import namedtuple
+
+from django.db import transaction
+
+from . import similarity
+from .models import Category, Question, Answer
+from .signals import questions_bulk_changed
+
+CSV_FIELDS = ('category', 'question', 'marks', 'answer', 'is_correct')
+DEFAULT_CHUNK_SIZE = 1000
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'x'}
+
+QuestionRecord = namedtuple('QuestionRecord', ['category', 'question_text', 'marks', 'answers', 'source'])
+
+
+class ImportFormatError(ValueError):
+    """Raised for input that cannot be parsed at all."""
+
+
+class ImportResult:
+    """Counters and messages collected while importing."""
+
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.errors = []
+        self.near_duplicates = []
+        self.category_ids = set()
+
+    @property
+    def invalid(self):
+        return len(self.errors)
+
+    def __str__(self):
+        return (
+            f'{self.created} created, {self.duplicates} duplicates skipped, '
+            f'{len(self.near_duplicates)} near-duplicates, {self.invalid} invalid'
+        )
+
+
+# --- Parsing ---
+
+def parse_jsonl(lines):
+    """Yield QuestionRecords from an iterable of JSON lines."""
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            raise ImportFormatError(f'line {number}: {exc}') from exc
+        if not isinstance(data, dict):
+            raise ImportFormatError(f'line {number}: expected a JSON object')
+        # Values are passed on as they are; validate() checks their types.
+        answers = data.get('answers', ())
+        if isinstance(answers, list) and all(isinstance(a, dict) for a in answers):
+            answers = tuple((a.get('text'), a.get('correct', False)) for a in answers)
+        yield QuestionRecord(data.get('category'), data.get('question'), data.get('marks', 1), answers, f'line {number}')
+
+
+def parse_csv(lines):
+    """Yield QuestionRecords from an iterable of CSV lines (with a header row)."""
+    reader = csv.DictReader(lines)
+    missing = set(CSV_FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise ImportFormatError(f'CSV is missing columns: {", ".join(sorted(missing))}')
+
+    current = None
+    answers = []
+    for row in reader:
+        key = (row['category'], row['question'])
+        if current is not None and key != current[:2]:
+            yield QuestionRecord(current[0], current[1], current[2], tuple(answers), current[3])
+            answers = []
+        if current is None or key != current[:2]:
+            current = (row['category'], row['question'], row['marks'] or 1, f'row {reader.line_num}')
+        if row['answer']:
+            answers.append((row['answer'], (row['is_correct'] or '').strip().lower() in TRUE_VALUES))
+    if current is not None:
+        yield QuestionRecord(current[0], current[1], current[2], tuple(answers), current[3])
+
+
+def parse(lines, fmt):
+    """Dispatch to the parser for ``fmt`` ('csv' or 'jsonl')."""
+    if fmt == 'csv':
+        return parse_csv(lines)
+    if fmt == 'jsonl':
+        return parse_jsonl(lines)
+    raise ImportFormatError(f'Unknown format: {fmt}')
+
+
+# --- Validation and deduplication ---
+
+def normalise(text):
+    """Lower-case and collapse whitespace, for duplicate detection."""
+    return re.sub(r'\s+', ' ', text or '').strip().casefold()
+
+
+def content_hash(question_text):
+    return hashlib.blake2b(normalise(question_text).encode(), digest_size=12).digest()
+
+
+def parse_marks(value):
+    """
+    Return ``value`` as a whole number of marks, or None if it is not one.
+    Accepts ints, integral floats and strings of digits, but not booleans
+    or fractions, which would otherwise be silently truncated.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            return None
+    return None
+
+
+def validate(record):
+    """Return an error message for an invalid record, or None."""
+    if record.category is not None and not isinstance(record.category, str):
+        return f'category must be text, not {record.category!r}'
+    if not (record.category or '').strip():
+        return 'missing category'
+    if record.question_text is not None and not isinstance(record.question_text, str):
+        return f'question text must be text, not {record.question_text!r}'
+    if not (record.question_text or '').strip():
+        return 'missing question text'
+    if len(record.question_text) > Question._meta.get_field('question_text').max_length:
+        return 'question text is too long'
+    if parse_marks(record.marks) is None:
+        return f'marks must be a whole number, not {record.marks!r}'
+    if not isinstance(record.answers, tuple):
+        return 'answers must be a list of objects'
+    if len(record.answers) < 2:
+        return 'a question needs at least two answers'
+    if any(not isinstance(text, str) for text, _ in record.answers):
+        return 'answer text must be text'
+    if any(not isinstance(is_correct, bool) for _, is_correct in record.answers):
+        return 'correct must be true or false'
+    max_answer = Answer._meta.get_field('answer_text').max_length
+    if any(not text.strip() or len(text) > max_answer for text, _ in record.answers):
+        return 'answer text is empty or too long'
+    correct = sum(1 for _, is_correct in record.answers if is_correct)
+    if correct != 1:
+        return f'expected exactly one correct answer, found {correct}'
+    return None
+
+
+class _CategoryIndex:
+    """Category ids by name, plus the hashes of each category's questions."""
+
+    def __init__(self, create):
+        self.create = create
+        self.ids = {}
+        self.hashes = {}
+
+    def resolve(self, name):
+        """Return (category_id or None if unknown, hash set of its questions)."""
+        name = name.strip()
+        if name not in self.ids:
+            if self.create:
+                category_id = Category.objects.get_or_create(name=name)[0].id
+            else:
+                category_id = Category.objects.filter(name=name).values_list('id', flat=True).first()
+            hashes = set()
+            if category_id is not None:
+                texts = Question.objects.filter(category_id=category_id).values_list('question_text', flat=True)
+                hashes.update(content_hash(t) for t in texts.iterator(chunk_size=5000))
+            self.ids[name] = category_id
+            self.hashes[name] = hashes
+        return self.ids[name], self.hashes[name]
+
+
+# --- Writing ---
+
+def _write_chunk(chunk):
+    """Insert one chunk of (category_id, record) pairs; returns the new question ids."""
+    with transaction.atomic():
+        questions = Question.objects.bulk_create([
+            Question(category_id=category_id, question_text=record.question_text.strip(), marks=parse_marks(record.marks))
+            for category_id, record in chunk
+        ])
+        Answer.objects.bulk_create([
+            Answer(question=question, answer_text=text.strip(), is_correct=is_correct)
+            for question, (_, record) in zip(questions, chunk)
+            for text, is_correct in record.answers
+        ])
+    return [q.id for q in questions]
+
+
+def import_questions(records, chunk_size=DEFAULT_CHUNK_SIZE, create_categories=True, dry_run=False,
+                     skip_near_duplicates=False, progress=None):
+    """
+    Import an iterable of QuestionRecords and return an ImportResult.
+
+    Invalid records and exact duplicates are skipped and reported, not fatal.
+    Near-duplicates are reported, and skipped too if ``skip_near_duplicates``.
+    ``progress``, if given, is called with the result after every chunk.
+    """
+    result = ImportResult()
+    index = _CategoryIndex(create=create_categories and not dry_run)
+    checker = similarity.BatchChecker()
+    chunk = []
+    question_ids = []
+
+    def flush():
+        matches = checker.check([(category_id, r.question_text, r.source) for category_id, r in chunk])
+        kept = []
+        for (category_id, record), match in zip(chunk, matches):
+            if match is None:
+                kept.append((category_id, record))
+                continue
+            target = match if isinstance(match, str) else f'question #{match}'
+            result.near_duplicates.append(f'{record.source}: similar to {target}')
+            if not skip_near_duplicates:
+                kept.append((category_id, record))
+        if kept and not dry_run:
+            question_ids.extend(_write_chunk(kept))
+        result.created += len(kept)
+        chunk.clear()
+        if progress is not None:
+            progress(result)
+
+    try:
+        for record in records:
+            error = validate(record)
+            if error is None:
+                category_id, hashes = index.resolve(record.category)
+                if category_id is None and not dry_run:
+                    error = f'unknown category {record.category!r}'
+            if error is not None:
+                result.errors.append(f'{record.source}: {error}')
+                continue
+
+            digest = content_hash(record.question_text)
+            if digest in hashes:
+                result.duplicates += 1
+                continue
+            hashes.add(digest)
+
+            chunk.append((category_id, record))
+            if category_id is not None:
+                result.category_ids.add(category_id)
+            if len(chunk) >= chunk_size:
+                flush()
+        flush()
+    finally:
+        # Chunks are committed as they go, so even if the input turns out to
+        # be malformed halfway through, what was written gets indexed.
+        if question_ids:
+            questions_bulk_changed.send(
+                sender=Question, category_ids=result.category_ids, question_ids=question_ids,
+            )
+    return result
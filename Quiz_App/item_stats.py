@@ -0,0 +1,155 @@
+"""
+Item analysis of questions from stored attempt answers.
+
+For every question that has been answered, ``compute()`` works out:
+
+* difficulty, the p-value: the share of responses that were correct;
+* discrimination, the corrected point-biserial correlation between getting
+  the question right and the rest of the attempt's score (the attempt's
+  score without this question, as a fraction of the marks still available);
+* the selection rate of every answer choice, which for wrong answers is the
+  distractor rate.
+
+All heavy lifting is grouped aggregation in SQL: one query returns one row of
+sums per question and one returns a count per chosen answer, and both are
+streamed. Python only combines the sums, so its work and memory depend on
+the number of questions and answers, not on how many AttemptAnswer rows
+there are. Results are written to QuestionStats/AnswerStats in batches.
+"""
+import math
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, NullIf
+from django.utils import timezone
+
+from .models import AttemptAnswer, QuestionStats, AnswerStats
+
+BATCH_SIZE = 1000
+# Below this many responses the figures are too noisy to flag a question.
+MIN_RESPONSES = 20
+# Flag thresholds for the host question list.
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+LOW_DISCRIMINATION = 0.2
+
+
+def _rest_score():
+    """Per answer row: the attempt's other marks as a fraction of the marks available for them."""
+    return (
+        Cast(F('attempt__score') - F('marks_awarded'), FloatField())
+        / NullIf(F('attempt__total_marks') - F('question__marks'), Value(0))
+    )
+
+
+def _question_sums(answers):
+    x = _rest_score()
+    correct = Q(is_correct=True)
+    return (
+        answers
+        .values('question_id')
+        .annotate(
+            n=Count('id'),
+            n_correct=Count('id', filter=correct),
+            nx=Count(x),
+            nx_correct=Count(x, filter=correct),
+            sx=Sum(x),
+            sx_correct=Sum(x, filter=correct),
+            sxx=Sum(x * x),
+        )
+        .order_by()
+    )
+
+
+def point_biserial(nx, nx_correct, sx, sx_correct, sxx):
+    """
+    Point-biserial correlation from sums over the responses with a rest
+    score: (M1 - M0) / s * sqrt(p * q). None when it is undefined.
+    """
+    nx_wrong = nx - nx_correct
+    if not nx_correct or not nx_wrong:
+        return None
+    mean = sx / nx
+    variance = sxx / nx - mean * mean
+    if variance <= 1e-12:
+        return None
+    mean_correct = sx_correct / nx_correct
+    mean_wrong = (sx - sx_correct) / nx_wrong
+    p = nx_correct / nx
+    return (mean_correct - mean_wrong) / math.sqrt(variance) * math.sqrt(p * (1 - p))
+
+
+@transaction.atomic
+def compute(category_ids=None, batch_size=BATCH_SIZE):
+    """
+    Recompute item statistics for the questions of the given categories (all
+    if None), replacing the previous figures. Returns (questions, answers)
+    written.
+    """
+    answers = AttemptAnswer.objects.all()
+    if category_ids is not None:
+        answers = answers.filter(question__category_id__in=category_ids)
+
+    now = timezone.now()
+    responses = {}
+    question_rows = []
+    for row in _question_sums(answers).iterator(chunk_size=batch_size):
+        n = row['n']
+        responses[row['question_id']] = n
+        question_rows.append(QuestionStats(
+            question_id=row['question_id'],
+            responses=n,
+            correct=row['n_correct'],
+            p_value=row['n_correct'] / n,
+            discrimination=point_biserial(
+                row['nx'], row['nx_correct'], row['sx'] or 0.0, row['sx_correct'] or 0.0, row['sxx'] or 0.0,
+            ),
+            computed_at=now,
+        ))
+
+    # Selections per chosen answer; skipped questions have no answer.
+    top_distractor = {}
+    answer_rows = []
+    selections = (
+        answers
+        .filter(answer__isnull=False)
+        .values('answer_id', 'question_id', 'answer__is_correct')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in selections.iterator(chunk_size=batch_size):
+        rate = row['n'] / responses[row['question_id']]
+        answer_rows.append(AnswerStats(answer_id=row['answer_id'], selections=row['n'], selection_rate=rate))
+        if not row['answer__is_correct']:
+            top_distractor[row['question_id']] = max(rate, top_distractor.get(row['question_id'], 0.0))
+
+    for stats in question_rows:
+        stats.top_distractor_rate = top_distractor.get(stats.question_id, 0.0)
+
+    existing_questions = QuestionStats.objects.all()
+    existing_answers = AnswerStats.objects.all()
+    if category_ids is not None:
+        existing_questions = existing_questions.filter(question__category_id__in=category_ids)
+        existing_answers = existing_answers.filter(answer__question__category_id__in=category_ids)
+    existing_questions.delete()
+    existing_answers.delete()
+    QuestionStats.objects.bulk_create(question_rows, batch_size=batch_size)
+    AnswerStats.objects.bulk_create(answer_rows, batch_size=batch_size)
+    return len(question_rows), len(answer_rows)
+
+
+def flags(stats):
+    """Short warnings for the host question list, e.g. ['too easy']."""
+    if stats is None or stats.responses < MIN_RESPONSES:
+        return []
+    found = []
+    if stats.p_value >= TOO_EASY:
+        found.append('too easy')
+    elif stats.p_value <= TOO_HARD:
+        found.append('too hard')
+    if stats.discrimination is not None and stats.discrimination < LOW_DISCRIMINATION:
+        found.append('low discrimination')
+    if stats.top_distractor_rate and stats.top_distractor_rate > stats.p_value:
+        # A wrong answer is more popular than the right one.
+        found.append('ambiguous')
+    return found
@@ -0,0 +1,402 @@
+"""
+Background jobs for the host panel.
+
+Long operations (imports, exports, recounts, analytics) are not run inside
+a request. The host panel queues a Job row with ``enqueue()`` and polls it;
+``manage.py run_quiz_worker`` claims queued jobs and runs them in a thread
+pool. The queue is the database, so no broker is needed and any number of
+workers can share it: a job is claimed by a conditional UPDATE, which only
+one worker can win.
+
+Tasks are plain functions registered with ``@task('name')``. They are called
+with a JobContext and the job's params, can report progress through
+``ctx.progress()``, and return a JSON-serialisable result. A task that
+raises is retried with exponential back-off until ``max_attempts``, then the
+job fails with the traceback. While a task runs, a heartbeat thread stamps
+the job every HEARTBEAT_INTERVAL, however long the task goes without
+reporting progress. Jobs whose worker stopped sending heartbeats (it
+crashed or was killed) are put back on the queue after STALE_AFTER; the
+lost run counts as an attempt, so a job that keeps killing its worker
+fails after ``max_attempts`` instead of being retried forever.
+
+Tasks invalidate cached data (banks, counters, leaderboards) through the
+QUIZ_CACHE_ALIAS cache, so the worker and the web processes must share it;
+``run_quiz_worker`` refuses to start with a per-process cache.
+
+Files a job reads or writes (an uploaded import, an export) live in
+``settings.QUIZ_JOB_DIR``; ``purge()`` removes old finished jobs and their
+files.
+"""
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from . import exporter, importer, item_stats, leaderboard, search, stats
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress writes; progress in between is only kept in memory.
+PROGRESS_INTERVAL = 1.0
+# A running job with no heartbeat for this long is assumed abandoned.
+STALE_AFTER = timedelta(minutes=10)
+# Seconds between heartbeats of a running job.
+HEARTBEAT_INTERVAL = 60
+# First retry delay in seconds, doubled on every further attempt.
+RETRY_DELAY = 30
+# Finished jobs (and their files) are purged after this long.
+RETENTION = timedelta(days=7)
+
+TASKS = {}
+
+
+class JobFailed(Exception):
+    """Raised by a task for a failure that retrying cannot fix."""
+
+
+def task(name):
+    """Register a function as the task ``name``."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def job_dir():
+    path = getattr(settings, 'QUIZ_JOB_DIR', os.path.join(settings.BASE_DIR, 'media', 'jobs'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def job_file(name):
+    """Absolute path of a file in the job directory."""
+    return os.path.join(job_dir(), os.path.basename(name))
+
+
+def new_file_name(suffix):
+    return f'{uuid.uuid4().hex}{suffix}'
+
+
+def store_upload(upload, suffix):
+    """Save an uploaded file in the job directory and return its name."""
+    name = new_file_name(suffix)
+    with open(job_file(name), 'wb') as out:
+        for chunk in upload.chunks():
+            out.write(chunk)
+    return name
+
+
+def enqueue(kind, params=None, user=None, max_attempts=3):
+    """Queue the task ``kind`` and return its Job."""
+    if kind not in TASKS:
+        raise ValueError(f'Unknown task: {kind}')
+    return Job.objects.create(kind=kind, params=params or {}, created_by=user, max_attempts=max_attempts)
+
+
+class JobContext:
+    """What a running task gets to report progress with."""
+
+    def __init__(self, job):
+        self.job = job
+        self._last_write = 0.0
+
+    def progress(self, done, total=None, message=''):
+        """Record progress; written to the database at most every PROGRESS_INTERVAL."""
+        self.job.progress_done = done
+        self.job.progress_total = total
+        self.job.message = str(message)[:255]
+        now = time.monotonic()
+        if now - self._last_write >= PROGRESS_INTERVAL:
+            self._last_write = now
+            Job.objects.filter(pk=self.job.pk).update(
+                progress_done=done, progress_total=total, message=self.job.message, heartbeat_at=timezone.now(),
+            )
+
+
+class Heartbeat:
+    """
+    Stamps a running job's heartbeat_at from a thread of its own, so a task
+    that reports no progress for a while is not taken for abandoned.
+    """
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = HEARTBEAT_INTERVAL if interval is None else interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'quiz-heartbeat-{job.pk}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def beat(self):
+        """Stamp the job, unless it is no longer this run's. Returns whether it was."""
+        return bool(Job.objects.filter(pk=self.job.pk, status=Job.RUNNING, worker=self.job.worker).update(
+            heartbeat_at=timezone.now(),
+        ))
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                self.beat()
+        finally:
+            # The thread's own connection, if it opened one.
+            connection.close()
+
+
+# --- Claiming and running ---
+
+def claim(worker):
+    """Claim the next runnable job for ``worker``, or return None."""
+    while True:
+        now = timezone.now()
+        candidate = (
+            Job.objects
+            .filter(status=Job.QUEUED, run_after__lte=now)
+            .order_by('run_after', 'id')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if candidate is None:
+            return None
+        won = Job.objects.filter(pk=candidate, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+        )
+        if won:
+            return Job.objects.get(pk=candidate)
+        # Another worker got there first; try the next one.
+
+
+def run(job):
+    """Run a claimed job to success, retry or failure."""
+    func = TASKS.get(job.kind)
+    job.attempts += 1
+    Job.objects.filter(pk=job.pk).update(attempts=job.attempts)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task: {job.kind}')
+        with Heartbeat(job):
+            result = func(JobContext(job), **job.params)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s failed (attempt %d of %d)', job, job.attempts, job.max_attempts, exc_info=True)
+        retryable = func is not None and not isinstance(sys.exc_info()[1], JobFailed)
+        if retryable and job.attempts < job.max_attempts:
+            delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.QUEUED, error=error, worker='', run_after=timezone.now() + timedelta(seconds=delay),
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, error=error, finished_at=timezone.now())
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.SUCCEEDED, result=result, error='', finished_at=timezone.now(),
+            progress_done=job.progress_done, progress_total=job.progress_total, message=job.message,
+        )
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale():
+    """
+    Put jobs abandoned by a dead worker back on the queue, or fail them if
+    that run was their last attempt (run() counts an attempt as it starts).
+    Returns how many were requeued.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - STALE_AFTER)
+    error = f'The worker stopped sending heartbeats for more than {STALE_AFTER}.'
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, worker='', error=error, finished_at=now,
+    )
+    return stale.update(status=Job.QUEUED, worker='', error=error)
+
+
+def run_pending(worker='inline', limit=None):
+    """Run runnable jobs in this thread until none are left. Returns how many ran."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker)
+        if job is None:
+            break
+        run(job)
+        count += 1
+    return count
+
+
+def purge(older_than=RETENTION):
+    """Delete finished jobs older than ``older_than`` and their files. Returns how many."""
+    old = Job.objects.filter(
+        status__in=[Job.SUCCEEDED, Job.FAILED], finished_at__lt=timezone.now() - older_than,
+    )
+    count = 0
+    for job in old.iterator():
+        for name in _files_of(job):
+            try:
+                os.remove(job_file(name))
+            except FileNotFoundError:
+                pass
+        job.delete()
+        count += 1
+    return count
+
+
+def _files_of(job):
+    names = [job.params.get('file')]
+    if isinstance(job.result, dict):
+        names.append(job.result.get('file'))
+    return [name for name in names if name]
+
+
+class Worker:
+    """
+    Claims and runs jobs with ``threads`` threads. Each thread polls the
+    queue every ``poll_interval`` seconds while it is empty.
+    """
+
+    def __init__(self, threads=2, poll_interval=2.0, name=None):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.processed = 0
+        self._lock = threading.Lock()
+        self._last_requeue = 0.0
+
+    def stop(self):
+        self.stopping.set()
+
+    def _loop(self, number, max_jobs, burst):
+        worker = f'{self.name}/{number}'
+        try:
+            while not self.stopping.is_set():
+                if max_jobs is not None and self.processed >= max_jobs:
+                    return
+                job = claim(worker)
+                if job is None:
+                    if burst:
+                        return
+                    self._requeue_stale()
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                logger.info('%s running %s', worker, job)
+                run(job)
+                with self._lock:
+                    self.processed += 1
+                # Long-lived threads must not keep a connection past its lifetime.
+                close_old_connections()
+        finally:
+            close_old_connections()
+
+    def _requeue_stale(self):
+        """requeue_stale() at most every HEARTBEAT_INTERVAL, from one thread at a time."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_requeue < HEARTBEAT_INTERVAL:
+                return
+            self._last_requeue = now
+        requeue_stale()
+
+    def run(self, max_jobs=None, burst=False):
+        """
+        Run until stop() is called, about ``max_jobs`` jobs were processed,
+        or, with ``burst``, the queue is empty. Returns the number processed.
+        Jobs abandoned by other workers are requeued on start and then
+        whenever the queue is idle.
+        """
+        self._last_requeue = time.monotonic()
+        requeue_stale()
+        purge()
+        if self.threads == 1:
+            self._loop(0, max_jobs, burst)
+            return self.processed
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='quiz-worker') as pool:
+            for future in [pool.submit(self._loop, n, max_jobs, burst) for n in range(self.threads)]:
+                future.result()
+        return self.processed
+
+
+# --- Tasks ---
+
+@task('import_questions')
+def import_questions_task(ctx, file, format='jsonl', create_categories=True, skip_near_duplicates=False):
+    """Import an uploaded question bank (see importer.py)."""
+    def progress(result):
+        ctx.progress(result.created + result.duplicates + result.invalid, None, str(result))
+
+    with open(job_file(file), encoding='utf-8', newline='') as stream:
+        try:
+            result = importer.import_questions(
+                importer.parse(stream, format),
+                create_categories=create_categories,
+                skip_near_duplicates=skip_near_duplicates,
+                progress=progress,
+            )
+        except importer.ImportFormatError as exc:
+            raise JobFailed(str(exc))
+    ctx.progress(result.created + result.duplicates + result.invalid, None, str(result))
+    return {
+        'created': result.created,
+        'duplicates': result.duplicates,
+        'invalid': result.invalid,
+        'near_duplicates': len(result.near_duplicates),
+        'errors': [str(error) for error in result.errors[:20]],
+    }
+
+
+@task('export_questions')
+def export_questions_task(ctx, format='jsonl', category_ids=None):
+    """Write the question bank to a file in the job directory."""
+    name = new_file_name(f'.{format}')
+    lines = 0
+    with open(job_file(name), 'w', encoding='utf-8', newline='') as out:
+        for line in exporter.export(format, category_ids):
+            out.write(line)
+            lines += 1
+            if lines % 1000 == 0:
+                ctx.progress(lines, None, f'{lines} lines written')
+    ctx.progress(lines, lines, f'{lines} lines written')
+    return {'file': name, 'format': format, 'lines': lines}
+
+
+@task('recount_stats')
+def recount_stats_task(ctx, category_ids=None):
+    """Recompute the dashboard counters (see stats.py)."""
+    return {'categories': stats.recount(category_ids)}
+
+
+@task('compute_item_stats')
+def compute_item_stats_task(ctx, category_ids=None):
+    """Recompute per-question item statistics (see item_stats.py)."""
+    questions, answers = item_stats.compute(category_ids)
+    return {'questions': questions, 'answers': answers}
+
+
+@task('rebuild_leaderboards')
+def rebuild_leaderboards_task(ctx):
+    """Recompute every leaderboard from the attempts (see leaderboard.py)."""
+    return {'entries': leaderboard.rebuild()}
+
+
+@task('rebuild_search_index')
+def rebuild_search_index_task(ctx):
+    """Rebuild the full-text search index (see search.py)."""
+    if not search.fts_available():
+        return {'questions': 0}
+    return {'questions': search.rebuild()}
@@ -0,0 +1,222 @@
+"""
+Materialised leaderboards.
+
+Every category has a leaderboard of each user's best attempt, and there is
+one global leaderboard of the sum of each user's category bests. Both are
+stored as LeaderboardEntry rows, which ``attempt_finished()`` (called from
+signals.py when an Attempt is created) raises in place: a handful of indexed
+single-row queries per attempt, never a sort of the attempts table.
+
+For reading, a board is cached as a Board: the top TOP_SIZE entries, every
+user's points and a sorted array of all points. Showing a board and the
+current user's rank is then one cache read, and the rank is a binary search,
+O(log n). Finished attempts patch the cached Board once their transaction
+commits rather than dropping it, so busy boards are not rebuilt after every
+attempt. Two workers patching the same Board at once can lose one update;
+BOARD_TIMEOUT bounds how long that can show.
+
+Scores are ranked as a percentage of the marks available (stored in
+hundredths of a percent), since attempts can draw different questions. Ties
+share a rank. ``manage.py rebuild_leaderboards`` recomputes every entry from
+the attempts, e.g. after attempts were deleted.
+"""
+import bisect
+from array import array
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, FloatField, Max
+from django.db.models.functions import Cast, NullIf
+
+from .models import Attempt, LeaderboardEntry
+
+# 100% is 10000 points.
+POINTS_SCALE = 10000
+TOP_SIZE = 20
+BOARD_TIMEOUT = 60 * 10
+
+
+def points_for(score, total_marks):
+    """An attempt's score as hundredths of a percent of the marks available."""
+    if not total_marks:
+        return 0
+    return round(score * POINTS_SCALE / total_marks)
+
+
+class Board:
+    """
+    Read-only ranking snapshot of one leaderboard. ``top`` is a list of
+    (user_id, username, points) in rank order.
+    """
+
+    __slots__ = ('category_id', 'top', 'points', '_sorted')
+
+    def __init__(self, category_id, rows):
+        """``rows`` is (user_id, username, points) for every entry, best first."""
+        self.category_id = category_id
+        self.top = [tuple(row) for row in rows[:TOP_SIZE]]
+        self.points = {user_id: points for user_id, _, points in rows}
+        # Negated so that better scores sort first.
+        self._sorted = array('q', sorted(-points for points in self.points.values()))
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def __getstate__(self):
+        return self.category_id, self.top, self.points, self._sorted
+
+    def __setstate__(self, state):
+        self.category_id, self.top, self.points, self._sorted = state
+
+    def rank_of(self, points):
+        """1-based competition rank ("1224") of a score on this board."""
+        return bisect.bisect_left(self._sorted, -points) + 1
+
+    def rank(self, user_id):
+        """The user's rank, or None if they are not on the board."""
+        points = self.points.get(user_id)
+        return None if points is None else self.rank_of(points)
+
+    def ranked_top(self):
+        """Yield (rank, user_id, username, points) for the top entries."""
+        for user_id, username, points in self.top:
+            yield self.rank_of(points), user_id, username, points
+
+    def update(self, user_id, username, points):
+        """Set a user's points, keeping the sorted array and top list in order."""
+        old = self.points.get(user_id)
+        if old is not None:
+            del self._sorted[bisect.bisect_left(self._sorted, -old)]
+        bisect.insort(self._sorted, -points)
+        self.points[user_id] = points
+
+        top = [row for row in self.top if row[0] != user_id]
+        if len(top) < TOP_SIZE or points > top[-1][2]:
+            # After entries with the same points: they got there first.
+            position = len(top)
+            while position and top[position - 1][2] < points:
+                position -= 1
+            top.insert(position, (user_id, username, points))
+        self.top = top[:TOP_SIZE]
+
+
+def _cache():
+    return caches[getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')]
+
+
+def _board_key(category_id):
+    return f'quiz:leaderboard:{category_id or "all"}'
+
+
+def build_board(category_id):
+    """Build a Board from the entries, in one query."""
+    rows = list(
+        LeaderboardEntry.objects
+        .filter(category_id=category_id)
+        .order_by('-points', 'achieved_at', 'user_id')
+        .values_list('user_id', 'user__username', 'points')
+    )
+    return Board(category_id, rows)
+
+
+def get_board(category_id=None):
+    """The Board of a category, or the global one. One cache read when warm."""
+    cache = _cache()
+    key = _board_key(category_id)
+    board = cache.get(key)
+    if board is None:
+        board = build_board(category_id)
+        cache.set(key, board, BOARD_TIMEOUT)
+    return board
+
+
+def _patch_cached(category_id, user_id, username, points):
+    cache = _cache()
+    key = _board_key(category_id)
+    board = cache.get(key)
+    if board is not None:
+        board.update(user_id, username, points)
+        cache.set(key, board, BOARD_TIMEOUT)
+
+
+# --- Incremental updates ---
+
+def _raise_entry(category_id, user_id, points, when):
+    """
+    Raise the user's entry to ``points`` if that is an improvement.
+    Returns the previous points (0 for a new entry), or None if unchanged.
+    """
+    entry, created = LeaderboardEntry.objects.get_or_create(
+        category_id=category_id, user_id=user_id, defaults={'points': points, 'achieved_at': when},
+    )
+    if created:
+        return 0
+    if points <= entry.points:
+        return None
+    previous = entry.points
+    LeaderboardEntry.objects.filter(pk=entry.pk).update(points=points, achieved_at=when)
+    return previous
+
+
+def attempt_finished(attempt):
+    """Update the category and global leaderboards for a new Attempt."""
+    points = points_for(attempt.score, attempt.total_marks)
+    when = attempt.finished_at
+    previous = _raise_entry(attempt.category_id, attempt.user_id, points, when)
+    if previous is None:
+        return
+
+    delta = points - previous
+    entry, created = LeaderboardEntry.objects.get_or_create(
+        category=None, user_id=attempt.user_id, defaults={'points': delta, 'achieved_at': when},
+    )
+    if not created:
+        LeaderboardEntry.objects.filter(pk=entry.pk).update(points=F('points') + delta, achieved_at=when)
+        entry.points += delta
+
+    username = attempt.user.get_username()
+    global_points = entry.points
+
+    def patch():
+        _patch_cached(attempt.category_id, attempt.user_id, username, points)
+        _patch_cached(None, attempt.user_id, username, global_points)
+
+    transaction.on_commit(patch)
+
+
+# --- Full rebuild ---
+
+@transaction.atomic
+def rebuild():
+    """Recompute every leaderboard from the attempts. Returns the number of entries."""
+    best = (
+        Attempt.objects
+        .values('category_id', 'user_id')
+        .annotate(
+            best=Max(Cast(F('score') * POINTS_SCALE, FloatField()) / NullIf(F('total_marks'), 0)),
+            # Tie-breaker only; the latest attempt rather than the best one.
+            last=Max('finished_at'),
+        )
+        .order_by()
+    )
+    entries = []
+    totals = {}
+    for row in best.iterator(chunk_size=2000):
+        points = round(row['best'] or 0)
+        entries.append(LeaderboardEntry(
+            category_id=row['category_id'], user_id=row['user_id'], points=points, achieved_at=row['last'],
+        ))
+        total, last = totals.get(row['user_id'], (0, row['last']))
+        totals[row['user_id']] = (total + points, max(last, row['last']))
+    entries.extend(
+        LeaderboardEntry(category=None, user_id=user_id, points=total, achieved_at=last)
+        for user_id, (total, last) in totals.items()
+    )
+
+    LeaderboardEntry.objects.all().delete()
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+    category_ids = {entry.category_id for entry in entries}
+    category_ids.add(None)
+    _cache().delete_many([_board_key(category_id) for category_id in category_ids])
+    return len(entries)
@@ -0,0 +1,110 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Quiz_App import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the candidate flow (register, login, quiz, results) with concurrent simulated "
+        "users over the banks created by manage.py seed_benchmark, and report latency percentiles, "
+        "requests per second and queries per request. Fails if queries per request grew against the "
+        "checked-in baseline, or if latency, throughput or queries regressed against a report saved "
+        "on this machine with --save-baseline --baseline PATH and passed as --baseline PATH. "
+        "--no-baseline skips the check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server, e.g. http://127.0.0.1:8000. "
+                                          "Without it the flow runs in-process against the configured database.")
+        parser.add_argument('--users', type=int, default=20, help="Simulated candidates.")
+        parser.add_argument('--concurrency', type=int, help="Candidates running at once (default: all).")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the candidates' answers.")
+        parser.add_argument('--categories', nargs='+', help="Category names to take (default: every benchmark bank).")
+        parser.add_argument('--baseline',
+                            help="Full report JSON from this machine to compare against, latency included "
+                                 "(default: only queries per request, against the checked-in baseline).")
+        parser.add_argument('--no-baseline', action='store_true', help="Do not compare against a baseline.")
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Write this run's report to --baseline, or without it its queries per "
+                                 "request to the checked-in baseline.")
+        parser.add_argument('--output', help="Also write this run's report as JSON here.")
+        parser.add_argument('--latency-tolerance', type=float, default=benchmark.LATENCY_TOLERANCE,
+                            help="Allowed p95 latency growth per step, as a fraction.")
+        parser.add_argument('--throughput-tolerance', type=float, default=benchmark.THROUGHPUT_TOLERANCE,
+                            help="Allowed drop in requests per second, as a fraction.")
+        parser.add_argument('--query-tolerance', type=float, default=benchmark.QUERY_TOLERANCE,
+                            help="Allowed growth in mean queries per request, per step.")
+
+    def handle(self, *args, **options):
+        if options['save_baseline'] and options['no_baseline']:
+            raise CommandError("--save-baseline and --no-baseline cannot be combined.")
+        categories = benchmark.benchmark_categories()
+        if options['categories']:
+            wanted = set(options['categories'])
+            categories = [row for row in categories if row[1] in wanted]
+            missing = sorted(wanted - {name for _, name in categories})
+            if missing:
+                raise CommandError(f"Unknown benchmark categories: {', '.join(missing)}")
+
+        try:
+            report = benchmark.run(
+                users=options['users'], concurrency=options['concurrency'], base_url=options['url'],
+                categories=categories, seed=options['seed'],
+            )
+        except benchmark.BenchmarkError as exc:
+            raise CommandError(str(exc))
+        self._print(report)
+        if options['output']:
+            self._write(options['output'], report)
+
+        if report['errors']:
+            for error in report['errors'][:10]:
+                self.stderr.write(f"  {error}")
+            raise CommandError(f"{len(report['errors'])} simulated candidates failed.")
+
+        path = options['baseline'] or benchmark.QUERY_BASELINE_PATH
+        if options['save_baseline']:
+            self._write(path, report if options['baseline'] else benchmark.machine_independent(report))
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {path}."))
+        elif not options['no_baseline']:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline: {exc}")
+            if (report['users'], report['categories']) != (baseline.get('users'), baseline.get('categories')):
+                self.stderr.write(self.style.WARNING(
+                    f"The baseline ran {baseline.get('users')} candidates over {', '.join(baseline.get('categories', []))}; "
+                    "numbers from a different run are only roughly comparable."
+                ))
+            regressions = benchmark.compare(
+                report, baseline,
+                latency_tolerance=options['latency_tolerance'],
+                throughput_tolerance=options['throughput_tolerance'],
+                query_tolerance=options['query_tolerance'],
+            )
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(self.style.ERROR(f"  REGRESSION {regression}"))
+                raise CommandError(f"{len(regressions)} regressions against {path}.")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def _print(self, report):
+        self.stdout.write(
+            f"{report['users']} candidates, {report['requests']} requests in {report['seconds']} s "
+            f"({report['requests_per_second']} req/s) over {', '.join(report['categories'])}"
+        )
+        self.stdout.write(f"{'step':<16}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+        for step, row in report['steps'].items():
+            queries = '-' if row['avg_queries'] is None else row['avg_queries']
+            self.stdout.write(
+                f"{step:<16}{row['requests']:>9}{row['errors']:>8}{row['p50_ms']:>10}"
+                f"{row['p95_ms']:>10}{row['p99_ms']:>10}{queries:>9}"
+            )
+
+    def _write(self, path, report):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
@@ -0,0 +1,70 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Quiz_App import sqlite_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent quiz submissions per second with Django's stock SQLite settings and with "
+        "the tuned production profile (WAL, busy timeout, immediate transactions, persistent "
+        "connections), each on a fresh copy of a seeded database. The configured database is not "
+        "touched. See Quiz_App/sqlite_benchmark.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=sqlite_benchmark.PROFILES,
+                            default=list(sqlite_benchmark.PROFILES), help="Profiles to measure; the first is the baseline.")
+        parser.add_argument('--processes', type=int, default=4, help="Worker processes per profile.")
+        parser.add_argument('--threads', type=int, default=4, help="Submitting threads per process.")
+        parser.add_argument('--seconds', type=float, default=10.0, help="How long each profile is measured.")
+        parser.add_argument('--size', type=int, default=sqlite_benchmark.DEFAULT_SIZE,
+                            help="Questions in the benchmark bank.")
+        parser.add_argument('--output', help="Also write the report as JSON here.")
+        # Used by the benchmark itself to start its worker processes.
+        parser.add_argument('--child', action='store_true', help="Run one worker process and print its results.")
+        parser.add_argument('--category', help="Bank to submit quizzes for (with --child).")
+        parser.add_argument('--start-at', type=float, help="time.time() at which to start (with --child).")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the answers (with --child).")
+
+    def handle(self, *args, **options):
+        if options['child']:
+            return self.child(options)
+        if min(options['processes'], options['threads']) < 1 or options['seconds'] <= 0:
+            raise CommandError("--processes, --threads and --seconds must be positive.")
+
+        try:
+            report = sqlite_benchmark.compare_profiles(
+                options['profiles'], options['processes'], options['threads'], options['seconds'],
+                options['size'], progress=self.stdout.write,
+            )
+        except sqlite_benchmark.SqliteBenchmarkError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(
+            f"{'profile':<12}{'submissions':>12}{'per sec':>10}{'errors':>8}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'speedup':>9}"
+        )
+        for row in report['profiles']:
+            self.stdout.write(
+                f"{row['profile']:<12}{row['submissions']:>12}{row['submissions_per_second']:>10}{row['errors']:>8}"
+                f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['speedup']!s:>9}"
+            )
+            for sample in row['error_samples']:
+                self.stderr.write(f"  {row['profile']}: {sample}")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+
+    def child(self, options):
+        try:
+            category_id = sqlite_benchmark.bench_category_id(options['category'])
+        except sqlite_benchmark.SqliteBenchmarkError as exc:
+            raise CommandError(str(exc))
+        result = sqlite_benchmark.submission_load(
+            category_id, threads=options['threads'], seconds=options['seconds'],
+            start_at=options['start_at'], seed=options['seed'],
+        )
+        self.stdout.write(json.dumps(result))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Quiz_App import item_stats
+from Quiz_App.models import Category
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute difficulty, discrimination and distractor rates for every answered question "
+        "from stored attempt answers, replacing the previous figures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('categories', nargs='*', help="Category names to analyse (default: all).")
+        parser.add_argument('--batch-size', type=int, default=item_stats.BATCH_SIZE,
+                            help="Rows fetched and written per batch.")
+
+    def handle(self, *args, **options):
+        category_ids = None
+        if options['categories']:
+            found = dict(Category.objects.filter(name__in=options['categories']).values_list('name', 'id'))
+            missing = sorted(set(options['categories']) - set(found))
+            if missing:
+                raise CommandError(f"Unknown categories: {', '.join(missing)}")
+            category_ids = list(found.values())
+
+        started = time.monotonic()
+        questions, answers = item_stats.compute(category_ids, batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Analysed {questions} questions and {answers} answer choices in {elapsed:.1f}s."
+        ))
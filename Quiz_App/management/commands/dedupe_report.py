@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Quiz_App import similarity
+from Quiz_App.models import Category, Question
+
+
+class Command(BaseCommand):
+    help = "List clusters of near-duplicate questions in a category."
+
+    def add_arguments(self, parser):
+        parser.add_argument('category', help="Category name.")
+        parser.add_argument('--threshold', type=float, default=similarity.THRESHOLD,
+                            help="Estimated similarity (0-1) at which questions count as near-duplicates.")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Recompute every signature in the category first.")
+
+    def handle(self, *args, **options):
+        category = Category.objects.filter(name=options['category']).first()
+        if category is None:
+            raise CommandError(f"Unknown category: {options['category']}")
+
+        if options['rebuild']:
+            similarity.index_questions(list(category.questions.values_list('id', flat=True)))
+        clusters = similarity.duplicate_report(category.id, threshold=options['threshold'])
+
+        texts = dict(Question.objects.filter(
+            id__in=[qid for cluster in clusters for qid in cluster]
+        ).values_list('id', 'question_text'))
+        for number, cluster in enumerate(clusters, start=1):
+            self.stdout.write(f"Cluster {number}:")
+            for question_id in cluster:
+                self.stdout.write(f"  #{question_id}: {texts.get(question_id, '')}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(clusters)} near-duplicate clusters in '{category.name}'."
+        ))
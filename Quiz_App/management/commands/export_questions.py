@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Quiz_App import exporter
+from Quiz_App.models import Category
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream categories, questions and answers to CSV or JSONL, in the "
+        "format accepted by import_questions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='jsonl')
+        parser.add_argument('--category', action='append', default=[],
+                            help="Only export this category (by name). May be given more than once.")
+        parser.add_argument('--output', '-o', default='-',
+                            help="File to write, or '-' for standard output.")
+
+    def handle(self, *args, **options):
+        category_ids = None
+        if options['category']:
+            found = dict(Category.objects.filter(name__in=options['category']).values_list('name', 'id'))
+            missing = set(options['category']) - set(found)
+            if missing:
+                raise CommandError(f"Unknown categories: {', '.join(sorted(missing))}")
+            category_ids = list(found.values())
+
+        lines = exporter.export(options['format'], category_ids)
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                f.writelines(lines)
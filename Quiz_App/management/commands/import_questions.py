@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Quiz_App import importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a question bank from a CSV or JSONL file. The file is streamed, "
+        "validated, deduplicated against existing questions and written in "
+        "chunked bulk inserts. See Quiz_App/importer.py for the file formats."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument('--format', choices=['auto', 'csv', 'jsonl'], default='auto',
+                            help="Input format. 'auto' picks by file extension.")
+        parser.add_argument('--chunk-size', type=int, default=importer.DEFAULT_CHUNK_SIZE,
+                            help="Questions written per transaction.")
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help="Reject questions whose category does not exist yet.")
+        parser.add_argument('--skip-near-duplicates', action='store_true',
+                            help="Skip questions that are near-duplicates of existing or earlier ones.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Validate and count without writing anything.")
+        parser.add_argument('--show-errors', type=int, default=20,
+                            help="How many invalid records and near-duplicates to list.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt == 'auto':
+            fmt = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+        if path != '-' and not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+
+        def progress(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  ... {result}")
+
+        started = time.monotonic()
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            result = importer.import_questions(
+                importer.parse(stream, fmt),
+                chunk_size=options['chunk_size'],
+                create_categories=not options['no_create_categories'],
+                dry_run=options['dry_run'],
+                skip_near_duplicates=options['skip_near_duplicates'],
+                progress=progress,
+            )
+        except importer.ImportFormatError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if path != '-':
+                stream.close()
+
+        self.report("invalid", result.errors, options['show_errors'])
+        self.report("near-duplicate", result.near_duplicates, options['show_errors'])
+
+        elapsed = time.monotonic() - started
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{result} in {elapsed:.1f}s."))
+
+    def report(self, label, messages, limit):
+        for message in messages[:limit]:
+            self.stderr.write(f"  {label} {message}")
+        if len(messages) > limit:
+            self.stderr.write(f"  ... and {len(messages) - limit} more")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Quiz_App import leaderboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every category and global leaderboard from the stored attempts. "
+        "Finished attempts update the leaderboards as they happen; run this after deleting attempts or categories."
+    )
+
+    def handle(self, *args, **options):
+        count = leaderboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} leaderboard entries."))
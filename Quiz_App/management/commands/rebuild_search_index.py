@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from Quiz_App import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text question search index from the database."
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            self.stdout.write("Full-text search is not available on this database; nothing to rebuild.")
+            return
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} questions."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Quiz_App import stats
+from Quiz_App.models import Category
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-category statistics shown on the host dashboard from the database. "
+        "The counters are kept up to date incrementally; run this periodically (e.g. nightly) to repair any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('categories', nargs='*', help="Category names to recount (default: all).")
+
+    def handle(self, *args, **options):
+        category_ids = None
+        if options['categories']:
+            found = dict(Category.objects.filter(name__in=options['categories']).values_list('name', 'id'))
+            missing = sorted(set(options['categories']) - set(found))
+            if missing:
+                raise CommandError(f"Unknown categories: {', '.join(missing)}")
+            category_ids = list(found.values())
+        count = stats.recount(category_ids)
+        self.stdout.write(self.style.SUCCESS(f"Recounted statistics for {count} categories."))
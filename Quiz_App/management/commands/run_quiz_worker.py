@@ -0,0 +1,49 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Quiz_App import jobs
+from Quiz_App.checks import cache_is_shared
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs queued by the host panel (imports, exports, recounts, analytics). "
+        "The queue is the database, so several workers can run side by side. See Quiz_App/jobs.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2,
+                            help="Jobs run at the same time by this worker.")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds between queue checks while it is empty.")
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help="Exit after about this many jobs.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit as soon as the queue is empty.")
+        parser.add_argument('--allow-local-cache', action='store_true',
+                            help="Run even though the cache is private to this process, so the web "
+                                 "processes will not see the changes jobs make until restarted.")
+
+    def handle(self, *args, **options):
+        # Jobs change questions and counters in the database and invalidate
+        # the cached copies through version tokens in the cache; those only
+        # reach the web processes if they share the cache.
+        if not cache_is_shared() and not options['allow_local_cache']:
+            raise CommandError(
+                "The cache is private to this process, so the web processes would keep serving what "
+                "the jobs change. Set QUIZ_CACHE_URL (see settings.py), or pass --allow-local-cache."
+            )
+        worker = jobs.Worker(threads=max(1, options['threads']), poll_interval=options['poll_interval'])
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping after the running jobs finish...")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        if options['verbosity'] > 0 and not options['burst']:
+            self.stdout.write(f"Worker {worker.name} running with {worker.threads} threads.")
+        count = worker.run(max_jobs=options['max_jobs'], burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} jobs."))
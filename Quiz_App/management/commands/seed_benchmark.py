@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Quiz_App import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Create synthetic question banks for manage.py benchmark, one category per size "
+        "('Benchmark 10', 'Benchmark 1000', ...). The same sizes and seed always give the same "
+        "questions, and banks that are already complete are left alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(benchmark.DEFAULT_SIZES),
+                            help="Questions per category.")
+        parser.add_argument('--seed', type=int, default=0, help="Generator seed.")
+
+    def handle(self, *args, **options):
+        if any(size < 1 for size in options['sizes']):
+            raise CommandError("Sizes must be positive.")
+
+        def progress(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  ... {result}")
+
+        created = benchmark.seed_banks(options['sizes'], seed=options['seed'], progress=progress)
+        for name, count in created.items():
+            self.stdout.write(f"{name}: {count} questions created")
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(created)} benchmark categories."))
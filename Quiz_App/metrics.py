@@ -0,0 +1,256 @@
+"""
+Per-request performance metrics.
+
+``RequestProfile`` collects what one request cost: wall time, SQL queries
+(count, time and exact duplicates), template render time and cache hits and
+misses. middleware.ProfilingMiddleware fills one in per request and hands it
+to ``record()``, which aggregates it in-process under the request's URL name
+(``quiz``, ``results``, ``host_question_list``, ...).
+
+``snapshot()`` returns the aggregates; the host metrics endpoint serves it as
+JSON. The numbers are per worker process and reset when it restarts, which
+is enough to find hot paths without attaching a profiler.
+
+The SQL, template and cache hooks are only installed when profiling is
+enabled (``settings.QUIZ_PROFILING``) and do nothing outside a profiled
+request.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+
+# Latencies kept per URL name for percentiles.
+SAMPLE_SIZE = 512
+# Duplicate statements kept per request for headers and logs.
+MAX_DUPLICATE_EXAMPLES = 5
+
+_current = contextvars.ContextVar('quiz_request_profile', default=None)
+
+
+class RequestProfile:
+    """What one request cost."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._seen = {}
+        self._template_depth = 0
+
+    @property
+    def duplicate_queries(self):
+        """Queries that repeated an earlier statement with the same parameters."""
+        return sum(count - 1 for count in self._seen.values())
+
+    def duplicates(self):
+        """The most repeated statements, as (sql, times run)."""
+        repeated = [(sql, count) for (sql, _), count in self._seen.items() if count > 1]
+        repeated.sort(key=lambda pair: -pair[1])
+        return repeated[:MAX_DUPLICATE_EXAMPLES]
+
+    def add_query(self, sql, params, duration):
+        self.queries += 1
+        self.sql_time += duration
+        key = (sql, repr(params))
+        self._seen[key] = self._seen.get(key, 0) + 1
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def headers(self):
+        """Debug response headers, including a standard Server-Timing header."""
+        return {
+            'X-Quiz-Queries': str(self.queries),
+            'X-Quiz-Duplicate-Queries': str(self.duplicate_queries),
+            'X-Quiz-Cache': f'{self.cache_hits} hits, {self.cache_misses} misses',
+            'Server-Timing': ', '.join([
+                f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+                f'tpl;dur={self.template_time * 1000:.1f}',
+                f'total;dur={self.elapsed * 1000:.1f}',
+            ]),
+        }
+
+
+def current():
+    """The profile of the request being handled, or None."""
+    return _current.get()
+
+
+def start():
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+# --- Hooks ---
+
+def query_wrapper(execute, sql, params, many, context):
+    """A ``connection.execute_wrapper()`` that times queries."""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, params, time.perf_counter() - started)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install_hooks():
+    """Wrap template rendering and the configured cache backends, once per process."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _wrap_template_render()
+        _wrap_caches()
+        _installed = True
+
+
+def _wrap_template_render():
+    from django.template.base import Template
+
+    render = Template.render
+
+    def timed_render(self, context):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context)
+        # Included and extended templates render inside their parent; only
+        # the outermost render is timed.
+        profile._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile._template_depth -= 1
+            if not profile._template_depth:
+                profile.template_time += time.perf_counter() - started
+
+    Template.render = timed_render
+
+
+def _wrap_caches():
+    from django.conf import settings
+    from django.utils.module_loading import import_string
+
+    classes = {import_string(config['BACKEND']) for config in settings.CACHES.values()}
+    for cls in classes:
+        _wrap_cache_class(cls)
+
+
+def _wrap_cache_class(cls):
+    get, get_many = cls.get, cls.get_many
+
+    def counted_get(self, key, default=None, version=None):
+        value = get(self, key, default, version)
+        profile = _current.get()
+        if profile is not None:
+            if value is default:
+                profile.cache_misses += 1
+            else:
+                profile.cache_hits += 1
+        return value
+
+    def counted_get_many(self, keys, version=None):
+        keys = list(keys)
+        found = get_many(self, keys, version)
+        profile = _current.get()
+        if profile is not None:
+            profile.cache_hits += len(found)
+            profile.cache_misses += len(keys) - len(found)
+        return found
+
+    cls.get, cls.get_many = counted_get, counted_get_many
+
+
+# --- Aggregation ---
+
+class _RouteStats:
+    __slots__ = (
+        'requests', 'total_time', 'max_time', 'queries', 'max_queries', 'sql_time',
+        'duplicate_queries', 'template_time', 'cache_hits', 'cache_misses', 'latencies',
+    )
+
+    def __init__(self):
+        self.requests = self.queries = self.max_queries = self.duplicate_queries = 0
+        self.cache_hits = self.cache_misses = 0
+        self.total_time = self.max_time = self.sql_time = self.template_time = 0.0
+        self.latencies = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, profile):
+        self.requests += 1
+        self.total_time += profile.elapsed
+        self.max_time = max(self.max_time, profile.elapsed)
+        self.queries += profile.queries
+        self.max_queries = max(self.max_queries, profile.queries)
+        self.sql_time += profile.sql_time
+        self.duplicate_queries += profile.duplicate_queries
+        self.template_time += profile.template_time
+        self.cache_hits += profile.cache_hits
+        self.cache_misses += profile.cache_misses
+        self.latencies.append(profile.elapsed)
+
+    def summary(self):
+        n = self.requests
+        latencies = sorted(self.latencies)
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'requests': n,
+            'avg_ms': round(self.total_time / n * 1000, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'max_ms': round(self.max_time * 1000, 2),
+            'avg_queries': round(self.queries / n, 2),
+            'max_queries': self.max_queries,
+            'avg_sql_ms': round(self.sql_time / n * 1000, 2),
+            'duplicate_queries': self.duplicate_queries,
+            'avg_template_ms': round(self.template_time / n * 1000, 2),
+            'cache_hit_ratio': round(self.cache_hits / lookups, 3) if lookups else None,
+        }
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+_routes = {}
+_lock = threading.Lock()
+
+
+def record(name, profile):
+    """Add a finished request's profile to the aggregates for ``name``."""
+    with _lock:
+        stats = _routes.get(name)
+        if stats is None:
+            stats = _routes[name] = _RouteStats()
+        stats.add(profile)
+
+
+def snapshot():
+    """URL name -> aggregate figures, busiest first."""
+    with _lock:
+        summaries = {name: stats.summary() for name, stats in _routes.items()}
+    return dict(sorted(summaries.items(), key=lambda item: -item[1]['requests']))
+
+
+def reset():
+    with _lock:
+        _routes.clear()
@@ -0,0 +1,63 @@
+"""
+Opt-in request profiling, see metrics.py.
+
+Enabled with ``settings.QUIZ_PROFILING`` (the QUIZ_PROFILING environment
+variable); otherwise the middleware removes itself at startup and costs
+nothing. When enabled, every request is profiled and aggregated by URL
+name. In DEBUG, or with ``QUIZ_PROFILING_HEADERS``, the figures are also
+sent as ``X-Quiz-*`` and ``Server-Timing`` response headers, and requests
+slower than ``QUIZ_PROFILING_SLOW_MS`` are logged with their duplicate
+queries.
+
+Work done while a StreamingHttpResponse is being streamed happens after the
+middleware returns and is not counted. The middleware is synchronous, so
+under ASGI enabling it runs the async views through a thread; it is meant
+for finding hot paths, not for leaving on in production.
+"""
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUIZ_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.send_headers = getattr(settings, 'QUIZ_PROFILING_HEADERS', settings.DEBUG)
+        self.slow_ms = getattr(settings, 'QUIZ_PROFILING_SLOW_MS', 500)
+        metrics.install_hooks()
+
+    def __call__(self, request):
+        profile, token = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.query_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        profile.finish()
+
+        match = getattr(request, 'resolver_match', None)
+        name = match.view_name if match is not None else '<unresolved>'
+        metrics.record(name, profile)
+
+        if self.send_headers:
+            for header, value in profile.headers().items():
+                response[header] = value
+        if profile.elapsed * 1000 >= self.slow_ms:
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries (%.0f ms), %d duplicates %s',
+                request.method, request.path, name, profile.elapsed * 1000,
+                profile.queries, profile.sql_time * 1000, profile.duplicate_queries, profile.duplicates(),
+            )
+        return response
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0005_remove_proctoring'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Attempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField(default=0, help_text='Marks awarded for correct answers.')),
+                ('total_marks', models.IntegerField(default=0, help_text='The maximum marks available in this attempt.')),
+                ('total_questions', models.IntegerField(default=0, help_text='The number of questions served.')),
+                ('started_at', models.DateTimeField(blank=True, help_text='When the quiz was started, if known.', null=True)),
+                ('finished_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When the quiz was submitted.')),
+                ('category', models.ForeignKey(help_text='The category the quiz was taken in.', on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='Quiz_App.category')),
+                ('user', models.ForeignKey(help_text='The user who took the quiz.', on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-finished_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AttemptAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_correct', models.BooleanField(default=False, help_text='Whether the chosen answer was correct.')),
+                ('marks_awarded', models.IntegerField(default=0, help_text='The marks awarded for this answer.')),
+                ('answer', models.ForeignKey(blank=True, help_text='The chosen answer, or empty if the question was skipped.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attempt_answers', to='Quiz_App.answer')),
+                ('attempt', models.ForeignKey(help_text='The attempt this answer belongs to.', on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='Quiz_App.attempt')),
+                ('question', models.ForeignKey(help_text='The question that was answered.', on_delete=django.db.models.deletion.CASCADE, related_name='attempt_answers', to='Quiz_App.question')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['user', 'category', 'finished_at'], name='attempt_user_cat_finished'),
+        ),
+    ]
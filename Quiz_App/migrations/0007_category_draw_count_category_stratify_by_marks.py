@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0006_attempt_attemptanswer_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='draw_count',
+            field=models.PositiveIntegerField(blank=True, help_text='How many questions to draw at random for each attempt. Leave blank to use every question.', null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='stratify_by_marks',
+            field=models.BooleanField(default=False, help_text='Draw questions from each marks value in proportion to how common it is in the category.'),
+        ),
+    ]
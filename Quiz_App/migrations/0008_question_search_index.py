@@ -0,0 +1,58 @@
+from django.db import OperationalError, migrations
+
+# A frozen copy of the table search.py uses; the migration must not depend on
+# the live module, which may change after this migration was written.
+TABLE = 'quiz_search'
+
+
+def create_search_table(apps, schema_editor):
+    """Create the FTS5 search table on SQLite builds that support it."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                "question_text, answers_text, category_name, category_id UNINDEXED, "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+    except OperationalError:
+        # SQLite built without FTS5: search uses the fallback.
+        pass
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def populate_search_table(apps, schema_editor):
+    """Index every existing question in one INSERT ... SELECT."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or TABLE not in connection.introspection.table_names():
+        return
+    question = apps.get_model('Quiz_App', 'Question')._meta.db_table
+    answer = apps.get_model('Quiz_App', 'Answer')._meta.db_table
+    category = apps.get_model('Quiz_App', 'Category')._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, question_text, answers_text, category_name, category_id) '
+            f'SELECT q.id, q.question_text, '
+            f"COALESCE((SELECT group_concat(a.answer_text, char(10)) FROM {answer} a WHERE a.question_id = q.id), ''), "
+            f'c.name, c.id FROM {question} q JOIN {category} c ON c.id = q.category_id'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0007_category_draw_count_category_stratify_by_marks'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+        migrations.RunPython(populate_search_table, migrations.RunPython.noop),
+    ]
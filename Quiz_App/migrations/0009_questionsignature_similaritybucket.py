@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0008_question_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSignature',
+            fields=[
+                ('question', models.OneToOneField(help_text='The question this signature describes.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='Quiz_App.question')),
+                ('signature', models.BinaryField(help_text='Packed MinHash values.')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(help_text='Hash of the band number and its MinHash values.')),
+                ('category', models.ForeignKey(help_text="The question's category, copied here so lookups need no join.", on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Quiz_App.category')),
+                ('question', models.ForeignKey(help_text='The question this bucket belongs to.', on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='Quiz_App.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'key'], name='similarity_category_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def count_existing(apps, schema_editor):
+    """Start every existing category's counters from a full recount."""
+    from Quiz_App import stats
+    stats.recount()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0009_questionsignature_similaritybucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(help_text='The category these totals describe.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='Quiz_App.category')),
+                ('question_count', models.IntegerField(default=0, help_text='Number of questions in the category.')),
+                ('answer_count', models.IntegerField(default=0, help_text='Number of answer choices across its questions.')),
+                ('total_marks', models.IntegerField(default=0, help_text='Sum of the marks of its questions.')),
+                ('attempt_count', models.IntegerField(default=0, help_text='Number of finished attempts.')),
+                ('attempt_score', models.BigIntegerField(default=0, help_text='Sum of the scores of those attempts.')),
+                ('attempt_marks', models.BigIntegerField(default=0, help_text='Sum of the marks available in those attempts.')),
+            ],
+            options={
+                'verbose_name_plural': 'Category stats',
+            },
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
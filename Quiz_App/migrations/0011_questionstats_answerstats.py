@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0010_categorystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerStats',
+            fields=[
+                ('answer', models.OneToOneField(help_text='The answer choice analysed.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='item_stats', serialize=False, to='Quiz_App.answer')),
+                ('selections', models.IntegerField(default=0, help_text='Number of times this answer was chosen.')),
+                ('selection_rate', models.FloatField(default=0, help_text="The share of the question's responses that chose it.")),
+            ],
+            options={
+                'verbose_name_plural': 'Answer stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(help_text='The question analysed.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='item_stats', serialize=False, to='Quiz_App.question')),
+                ('responses', models.IntegerField(default=0, help_text='Number of times the question was served.')),
+                ('correct', models.IntegerField(default=0, help_text='Number of correct responses.')),
+                ('p_value', models.FloatField(blank=True, help_text='Difficulty: the share of responses that were correct.', null=True)),
+                ('discrimination', models.FloatField(blank=True, help_text="Point-biserial correlation between answering correctly and the rest of the attempt's score.", null=True)),
+                ('top_distractor_rate', models.FloatField(blank=True, help_text='The share of responses that chose the most popular wrong answer.', null=True)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When these figures were computed.')),
+            ],
+            options={
+                'verbose_name_plural': 'Question stats',
+            },
+        ),
+    ]
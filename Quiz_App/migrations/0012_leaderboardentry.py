@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def rank_existing(apps, schema_editor):
+    """Build the leaderboards from the attempts stored so far."""
+    from Quiz_App import leaderboard
+    leaderboard.rebuild()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0011_questionstats_answerstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField(default=0, help_text='Best score in hundredths of a percent (summed on the global board).')),
+                ('achieved_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When the points were last raised.')),
+                ('category', models.ForeignKey(blank=True, help_text='The category ranked, or empty for the global leaderboard.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='Quiz_App.category')),
+                ('user', models.ForeignKey(help_text='The user ranked.', on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', '-points', 'achieved_at'], name='leaderboard_rank')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'user'), name='leaderboard_category_user'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user',), name='leaderboard_global_user')],
+            },
+        ),
+        migrations.RunPython(rank_existing, migrations.RunPython.noop),
+    ]
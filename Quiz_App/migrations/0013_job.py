@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0012_leaderboardentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(help_text='Name of the registered task to run.', max_length=50)),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Keyword arguments for the task.')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('progress_done', models.IntegerField(default=0, help_text='Units of work done so far.')),
+                ('progress_total', models.IntegerField(blank=True, help_text='Units of work in total, if known.', null=True)),
+                ('message', models.CharField(blank=True, help_text='Latest progress message.', max_length=255)),
+                ('result', models.JSONField(blank=True, help_text='What the task returned.', null=True)),
+                ('error', models.TextField(blank=True, help_text='Traceback of the last failure.')),
+                ('attempts', models.IntegerField(default=0, help_text='Times the task has been started.')),
+                ('max_attempts', models.IntegerField(default=3, help_text='Times to try before giving up.')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Not started before this time (retry back-off).')),
+                ('worker', models.CharField(blank=True, help_text='Worker running the job.', max_length=100)),
+                ('heartbeat_at', models.DateTimeField(blank=True, help_text='Last sign of life from that worker.', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, help_text='The host who queued the job.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='quiz_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='job_queue')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def keep_first_correct_answer(apps, schema_editor):
+    """
+    Leave one correct answer per question before the constraint is added.
+    Grading already treats a question's lowest-id correct answer as the
+    correct one (see scoring.AnswerKey), so that is the one kept.
+    """
+    Answer = apps.get_model('Quiz_App', 'Answer')
+    duplicated = (
+        Answer.objects.filter(is_correct=True)
+        .values('question_id')
+        .annotate(n=Count('id'), first=Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicated.iterator():
+        Answer.objects.filter(question_id=row['question_id'], is_correct=True).exclude(pk=row['first']).update(is_correct=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0013_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answer',
+            name='question',
+            field=models.ForeignKey(db_index=False, help_text='The question this answer is associated with.', on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='Quiz_App.question'),
+        ),
+        migrations.AlterField(
+            model_name='attempt',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='The user who took the quiz.', on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='category',
+            field=models.ForeignKey(db_index=False, help_text='The category this question belongs to.', on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='Quiz_App.category'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', 'is_correct'], name='answer_question_correct'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['category', 'created_at'], name='question_cat_created'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['created_at'], name='question_created'),
+        ),
+        migrations.RunPython(keep_first_correct_answer, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_correct', True)), fields=('question',), name='answer_one_correct_per_question'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Quiz_App', '0014_indexes_and_one_correct_answer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attempt',
+            name='nonce',
+            field=models.CharField(blank=True, editable=False, help_text='Nonce of the single-page quiz token it was submitted with, so each token is used once.', max_length=32, null=True, unique=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 class Category(models.Model):
     """
@@ -6,6 +8,15 @@ class Category(models.Model):
     For example: "Science", "History", "General Knowledge".
     """
     name = models.CharField(max_length=100, unique=True, help_text="The name of the quiz category.")
+    draw_count = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="How many questions to draw at random for each attempt. Leave blank to use every question."
+    )
+    stratify_by_marks = models.BooleanField(
+        default=False,
+        help_text="Draw questions from each marks value in proportion to how common it is in the category."
+    )
 
     class Meta:
         # Orders categories alphabetically by name in the admin panel.
@@ -25,6 +36,8 @@ class Question(models.Model):
         Category,
         related_name='questions', # Allows accessing questions from a category object, e.g., category.questions.all()
         on_delete=models.CASCADE,
+        # Indexed by question_cat_created, which starts with it.
+        db_index=False,
         help_text="The category this question belongs to."
     )
     question_text = models.CharField(max_length=255, help_text="The text of the question.")
@@ -34,6 +47,15 @@ class Question(models.Model):
     class Meta:
         # Orders questions by the date they were created.
         ordering = ['-created_at']
+        indexes = [
+            # Serves "a category's questions" (question banks, exports) and,
+            # read backwards, "a category's questions, newest first" (the
+            # host question list). SQLite appends the id to every index, so
+            # the list's id tie-breaker is covered too.
+            models.Index(fields=['category', 'created_at'], name='question_cat_created'),
+            # The host question list without a category filter.
+            models.Index(fields=['created_at'], name='question_created'),
+        ]
 
     def __str__(self):
         """String representation of the Question model."""
@@ -48,13 +70,368 @@ class Answer(models.Model):
         Question,
         related_name='answers', # Allows accessing answers from a question object, e.g., question.answers.all()
         on_delete=models.CASCADE,
+        # Indexed by answer_question_correct, which starts with it.
+        db_index=False,
         help_text="The question this answer is associated with."
     )
     answer_text = models.CharField(max_length=255, help_text="The text of the answer choice.")
     is_correct = models.BooleanField(default=False, help_text="Mark this if the answer is correct.")
 
+    class Meta:
+        indexes = [
+            # Serves "a question's answers" and "a question's correct answer".
+            models.Index(fields=['question', 'is_correct'], name='answer_question_correct'),
+        ]
+        constraints = [
+            # SQLite checks this row by row, so code that moves the correct
+            # answer must clear the old one first (see bulk_edit.py).
+            models.UniqueConstraint(
+                fields=['question'], condition=models.Q(is_correct=True), name='answer_one_correct_per_question',
+            ),
+        ]
+
+    def __str__(self):
+        """
+        String representation of the Answer model. Uses the question only if
+        it is already loaded, so listing answers never queries per row.
+        """
+        if Answer.question.is_cached(self):
+            return f"{self.answer_text} (for: {self.question.question_text[:20]}...)"
+        return f"{self.answer_text} (for question #{self.question_id})"
+
+
+
+
+class Attempt(models.Model):
+    """
+    A finished quiz attempt by one user in one category.
+    The individual answers are stored as AttemptAnswer rows.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='quiz_attempts',
+        on_delete=models.CASCADE,
+        # Indexed by attempt_user_cat_finished, which starts with it.
+        db_index=False,
+        help_text="The user who took the quiz."
+    )
+    category = models.ForeignKey(
+        Category,
+        related_name='attempts',
+        on_delete=models.CASCADE,
+        help_text="The category the quiz was taken in."
+    )
+    score = models.IntegerField(default=0, help_text="Marks awarded for correct answers.")
+    total_marks = models.IntegerField(default=0, help_text="The maximum marks available in this attempt.")
+    total_questions = models.IntegerField(default=0, help_text="The number of questions served.")
+    started_at = models.DateTimeField(null=True, blank=True, help_text="When the quiz was started, if known.")
+    finished_at = models.DateTimeField(default=timezone.now, help_text="When the quiz was submitted.")
+    nonce = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        help_text="Nonce of the single-page quiz token it was submitted with, so each token is used once."
+    )
+
+    class Meta:
+        # Most recent attempts first.
+        ordering = ['-finished_at']
+        indexes = [
+            # Serves "this user's attempts in this category, latest first".
+            models.Index(fields=['user', 'category', 'finished_at'], name='attempt_user_cat_finished'),
+        ]
+
+    def __str__(self):
+        """String representation of the Attempt model."""
+        return f"Attempt #{self.pk}: {self.score}/{self.total_marks}"
+
+
+class AttemptAnswer(models.Model):
+    """
+    The answer given to one question during an Attempt.
+    A skipped question is stored with an empty answer.
+    """
+    attempt = models.ForeignKey(
+        Attempt,
+        related_name='answers',
+        on_delete=models.CASCADE,
+        help_text="The attempt this answer belongs to."
+    )
+    question = models.ForeignKey(
+        Question,
+        related_name='attempt_answers',
+        on_delete=models.CASCADE,
+        help_text="The question that was answered."
+    )
+    answer = models.ForeignKey(
+        Answer,
+        related_name='attempt_answers',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        help_text="The chosen answer, or empty if the question was skipped."
+    )
+    is_correct = models.BooleanField(default=False, help_text="Whether the chosen answer was correct.")
+    marks_awarded = models.IntegerField(default=0, help_text="The marks awarded for this answer.")
+
+    def __str__(self):
+        """String representation of the AttemptAnswer model."""
+        return f"Attempt #{self.attempt_id}, question #{self.question_id}"
+
+
+class QuestionSignature(models.Model):
+    """
+    MinHash signature of a question's normalised text, used to find
+    near-duplicate questions. Maintained by Quiz_App/similarity.py.
+    """
+    question = models.OneToOneField(
+        Question,
+        primary_key=True,
+        related_name='signature',
+        on_delete=models.CASCADE,
+        help_text="The question this signature describes."
+    )
+    signature = models.BinaryField(help_text="Packed MinHash values.")
+
+    def __str__(self):
+        """String representation of the QuestionSignature model."""
+        return f"Signature of question #{self.question_id}"
+
+
+class SimilarityBucket(models.Model):
+    """
+    One locality-sensitive hashing band of a question's signature. Questions
+    that share a bucket key in the same category are near-duplicate candidates.
+    """
+    question = models.ForeignKey(
+        Question,
+        related_name='similarity_buckets',
+        on_delete=models.CASCADE,
+        help_text="The question this bucket belongs to."
+    )
+    category = models.ForeignKey(
+        Category,
+        related_name='+',
+        on_delete=models.CASCADE,
+        help_text="The question's category, copied here so lookups need no join."
+    )
+    key = models.BigIntegerField(help_text="Hash of the band number and its MinHash values.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'key'], name='similarity_category_key'),
+        ]
+
+    def __str__(self):
+        """String representation of the SimilarityBucket model."""
+        return f"Bucket {self.key} of question #{self.question_id}"
+
+
+class CategoryStats(models.Model):
+    """
+    Running totals for one category, kept up to date incrementally by
+    Quiz_App/stats.py so the host dashboard never has to count rows.
+    """
+    category = models.OneToOneField(
+        Category,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+        help_text="The category these totals describe."
+    )
+    question_count = models.IntegerField(default=0, help_text="Number of questions in the category.")
+    answer_count = models.IntegerField(default=0, help_text="Number of answer choices across its questions.")
+    total_marks = models.IntegerField(default=0, help_text="Sum of the marks of its questions.")
+    attempt_count = models.IntegerField(default=0, help_text="Number of finished attempts.")
+    attempt_score = models.BigIntegerField(default=0, help_text="Sum of the scores of those attempts.")
+    attempt_marks = models.BigIntegerField(default=0, help_text="Sum of the marks available in those attempts.")
+
+    class Meta:
+        verbose_name_plural = "Category stats"
+
+    def __str__(self):
+        """String representation of the CategoryStats model."""
+        return f"Stats for category #{self.category_id}"
+
+    @property
+    def average_score(self):
+        """Mean score per attempt, or None before the first attempt."""
+        if not self.attempt_count:
+            return None
+        return self.attempt_score / self.attempt_count
+
+    @property
+    def average_percent(self):
+        """Marks scored as a percentage of marks available, over all attempts."""
+        if not self.attempt_marks:
+            return None
+        return 100 * self.attempt_score / self.attempt_marks
+
+
+class QuestionStats(models.Model):
+    """
+    Item analysis of one question over all stored attempt answers.
+    Written in batch by ``manage.py compute_item_stats``, see Quiz_App/item_stats.py.
+    """
+    question = models.OneToOneField(
+        Question,
+        primary_key=True,
+        related_name='item_stats',
+        on_delete=models.CASCADE,
+        help_text="The question analysed."
+    )
+    responses = models.IntegerField(default=0, help_text="Number of times the question was served.")
+    correct = models.IntegerField(default=0, help_text="Number of correct responses.")
+    p_value = models.FloatField(null=True, blank=True, help_text="Difficulty: the share of responses that were correct.")
+    discrimination = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Point-biserial correlation between answering correctly and the rest of the attempt's score."
+    )
+    top_distractor_rate = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="The share of responses that chose the most popular wrong answer."
+    )
+    computed_at = models.DateTimeField(default=timezone.now, help_text="When these figures were computed.")
+
+    class Meta:
+        verbose_name_plural = "Question stats"
+
+    def __str__(self):
+        """String representation of the QuestionStats model."""
+        return f"Item stats of question #{self.question_id}"
+
+
+class AnswerStats(models.Model):
+    """
+    How often one answer choice was selected, written with QuestionStats.
+    For wrong answers this is the distractor selection rate.
+    """
+    answer = models.OneToOneField(
+        Answer,
+        primary_key=True,
+        related_name='item_stats',
+        on_delete=models.CASCADE,
+        help_text="The answer choice analysed."
+    )
+    selections = models.IntegerField(default=0, help_text="Number of times this answer was chosen.")
+    selection_rate = models.FloatField(default=0, help_text="The share of the question's responses that chose it.")
+
+    class Meta:
+        verbose_name_plural = "Answer stats"
+
+    def __str__(self):
+        """String representation of the AnswerStats model."""
+        return f"Item stats of answer #{self.answer_id}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    A user's standing on one leaderboard: a category's (their best attempt)
+    or, with no category, the global one (the sum of their category bests).
+    Maintained incrementally by Quiz_App/leaderboard.py.
+    """
+    category = models.ForeignKey(
+        Category,
+        related_name='leaderboard_entries',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        help_text="The category ranked, or empty for the global leaderboard."
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='leaderboard_entries',
+        on_delete=models.CASCADE,
+        help_text="The user ranked."
+    )
+    points = models.IntegerField(default=0, help_text="Best score in hundredths of a percent (summed on the global board).")
+    achieved_at = models.DateTimeField(default=timezone.now, help_text="When the points were last raised.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'user'], name='leaderboard_category_user'),
+            # NULLs never collide in a unique index, so the global board needs its own.
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(category__isnull=True), name='leaderboard_global_user'
+            ),
+        ]
+        indexes = [
+            # Serves a board in rank order.
+            models.Index(fields=['category', '-points', 'achieved_at'], name='leaderboard_rank'),
+        ]
+
     def __str__(self):
-        """String representation of the Answer model."""
-        return f"{self.answer_text} (for: {self.question.question_text[:20]}...)"
+        """String representation of the LeaderboardEntry model."""
+        board = f"category #{self.category_id}" if self.category_id else "global"
+        return f"{self.user_id} on {board}: {self.points}"
 
 
+class Job(models.Model):
+    """
+    A unit of background work for the host panel (an import, an export, a
+    recount, ...), queued by Quiz_App/jobs.py and run by
+    ``manage.py run_quiz_worker``.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50, help_text="Name of the registered task to run.")
+    params = models.JSONField(default=dict, blank=True, help_text="Keyword arguments for the task.")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress_done = models.IntegerField(default=0, help_text="Units of work done so far.")
+    progress_total = models.IntegerField(null=True, blank=True, help_text="Units of work in total, if known.")
+    message = models.CharField(max_length=255, blank=True, help_text="Latest progress message.")
+    result = models.JSONField(null=True, blank=True, help_text="What the task returned.")
+    error = models.TextField(blank=True, help_text="Traceback of the last failure.")
+    attempts = models.IntegerField(default=0, help_text="Times the task has been started.")
+    max_attempts = models.IntegerField(default=3, help_text="Times to try before giving up.")
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not started before this time (retry back-off).")
+    worker = models.CharField(max_length=100, blank=True, help_text="Worker running the job.")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last sign of life from that worker.")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='quiz_jobs',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        help_text="The host who queued the job."
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Finds the next job to run.
+            models.Index(fields=['status', 'run_after'], name='job_queue'),
+        ]
+
+    @property
+    def percent(self):
+        """Progress as a percentage, or None if the total is unknown."""
+        if self.status == self.SUCCEEDED:
+            return 100
+        if not self.progress_total:
+            return None
+        return min(100, round(self.progress_done * 100 / self.progress_total))
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def __str__(self):
+        """String representation of the Job model."""
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,84 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page is fetched with a WHERE clause that starts just
+after the last row of the previous page, so every page costs the same no
+matter how deep into the list it is. The ordering must end in a unique
+field (usually ``id``) so the position of a row is unambiguous.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PER_PAGE = 50
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the next one."""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _split(ordering):
+    """Turn '-created_at' into ('created_at', True)."""
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def encode_cursor(obj, ordering):
+    values = [str(getattr(obj, name)) for name, _ in _split(ordering)]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, model, ordering):
+    """Return the cursor's field values, or None if it cannot be parsed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        fields = [model._meta.get_field(name) for name, _ in _split(ordering)]
+        if len(values) != len(fields):
+            return None
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _after(ordering, values):
+    """Q object matching rows that sort strictly after ``values``."""
+    condition = Q()
+    equal = Q()
+    for (name, descending), value in zip(_split(ordering), values):
+        lookup = 'lt' if descending else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """
+    Return the KeysetPage of ``queryset`` (sorted by ``ordering``) that
+    starts after ``cursor``. An invalid cursor gives the first page.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, ordering)
+        if values is not None:
+            queryset = queryset.filter(_after(ordering, values))
+    items = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(items[-1], ordering)
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,98 @@
+"""
+Who may use the host panel.
+
+Staff users and members of the HOST_GROUP group are hosts. Staff status is
+on the user row, which every request loads anyway; group membership needs a
+query, so it is resolved once and remembered:
+
+* on the request's user object, so one request never asks twice, and
+* if the QUIZ_CACHE_ALIAS cache is shared between processes (see
+  checks.py), there for ROLE_TIMEOUT seconds.
+
+Adding or removing group memberships invalidates the cached role of the
+users concerned (see signals.py). Renaming or deleting the group itself does
+not; ROLE_TIMEOUT bounds how long such a change takes to apply. With a
+per-process cache the invalidation would only reach the process that made
+the change, and a revoked host could keep using the others, so the role is
+then looked up once per request instead.
+
+``host_required`` guards view functions, ``HostRequiredMixin`` class-based
+views and ``HostView`` is the base class of the host panel's views.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponseForbidden
+from django.shortcuts import redirect
+from django.views import View
+
+from .checks import cache_is_shared
+
+HOST_GROUP = 'Host'
+ROLE_TIMEOUT = 60 * 5
+FORBIDDEN_MESSAGE = 'You do not have permission to access this page.'
+
+
+def _cache():
+    return caches[getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')]
+
+
+def _role_key(user_id):
+    return f'quiz:host-role:{user_id}'
+
+
+def is_host(user):
+    """Whether ``user`` may use the host panel. At most one query per request."""
+    if not user.is_authenticated:
+        return False
+    if user.is_staff:
+        return True
+    memo = getattr(user, '_quiz_is_host', None)
+    if memo is not None:
+        return memo
+    if cache_is_shared():
+        cache = _cache()
+        key = _role_key(user.pk)
+        role = cache.get(key)
+        if role is None:
+            role = user.groups.filter(name=HOST_GROUP).exists()
+            cache.set(key, role, ROLE_TIMEOUT)
+    else:
+        role = user.groups.filter(name=HOST_GROUP).exists()
+    user._quiz_is_host = role
+    return role
+
+
+def invalidate(user_ids):
+    """Forget the cached role of the given users."""
+    _cache().delete_many([_role_key(user_id) for user_id in user_ids])
+
+
+def _deny(request):
+    if not request.user.is_authenticated:
+        return redirect('login')
+    return HttpResponseForbidden(FORBIDDEN_MESSAGE)
+
+
+def host_required(view_func):
+    """Decorator that allows only hosts (see is_host)."""
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if not is_host(request.user):
+            return _deny(request)
+        return view_func(request, *args, **kwargs)
+    return _wrapped
+
+
+class HostRequiredMixin:
+    """Class-based view mixin that allows only hosts (see is_host)."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_host(request.user):
+            return _deny(request)
+        return super().dispatch(request, *args, **kwargs)
+
+
+class HostView(HostRequiredMixin, View):
+    """Base class of the host panel views."""
@@ -0,0 +1,319 @@
+"""
+In-process question bank cache.
+
+A "bank" is an immutable snapshot of one category: its name, every question
+and every answer, packed into tuples so it can be shared safely between
+requests and pickled into a shared cache. The quiz views read questions from
+the bank instead of the database, so once a bank is warm the quiz hot path
+does not touch the Question/Answer tables at all.
+
+Two cache layers are used:
+
+* a per-process dict (``_local_banks``) for zero-cost lookups, and
+* the Django cache configured by ``settings.QUIZ_CACHE_ALIAS`` so other
+  workers can reuse a bank that one worker already built.
+
+A bank also carries the category's draw settings, so ``bank.draw(seed)``
+can pick the questions of one attempt: the whole category shuffled, or a
+random sample of ``draw_count`` questions, optionally stratified by marks.
+
+Every category has a version token stored in the shared cache. Saving or
+deleting a Category, Question or Answer replaces the token (see signals.py),
+which makes every worker drop its local copy on the next lookup.
+
+Within a process only one thread loads or builds a missing bank; the
+others wait for it, so a burst of candidates opening a cold category costs
+one build (or one unpickle of a large bank) rather than one each.
+"""
+import bisect
+import threading
+import uuid
+import zlib
+from array import array
+from collections import namedtuple
+from itertools import accumulate
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Category, Question, Answer
+from .shuffle import SeededPermutation, allocate, derive_seed
+
+# How long a built bank stays in the shared cache. Invalidation does not rely
+# on this: a new version token makes old entries unreachable straight away.
+BANK_TIMEOUT = 60 * 60 * 6
+
+AnswerSnapshot = namedtuple('AnswerSnapshot', ['id', 'answer_text', 'is_correct'])
+QuestionSnapshot = namedtuple('QuestionSnapshot', ['id', 'question_text', 'marks', 'answers'])
+
+
+class QuestionBank:
+    """Read-only snapshot of a category's questions and answers."""
+
+    __slots__ = (
+        'category_id', 'category_name', 'version', 'questions', 'draw_count', 'stratify_by_marks',
+        'fingerprint', '_positions', '_strata',
+    )
+
+    def __init__(self, category_id, category_name, version, questions, draw_count=None, stratify_by_marks=False):
+        self.category_id = category_id
+        self.category_name = category_name
+        self.version = version
+        # Questions are kept in primary key order so positions are stable.
+        self.questions = tuple(questions)
+        self.draw_count = draw_count
+        self.stratify_by_marks = stratify_by_marks
+        self._positions = {q.id: i for i, q in enumerate(self.questions)}
+        self._strata = None
+        # Identifies the id array and draw settings, so a stored shuffle seed
+        # can tell whether it still refers to the same questions.
+        ids = array('q', self.question_ids)
+        ids.extend((draw_count or 0, int(stratify_by_marks)))
+        self.fingerprint = zlib.crc32(ids.tobytes())
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __getstate__(self):
+        return (
+            self.category_id, self.category_name, self.version, self.questions,
+            self.draw_count, self.stratify_by_marks,
+        )
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @property
+    def question_ids(self):
+        """Question ids in bank order."""
+        return tuple(q.id for q in self.questions)
+
+    @property
+    def strata(self):
+        """Tuple of (marks, positions) groups, built on first use."""
+        if self._strata is None:
+            groups = {}
+            for position, question in enumerate(self.questions):
+                groups.setdefault(question.marks, array('l')).append(position)
+            self._strata = tuple(sorted(groups.items()))
+        return self._strata
+
+    def shuffled(self, seed):
+        """Return every question in the order given by ``seed``, evaluated lazily."""
+        return ShuffledQuestions(self, seed)
+
+    def draw(self, seed):
+        """
+        Return the questions of one attempt, as chosen by ``seed`` and the
+        category's draw settings. The result is a lazy sequence.
+        """
+        count = len(self) if self.draw_count is None else min(self.draw_count, len(self))
+        if self.stratify_by_marks and count < len(self):
+            return StratifiedSample(self, seed, count)
+        return ShuffledQuestions(self, seed, count)
+
+    def get(self, question_id):
+        """Return the question snapshot with the given id, or None."""
+        position = self._positions.get(question_id)
+        if position is None:
+            return None
+        return self.questions[position]
+
+
+class ShuffledQuestions:
+    """
+    A seeded shuffle of a bank's questions, optionally cut to the first
+    ``count``, which is a uniform random sample without replacement.
+    Indexing is O(1) and nothing is materialised, so drawing questions costs
+    the same for any bank size.
+    """
+
+    __slots__ = ('bank', 'count', '_permutation')
+
+    def __init__(self, bank, seed, count=None):
+        self.bank = bank
+        self.count = len(bank) if count is None else count
+        self._permutation = SeededPermutation(len(bank), seed)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('question index out of range')
+        return self.bank.questions[self._permutation[index]]
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+
+class StratifiedSample:
+    """
+    A random sample of ``count`` questions in which every marks value is
+    represented in proportion to its share of the bank.
+
+    Index ``i`` is first shuffled across the whole sample, then mapped to a
+    stratum by its cumulative quota and finally to a question through that
+    stratum's own seeded permutation, so lookups stay O(log strata).
+    """
+
+    __slots__ = ('bank', 'count', '_order', '_bounds', '_groups')
+
+    def __init__(self, bank, seed, count):
+        self.bank = bank
+        strata = bank.strata
+        quotas = allocate([len(positions) for _, positions in strata], count)
+        self.count = sum(quotas)
+        self._order = SeededPermutation(self.count, seed)
+        self._bounds = list(accumulate(quotas))
+        self._groups = [
+            (positions, SeededPermutation(len(positions), derive_seed(seed, marks)))
+            for marks, positions in strata
+        ]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('question index out of range')
+        slot = self._order[index]
+        group = bisect.bisect_right(self._bounds, slot)
+        offset = slot - (self._bounds[group - 1] if group else 0)
+        positions, permutation = self._groups[group]
+        return self.bank.questions[positions[permutation[offset]]]
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+
+# category_id -> QuestionBank, private to this worker process.
+_local_banks = {}
+# category_id -> Lock held while this process builds that category's bank.
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')]
+
+
+def _version_key(category_id):
+    return f'quiz:bank-version:{category_id}'
+
+
+def _bank_key(category_id, version):
+    return f'quiz:bank:{category_id}:{version}'
+
+
+def _current_version(category_id):
+    cache = _cache()
+    key = _version_key(category_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() so two workers racing here agree on a single token.
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def build_bank(category_id, version=''):
+    """
+    Build a bank straight from the database in three queries
+    (category, questions, answers). Returns None if the category is missing.
+    """
+    category = (
+        Category.objects
+        .filter(id=category_id)
+        .values_list('name', 'draw_count', 'stratify_by_marks')
+        .first()
+    )
+    if category is None:
+        return None
+    name, draw_count, stratify_by_marks = category
+
+    answers_by_question = {}
+    answer_rows = (
+        Answer.objects
+        .filter(question__category_id=category_id)
+        .order_by('id')
+        .values_list('question_id', 'id', 'answer_text', 'is_correct')
+    )
+    for question_id, answer_id, text, is_correct in answer_rows:
+        answers_by_question.setdefault(question_id, []).append(
+            AnswerSnapshot(answer_id, text, is_correct)
+        )
+
+    question_rows = (
+        Question.objects
+        .filter(category_id=category_id)
+        .order_by('id')
+        .values_list('id', 'question_text', 'marks')
+    )
+    questions = [
+        QuestionSnapshot(qid, text, marks, tuple(answers_by_question.get(qid, ())))
+        for qid, text, marks in question_rows
+    ]
+    return QuestionBank(category_id, name, version, questions, draw_count, stratify_by_marks)
+
+
+def get_bank(category_id):
+    """
+    Return the QuestionBank for a category, or None if it does not exist.
+    Costs no database queries while the bank is cached.
+    """
+    version = _current_version(category_id)
+    bank = _local_banks.get(category_id)
+    if bank is not None and bank.version == version:
+        return bank
+
+    with _build_lock(category_id):
+        # Another thread may have loaded or built it while this one waited.
+        bank = _local_banks.get(category_id)
+        if bank is not None and bank.version == version:
+            return bank
+        cache = _cache()
+        key = _bank_key(category_id, version)
+        bank = cache.get(key)
+        if bank is None:
+            bank = build_bank(category_id, version)
+            if bank is None:
+                _local_banks.pop(category_id, None)
+                return None
+            cache.set(key, bank, BANK_TIMEOUT)
+        _local_banks[category_id] = bank
+    return bank
+
+
+def _build_lock(category_id):
+    with _build_locks_lock:
+        return _build_locks.setdefault(category_id, threading.Lock())
+
+
+async def aget_bank(category_id):
+    """
+    Async get_bank(). A warm bank is found with one awaited cache read; a
+    bank this process does not hold yet is loaded or built by get_bank() in
+    a thread, under the build lock, since unpickling a large bank from the
+    cache costs nearly as much as building it.
+    """
+    version = await _cache().aget(_version_key(category_id))
+    if version is not None:
+        bank = _local_banks.get(category_id)
+        if bank is not None and bank.version == version:
+            return bank
+    return await sync_to_async(get_bank)(category_id)
+
+
+def invalidate(category_id):
+    """Drop every cached copy of a category's bank, in all workers."""
+    _local_banks.pop(category_id, None)
+    _cache().set(_version_key(category_id), uuid.uuid4().hex, None)
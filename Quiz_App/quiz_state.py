@@ -0,0 +1,338 @@
+"""
+Compact per-candidate quiz state.
+
+The step-by-step quiz used to keep its question order, score and cursor in
+``request.session``, which with the database session backend meant one
+UPDATE of ``django_session`` per answer. QuizState is instead packed into a
+few bytes of varints (the order is a shuffle seed, not a list of ids) and
+kept in one of two places, chosen by ``settings.QUIZ_STATE_BACKEND``:
+
+``'cache'`` (default)
+    The cookie holds only a random signed token and the packed state lives
+    in the Django cache under that token, expiring after QUIZ_STATE_TTL.
+    Resending an older cookie just resends the token, so the quiz cannot
+    be rewound.
+``'cookie'`` (opt-in)
+    The packed state is signed and stored in a cookie. A candidate can
+    resend an older cookie and so rewind the quiz to that point and answer
+    again. Only for practice quizzes.
+
+The chosen answers are not part of the state, which would then grow with
+every question: each one is written to the cache under its own key as it
+is given (see save()) and read back only when the quiz is graded or the
+category changed under it. So the state stays the same few bytes however
+long the quiz is, and answering a question costs no SQL writes. Nothing
+says whether an answer was right: the score is only worked out when the
+quiz is finished, so the (readable, if signed) cookie never tells a
+candidate how they are doing.
+"""
+import base64
+import secrets
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+from . import shuffle
+
+COOKIE_NAME = 'quiz_state'
+SIGNING_SALT = 'quiz.state'
+FORMAT_VERSION = 5
+
+
+def _ttl():
+    return getattr(settings, 'QUIZ_STATE_TTL', 60 * 60 * 6)
+
+
+def _backend():
+    return getattr(settings, 'QUIZ_STATE_BACKEND', 'cache')
+
+
+def _cache():
+    return caches[getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')]
+
+
+# --- Encoding ---
+
+def _write_varint(out, value):
+    """Append an unsigned LEB128 varint to ``out``."""
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data, pos):
+    """Read an unsigned LEB128 varint, returning (value, next position)."""
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+class QuizState:
+    """
+    Progress of one candidate through one category.
+
+    The questions are not stored: they are ``bank.draw(seed)`` for a bank
+    whose id array and draw settings have the recorded ``fingerprint``.
+    Neither are the answers: ``cursor`` counts those given so far, and the
+    (question id, answer id) pair of each lives in the cache under its
+    position (see load_answers()), so the answers can be graded however the
+    category has changed since. The packed state is constant-size.
+    """
+
+    __slots__ = ('category_id', 'user_id', 'seed', 'total', 'fingerprint', 'started_at', 'cursor', 'pending')
+
+    def __init__(self, category_id, user_id, seed, total, fingerprint, started_at=None, cursor=0):
+        self.category_id = category_id
+        self.user_id = user_id
+        self.seed = seed
+        self.total = total
+        self.fingerprint = fingerprint
+        self.started_at = int(time.time()) if started_at is None else started_at
+        self.cursor = cursor
+        # Answers recorded since the state was loaded, written by save().
+        self.pending = {}
+
+    @classmethod
+    def start(cls, bank, user_id):
+        """Begin a new quiz over ``bank`` with a fresh random draw."""
+        seed = shuffle.new_seed()
+        return cls(bank.category_id, user_id, seed, len(bank.draw(seed)), bank.fingerprint)
+
+    @property
+    def finished(self):
+        return self.cursor >= self.total
+
+    def matches(self, bank):
+        """Whether the stored order still applies to ``bank``."""
+        return self.category_id == bank.category_id and self.fingerprint == bank.fingerprint
+
+    def questions(self, bank):
+        """The questions of this quiz, in order."""
+        return bank.draw(self.seed)
+
+    def remaining(self, bank, answered=()):
+        """
+        The questions still to be asked, in order.
+
+        If questions were added to or removed from the category since the
+        quiz started, the stored order no longer applies. The quiz then goes
+        on with the questions of the current draw that are not among the
+        ``answered`` pairs (see load_answers()), and ends early if too few
+        are left, rather than starting over. ``answered`` is only needed
+        when ``matches(bank)`` is false.
+        """
+        if self.finished:
+            return []
+        questions = self.questions(bank)
+        if self.matches(bank):
+            return [questions[i] for i in range(self.cursor, self.total)]
+        answered_ids = {question_id for question_id, _ in answered}
+        unanswered = [q for q in questions if q.id not in answered_ids]
+        return unanswered[:self.total - self.cursor]
+
+    def next_question(self, bank, answered=()):
+        """The question to ask next, or None once the quiz is over."""
+        if self.finished:
+            return None
+        if self.matches(bank):
+            return self.questions(bank)[self.cursor]
+        remaining = self.remaining(bank, answered)
+        if not remaining:
+            self.total = self.cursor
+            return None
+        return remaining[0]
+
+    def record(self, question_id, answer_id):
+        """Record the answer to the current question and advance."""
+        self.pending[self.cursor] = (question_id, answer_id or 0)
+        self.cursor += 1
+
+    def to_bytes(self):
+        out = bytearray([FORMAT_VERSION])
+        fields = (self.category_id, self.user_id, self.seed, self.total, self.fingerprint, self.started_at, self.cursor)
+        for value in fields:
+            _write_varint(out, value)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data or data[0] != FORMAT_VERSION:
+            raise ValueError('Unsupported quiz state format.')
+        pos = 1
+        fields = []
+        for _ in range(7):
+            value, pos = _read_varint(data, pos)
+            fields.append(value)
+        category_id, user_id, seed, total, fingerprint, started_at, cursor = fields
+        return cls(category_id, user_id, seed, total, fingerprint, started_at=started_at, cursor=cursor)
+
+
+# --- Storage ---
+
+def _signer():
+    return signing.TimestampSigner(salt=SIGNING_SALT)
+
+
+def _read_cookie(request):
+    value = request.COOKIES.get(COOKIE_NAME)
+    if not value:
+        return None
+    try:
+        return _signer().unsign(value, max_age=_ttl())
+    except signing.BadSignature:
+        return None
+
+
+def _write_cookie(response, value):
+    response.set_cookie(
+        COOKIE_NAME,
+        _signer().sign(value),
+        max_age=_ttl(),
+        httponly=True,
+        samesite='Lax',
+        secure=getattr(settings, 'SESSION_COOKIE_SECURE', False),
+    )
+
+
+def _state_key(token):
+    return f'quiz:state:{token}'
+
+
+def _answer_key(state, position):
+    # The seed is 63 random bits, so it tells one quiz of a user from another.
+    return f'quiz:answer:{state.user_id}:{state.seed}:{position}'
+
+
+def _answer_keys(state):
+    return [_answer_key(state, position) for position in range(state.cursor)]
+
+
+def _answers_from(stored, state):
+    answers = []
+    for key in _answer_keys(state):
+        # An entry the cache has evicted is left out, like a deleted question.
+        if key in stored:
+            question_id, answer_id = stored[key]
+            answers.append((question_id, answer_id or None))
+    return answers
+
+
+def load_answers(state):
+    """Return the (question_id, answer_id or None) pairs answered so far, in order."""
+    return _answers_from(_cache().get_many(_answer_keys(state)), state)
+
+
+async def aload_answers(state):
+    """Async load_answers()."""
+    return _answers_from(await _cache().aget_many(_answer_keys(state)), state)
+
+
+def _pending_answers(state):
+    answers = {_answer_key(state, position): answer for position, answer in state.pending.items()}
+    state.pending = {}
+    return answers
+
+
+def load(request):
+    """Return the QuizState for the current user, or None."""
+    value = _read_cookie(request)
+    if value is None:
+        return None
+    data = _cache().get(_state_key(value)) if _backend() == 'cache' else _decode(value)
+    return _parse(request, data)
+
+
+async def aload(request):
+    """Async load()."""
+    value = _read_cookie(request)
+    if value is None:
+        return None
+    data = await _cache().aget(_state_key(value)) if _backend() == 'cache' else _decode(value)
+    return _parse(request, data)
+
+
+def _decode(value):
+    try:
+        return base64.urlsafe_b64decode(value.encode())
+    except ValueError:
+        return None
+
+
+def _parse(request, data):
+    try:
+        state = QuizState.from_bytes(data)
+    except (ValueError, IndexError):
+        return None
+    if state.user_id != request.user.pk:
+        return None
+    return state
+
+
+def save(request, response, state):
+    """
+    Persist ``state`` and the answers recorded since it was loaded, and
+    attach the cookie that refers to it to ``response``.
+    """
+    data = state.to_bytes()
+    pending = _pending_answers(state)
+    if pending:
+        _cache().set_many(pending, _ttl())
+    if _backend() == 'cache':
+        # Reuse the browser's token so stale entries are overwritten, not leaked.
+        token = _read_cookie(request) or secrets.token_urlsafe(16)
+        _cache().set(_state_key(token), data, _ttl())
+        _write_cookie(response, token)
+    else:
+        _write_cookie(response, base64.urlsafe_b64encode(data).decode())
+    return response
+
+
+async def asave(request, response, state):
+    """Async save()."""
+    data = state.to_bytes()
+    pending = _pending_answers(state)
+    if pending:
+        await _cache().aset_many(pending, _ttl())
+    if _backend() == 'cache':
+        token = _read_cookie(request) or secrets.token_urlsafe(16)
+        await _cache().aset(_state_key(token), data, _ttl())
+        _write_cookie(response, token)
+    else:
+        _write_cookie(response, base64.urlsafe_b64encode(data).decode())
+    return response
+
+
+def clear(request, response, state=None):
+    """Forget the current quiz state, and the answers of ``state`` if given."""
+    if state is not None:
+        _cache().delete_many(_answer_keys(state))
+    if _backend() == 'cache':
+        token = _read_cookie(request)
+        if token:
+            _cache().delete(_state_key(token))
+    response.delete_cookie(COOKIE_NAME, samesite='Lax')
+    return response
+
+
+async def aclear(request, response, state=None):
+    """Async clear()."""
+    if state is not None:
+        await _cache().adelete_many(_answer_keys(state))
+    if _backend() == 'cache':
+        token = _read_cookie(request)
+        if token:
+            await _cache().adelete(_state_key(token))
+    response.delete_cookie(COOKIE_NAME, samesite='Lax')
+    return response
@@ -0,0 +1,55 @@
+"""
+Retrying writes that lose the race for SQLite's write lock.
+
+SQLite has one writer at a time. With the production database profile (see
+settings.py) a transaction takes the write lock when it begins and waits up
+to busy_timeout for it, so "database is locked" only happens when that wait
+runs out under a burst of submissions; with Django's stock settings it also
+happens at once when two transactions that started by reading both try to
+write. ``retry_on_busy`` runs such a write again from the start, a few
+times with a short randomised back-off, rather than losing a candidate's
+finished quiz.
+
+Only a whole transaction can be retried: inside an outer atomic block the
+error is passed on for the outermost caller to handle.
+"""
+import logging
+import random
+import time
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, transaction
+
+logger = logging.getLogger(__name__)
+
+ATTEMPTS = 4
+# Seconds before the first retry, doubled for each further one.
+DELAY = 0.05
+BUSY_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_busy(exc):
+    """Whether ``exc`` means another connection held the lock."""
+    return isinstance(exc, OperationalError) and any(message in str(exc).lower() for message in BUSY_MESSAGES)
+
+
+def retry_on_busy(func=None, *, attempts=ATTEMPTS, delay=DELAY, using=DEFAULT_DB_ALIAS):
+    """
+    Decorator that re-runs ``func`` up to ``attempts`` times while it fails
+    with a busy or locked database. Put it outside ``transaction.atomic``.
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as exc:
+                    if (not is_busy(exc) or attempt == attempts
+                            or transaction.get_connection(using).in_atomic_block):
+                        raise
+                    logger.info('%s: %s, retrying (attempt %d of %d)', func.__qualname__, exc, attempt, attempts)
+                    time.sleep(delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        return wrapper
+
+    return decorate if func is None else decorate(func)
@@ -0,0 +1,101 @@
+"""
+In-memory scoring.
+
+An AnswerKey maps every question of a category to its correct answer and
+marks, plus the set of answer ids that belong to it. It is derived from the
+cached question bank, so grading a submission needs no database access.
+"""
+from collections import namedtuple
+
+from . import question_bank
+
+KeyEntry = namedtuple('KeyEntry', ['correct_answer_id', 'marks', 'answer_ids'])
+GradedAnswer = namedtuple('GradedAnswer', ['question_id', 'answer_id', 'is_correct', 'marks_awarded'])
+
+
+class InvalidAnswer(ValueError):
+    """Raised when a submitted answer does not belong to the question."""
+
+
+class AnswerKey:
+    """Correct-answer map for one category."""
+
+    __slots__ = ('category_id', 'version', '_entries')
+
+    def __init__(self, category_id, version, entries):
+        self.category_id = category_id
+        self.version = version
+        self._entries = entries
+
+    @classmethod
+    def from_bank(cls, bank):
+        entries = {}
+        for question in bank.questions:
+            correct = next((a.id for a in question.answers if a.is_correct), None)
+            entries[question.id] = KeyEntry(correct, question.marks, frozenset(a.id for a in question.answers))
+        return cls(bank.category_id, bank.version, entries)
+
+    def __contains__(self, question_id):
+        return question_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_marks(self):
+        return sum(entry.marks for entry in self._entries.values())
+
+    def marks_for(self, question_id):
+        entry = self._entries.get(question_id)
+        return entry.marks if entry is not None else 0
+
+    def grade(self, question_id, answer_id):
+        """
+        Grade one answer. ``answer_id`` may be None for a skipped question.
+        Raises InvalidAnswer if the question is not in this category or the
+        answer is not one of the question's choices.
+        """
+        entry = self._entries.get(question_id)
+        if entry is None:
+            raise InvalidAnswer(f'Question {question_id} is not part of this quiz.')
+        if answer_id is None:
+            return GradedAnswer(question_id, None, False, 0)
+        if answer_id not in entry.answer_ids:
+            raise InvalidAnswer(f'Answer {answer_id} does not belong to question {question_id}.')
+        is_correct = answer_id == entry.correct_answer_id
+        return GradedAnswer(question_id, answer_id, is_correct, entry.marks if is_correct else 0)
+
+
+# category_id -> AnswerKey, private to this worker process.
+_local_keys = {}
+
+
+def get_answer_key(category_id):
+    """Return the AnswerKey for a category, or None if it does not exist."""
+    return _key_for(category_id, question_bank.get_bank(category_id))
+
+
+async def aget_answer_key(category_id):
+    """Async get_answer_key()."""
+    return _key_for(category_id, await question_bank.aget_bank(category_id))
+
+
+def _key_for(category_id, bank):
+    if bank is None:
+        _local_keys.pop(category_id, None)
+        return None
+    key = _local_keys.get(category_id)
+    if key is None or key.version != bank.version:
+        key = AnswerKey.from_bank(bank)
+        _local_keys[category_id] = key
+    return key
+
+
+def parse_id(value):
+    """Convert a submitted id to int, returning None for blank values."""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidAnswer(f'{value!r} is not a valid id.')
@@ -0,0 +1,218 @@
+"""
+Question search.
+
+On SQLite with FTS5 (the default here), question text, answer text and the
+category name of every question are kept in the ``quiz_search`` virtual
+table, whose rowid is the question id. signals.py keeps it in sync as
+questions, answers and categories change, and ``manage.py
+rebuild_search_index`` rebuilds it from scratch. Results are ranked with
+bm25, weighting question text above answers and category names.
+
+On other database backends, or SQLite builds without FTS5, search falls
+back to case-insensitive matching with a simple relevance order, so every
+caller can use ``search()`` regardless of the database.
+"""
+import re
+
+from django.db import OperationalError, connection as default_connection, transaction
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Value, When
+
+from .models import Question, Answer
+
+TABLE = 'quiz_search'
+DEFAULT_LIMIT = 100
+INDEX_CHUNK_SIZE = 500
+# bm25 column weights: question text, answers, category name.
+WEIGHTS = (10.0, 3.0, 1.0)
+
+# connection alias -> whether the search table exists.
+_available = {}
+
+
+def create_table(connection):
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                "question_text, answers_text, category_name, category_id UNINDEXED, "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+    except OperationalError:
+        # SQLite built without FTS5: search uses the fallback.
+        pass
+    _available.pop(connection.alias, None)
+
+
+def drop_table(connection):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+    _available.pop(connection.alias, None)
+
+
+def fts_available(connection=default_connection):
+    if connection.alias not in _available:
+        _available[connection.alias] = (
+            connection.vendor == 'sqlite' and TABLE in connection.introspection.table_names()
+        )
+    return _available[connection.alias]
+
+
+# --- Indexing ---
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), INDEX_CHUNK_SIZE):
+        yield ids[start:start + INDEX_CHUNK_SIZE]
+
+
+def _documents(question_filter):
+    """Yield (question_id, question_text, answers_text, category_name, category_id)."""
+    questions = list(
+        Question.objects
+        .filter(question_filter)
+        .values_list('id', 'question_text', 'category__name', 'category_id')
+    )
+    answers = {}
+    answer_rows = (
+        Answer.objects
+        .filter(question_id__in=[q[0] for q in questions])
+        .values_list('question_id', 'answer_text')
+    )
+    for question_id, text in answer_rows:
+        answers.setdefault(question_id, []).append(text)
+    for question_id, text, category_name, category_id in questions:
+        yield question_id, text, '\n'.join(answers.get(question_id, ())), category_name, category_id
+
+
+def remove_questions(question_ids, connection=default_connection):
+    if not fts_available(connection):
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(question_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', chunk)
+
+
+def index_questions(question_ids, connection=default_connection):
+    """(Re)index the given questions; ids of deleted questions are just removed."""
+    if not fts_available(connection):
+        return
+    for chunk in _chunks(question_ids):
+        rows = list(_documents(Q(id__in=chunk)))
+        # One transaction per chunk; in autocommit mode every FTS insert
+        # would otherwise be committed (and synced) on its own.
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            remove_questions(chunk, connection)
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, question_text, answers_text, category_name, category_id) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+
+def index_category(category_id, connection=default_connection):
+    """Reindex every question of a category, e.g. after it was renamed."""
+    ids = Question.objects.filter(category_id=category_id).values_list('id', flat=True)
+    index_questions(list(ids), connection)
+
+
+def rebuild(connection=default_connection):
+    """Rebuild the whole index. Returns the number of questions indexed."""
+    if not fts_available(connection):
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    ids = list(Question.objects.order_by('id').values_list('id', flat=True))
+    index_questions(ids, connection)
+    return len(ids)
+
+
+# --- Searching ---
+
+def _fts_query(text):
+    """Quote each word as a prefix term, so user input is never FTS syntax."""
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _fts_search(text, category_id, limit):
+    query = _fts_query(text)
+    if not query:
+        return []
+    sql = f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+    params = [query]
+    if category_id is not None:
+        sql += ' AND category_id = %s'
+        params.append(category_id)
+    sql += f' ORDER BY bm25({TABLE}, %s, %s, %s) LIMIT %s'
+    params.extend(WEIGHTS)
+    params.append(limit)
+    with default_connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_ranked(queryset, text):
+    text = text.strip()
+    if not text:
+        return queryset.none()
+    answer_match = Exists(Answer.objects.filter(question=OuterRef('pk'), answer_text__icontains=text))
+    questions = queryset.filter(
+        Q(question_text__icontains=text) | answer_match | Q(category__name__icontains=text)
+    )
+    return questions.annotate(
+        search_rank=Case(
+            When(question_text__icontains=text, then=Value(-3)),
+            When(answer_match, then=Value(-2)),
+            default=Value(-1),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def _fallback_search(text, category_id, limit):
+    questions = _fallback_ranked(Question.objects.all(), text)
+    if category_id is not None:
+        questions = questions.filter(category_id=category_id)
+    return list(questions.order_by('search_rank', '-created_at', '-id').values_list('id', flat=True)[:limit])
+
+
+def search(text, category_id=None, limit=DEFAULT_LIMIT):
+    """Return up to ``limit`` matching question ids, best match first."""
+    if fts_available():
+        return _fts_search(text, category_id, limit)
+    return _fallback_search(text, category_id, limit)
+
+
+def ranked(queryset, text):
+    """
+    Narrow a Question queryset to the matches for ``text``, annotated with
+    ``search_rank`` (lower is better), without a limit. For paginated
+    listings that need every match in rank order, such as the admin.
+    """
+    if not fts_available():
+        return _fallback_ranked(queryset, text)
+    query = _fts_query(text)
+    if not query:
+        return queryset.none()
+    # A join on rowid lets bm25() rank the rows the MATCH selects.
+    question_table = default_connection.ops.quote_name(Question._meta.db_table)
+    return queryset.extra(
+        select={'search_rank': f'bm25({TABLE}, %s, %s, %s)'},
+        select_params=WEIGHTS,
+        tables=[TABLE],
+        where=[f'{TABLE}.rowid = {question_table}.id', f'{TABLE} MATCH %s'],
+        params=[query],
+    )
+
+
+def search_questions(text, category_id=None, limit=DEFAULT_LIMIT, queryset=None):
+    """Like search(), but returns Question objects in rank order."""
+    ids = search(text, category_id, limit)
+    if queryset is None:
+        queryset = Question.objects.all()
+    by_id = queryset.in_bulk(ids)
+    return [by_id[i] for i in ids if i in by_id]
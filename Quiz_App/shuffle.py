@@ -0,0 +1,89 @@
+"""
+Seeded, lazily evaluated permutations.
+
+SeededPermutation(n, seed)[i] gives the position that the i-th item of a
+shuffle of ``n`` items comes from, without building the shuffled list.
+It is a small Feistel network keyed by the seed, restricted to ``range(n)``
+by cycle-walking, so each lookup is O(1) and the same seed always yields
+the same order. This lets a quiz store a seed instead of its question list.
+"""
+import hashlib
+import secrets
+import struct
+
+ROUNDS = 4
+
+
+def new_seed():
+    """Return a random seed suitable for SeededPermutation."""
+    return secrets.randbits(63)
+
+
+class SeededPermutation:
+    """A bijection on ``range(size)`` determined by ``seed``."""
+
+    __slots__ = ('size', 'seed', '_half', '_mask', '_key')
+
+    def __init__(self, size, seed):
+        self.size = size
+        self.seed = seed
+        bits = max(2, (size - 1).bit_length())
+        bits += bits % 2
+        self._half = bits // 2
+        self._mask = (1 << self._half) - 1
+        self._key = struct.pack('<Q', seed)
+
+    def __len__(self):
+        return self.size
+
+    def _round(self, number, value):
+        digest = hashlib.blake2b(struct.pack('<BQ', number, value), digest_size=8, key=self._key).digest()
+        return int.from_bytes(digest, 'little') & self._mask
+
+    def _encrypt(self, value):
+        left, right = value >> self._half, value & self._mask
+        for number in range(ROUNDS):
+            left, right = right, left ^ self._round(number, right)
+        return (left << self._half) | right
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('permutation index out of range')
+        # The Feistel domain is at most 4x larger than size, so this loop
+        # runs a handful of times on average.
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def __iter__(self):
+        for index in range(self.size):
+            yield self[index]
+
+
+def derive_seed(seed, salt):
+    """Derive an independent seed from ``seed`` for a sub-shuffle named by ``salt``."""
+    digest = hashlib.blake2b(struct.pack('<Qq', seed, salt), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') >> 1
+
+
+def allocate(sizes, total):
+    """
+    Split ``total`` draws across groups of the given ``sizes`` in proportion to
+    their size (largest-remainder method), never exceeding a group's size.
+    Returns a list of counts in the same order as ``sizes``.
+    """
+    population = sum(sizes)
+    total = min(total, population)
+    if not population:
+        return [0] * len(sizes)
+    counts = [size * total // population for size in sizes]
+    remainders = sorted(
+        range(len(sizes)),
+        key=lambda i: (-(sizes[i] * total % population), i),
+    )
+    for i in remainders[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
@@ -0,0 +1,233 @@
+"""
+Model signal handlers that keep derived data (cached question banks, the
+search index, near-duplicate signatures, category statistics, cached host
+roles) in step with the Category, Question, Answer and Attempt tables and
+users' group memberships.
+
+Bulk operations (``bulk_create``/``bulk_update``) do not send model signals,
+so code that uses them sends ``questions_bulk_changed`` once afterwards with
+the affected ``category_ids`` and, if known, ``question_ids``. The same goes
+for queryset deletes of answers: rather than a category lookup, a reindex
+and a counter update per answer, the answer handlers leave those to the
+caller's ``questions_bulk_changed``. Answers deleted along with their
+question or category are likewise left to that parent's delete handlers.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from . import catalogue, leaderboard, permissions, question_bank, search, similarity, stats
+from .models import Category, Question, Answer, Attempt, CategoryStats
+
+questions_bulk_changed = Signal()
+
+
+def _invalidate_bank(category_id):
+    """
+    Invalidate now, and again once the surrounding transaction commits so a
+    worker that rebuilt the bank from pre-commit data does not keep it.
+    """
+    if category_id is None:
+        return
+    question_bank.invalidate(category_id)
+    transaction.on_commit(lambda: question_bank.invalidate(category_id))
+
+
+def _category_of_question(question_id):
+    return Question.objects.filter(pk=question_id).values_list('category_id', flat=True).first()
+
+
+def _deleted_with(origin, model):
+    """Whether a delete was started on ``model`` rows, one instance or a queryset."""
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    _invalidate_bank(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def catalogue_changed(sender, **kwargs):
+    # Names, question counts and marks on the home page.
+    catalogue.invalidate()
+    transaction.on_commit(catalogue.invalidate)
+
+
+@receiver(post_save, sender=Category)
+def category_saved_search(sender, instance, created, **kwargs):
+    # The category name is part of every question's search document.
+    if not created:
+        search.index_category(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def category_created_stats(sender, instance, created, **kwargs):
+    if created:
+        CategoryStats.objects.get_or_create(category=instance)
+        stats.invalidate()
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted_stats(sender, instance, **kwargs):
+    stats.invalidate()
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    # Its questions are deleted with it and leave the search index to it.
+    instance._question_ids = list(instance.questions.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted_search(sender, instance, **kwargs):
+    search.remove_questions(getattr(instance, '_question_ids', ()))
+
+
+@receiver(pre_save, sender=Question)
+def question_moving(sender, instance, **kwargs):
+    # Remember the previous category and marks so a question moved between
+    # categories invalidates both banks and the statistics follow the change.
+    instance._previous_category_id = instance._previous_marks = None
+    if instance.pk:
+        previous = Question.objects.filter(pk=instance.pk).values_list('category_id', 'marks').first()
+        if previous is not None:
+            instance._previous_category_id, instance._previous_marks = previous
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_category_id', None)
+    if previous is not None and previous != instance.category_id:
+        _invalidate_bank(previous)
+    _invalidate_bank(instance.category_id)
+    search.index_questions([instance.pk])
+    similarity.index_questions([instance.pk])
+
+
+@receiver(post_save, sender=Question)
+def question_saved_stats(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_category_id', None)
+    if created or previous is None:
+        stats.adjust(instance.category_id, question_count=1, total_marks=instance.marks)
+    elif previous != instance.category_id:
+        # The answers move with the question.
+        answers = instance.answers.count()
+        stats.adjust(previous, question_count=-1, total_marks=-instance._previous_marks, answer_count=-answers)
+        stats.adjust(instance.category_id, question_count=1, total_marks=instance.marks, answer_count=answers)
+    else:
+        stats.adjust(instance.category_id, total_marks=instance.marks - instance._previous_marks)
+
+
+@receiver(pre_delete, sender=Question)
+def question_deleting(sender, instance, origin=None, **kwargs):
+    # Its answers are deleted with it and leave the counting to it.
+    if not _deleted_with(origin, Category):
+        instance._answer_count = instance.answers.count()
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_with(origin, Category):
+        # The category's handlers cover the bank, index and statistics.
+        return
+    _invalidate_bank(instance.category_id)
+    search.remove_questions([instance.pk])
+    stats.adjust(
+        instance.category_id,
+        question_count=-1,
+        total_marks=-instance.marks,
+        answer_count=-getattr(instance, '_answer_count', 0),
+    )
+
+
+def _category_of_answer(answer):
+    # Use the related question if it is already loaded (it is in formsets).
+    question = Answer.question.field.get_cached_value(answer, None)
+    return question.category_id if question is not None else _category_of_question(answer.question_id)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, origin=None, **kwargs):
+    if origin is not None and not isinstance(origin, Answer):
+        # Deleted along with its question or category, or by a queryset
+        # delete whose caller sends questions_bulk_changed.
+        return
+    category_id = _category_of_answer(instance)
+    _invalidate_bank(category_id)
+    if category_id is not None:
+        search.index_questions([instance.question_id])
+    if kwargs.get('created'):
+        stats.adjust(category_id, answer_count=1)
+    elif 'created' not in kwargs:
+        stats.adjust(category_id, answer_count=-1)
+
+
+@receiver(post_save, sender=Attempt)
+def attempt_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.attempt_recorded(instance)
+        leaderboard.attempt_finished(instance)
+        catalogue.invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Attempt)
+def attempt_deleted(sender, instance, **kwargs):
+    stats.attempt_recorded(instance, sign=-1)
+
+
+@receiver(questions_bulk_changed)
+def questions_bulk_changed_banks(sender, category_ids, **kwargs):
+    for category_id in category_ids:
+        _invalidate_bank(category_id)
+
+
+@receiver(questions_bulk_changed)
+def questions_bulk_changed_catalogue(sender, **kwargs):
+    catalogue.invalidate()
+
+
+@receiver(questions_bulk_changed)
+def questions_bulk_changed_stats(sender, category_ids, **kwargs):
+    if category_ids:
+        stats.recount(category_ids)
+
+
+@receiver(questions_bulk_changed)
+def questions_bulk_changed_search(sender, question_ids=None, **kwargs):
+    if question_ids:
+        search.index_questions(question_ids)
+
+
+@receiver(questions_bulk_changed)
+def questions_bulk_changed_similarity(sender, question_ids=None, **kwargs):
+    if question_ids:
+        similarity.index_questions(question_ids)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def group_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Forget the cached host role of users whose groups changed."""
+    if action == 'pre_clear' and reverse:
+        # group.user_set.clear(): who is affected is only known beforehand.
+        instance._quiz_cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = instance.__dict__.pop('_quiz_cleared_user_ids', [])
+    else:
+        user_ids = list(pk_set)
+    permissions.invalidate(user_ids)
+    transaction.on_commit(lambda: permissions.invalidate(user_ids))
@@ -0,0 +1,273 @@
+"""
+Near-duplicate question detection.
+
+Each question's normalised text is turned into a set of word shingles
+(single words and word pairs) and summarised by a MinHash signature of
+NUM_HASHES values. Two signatures agree in a fraction of positions that
+estimates the Jaccard similarity of the shingle sets.
+
+To avoid comparing a question with every other one, the signature is split
+into BANDS bands; each band is hashed to a SimilarityBucket key. Only
+questions in the same category that share at least one bucket are compared
+(locality-sensitive hashing). With 8 bands of 4 rows, pairs above roughly
+0.6 similarity are very likely to share a bucket. Very common buckets (e.g.
+questions generated from one template) are only searched up to
+MAX_BUCKET_CANDIDATES deep, which keeps imports and reports linear.
+
+Signatures and buckets are updated from signals.py whenever a question is
+saved, and after bulk imports.
+"""
+import hashlib
+import re
+from array import array
+
+from django.db import connection, transaction
+
+from .models import Question, QuestionSignature, SimilarityBucket
+
+NUM_HASHES = 32
+BANDS = 8
+ROWS = NUM_HASHES // BANDS
+# Estimated similarity at or above which a question counts as a near-duplicate.
+THRESHOLD = 0.7
+
+# Questions compared per bucket; see the module docstring.
+MAX_BUCKET_CANDIDATES = 50
+
+_MAX_HASH = (1 << 32) - 1
+# Each shingle is hashed once per key; a 64-byte blake2b digest yields 16 of
+# the NUM_HASHES 32-bit hash values.
+_HASH_KEYS = tuple(b'quiz-minhash-%d' % i for i in range(NUM_HASHES // 16))
+# Keep IN (...) lists well below SQLite's bound-parameter limit.
+_QUERY_CHUNK = 500
+
+
+# --- Signatures ---
+
+def shingles(text):
+    """Word unigrams and bigrams of the normalised text."""
+    words = re.findall(r'\w+', (text or '').casefold())
+    grams = set(words)
+    grams.update(f'{a} {b}' for a, b in zip(words, words[1:]))
+    return grams
+
+
+def _hash_values(shingle):
+    data = shingle.encode()
+    values = array('I')
+    for key in _HASH_KEYS:
+        values.frombytes(hashlib.blake2b(data, digest_size=64, key=key).digest())
+    return values
+
+
+def signature(text):
+    """MinHash signature of ``text`` as a tuple of NUM_HASHES ints."""
+    rows = [_hash_values(g) for g in shingles(text)]
+    if not rows:
+        return (_MAX_HASH,) * NUM_HASHES
+    # Column-wise minimum over every shingle's hash values.
+    return tuple(map(min, zip(*rows)))
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_HASHES
+
+
+def band_keys(sig):
+    """One signed 63-bit bucket key per band."""
+    keys = []
+    for band in range(BANDS):
+        values = array('I', sig[band * ROWS:(band + 1) * ROWS])
+        digest = hashlib.blake2b(bytes([band]) + values.tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little') >> 1)
+    return keys
+
+
+def _pack(sig):
+    return array('I', sig).tobytes()
+
+
+def _unpack(data):
+    return tuple(array('I', bytes(data)))
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), _QUERY_CHUNK):
+        yield values[start:start + _QUERY_CHUNK]
+
+
+def _signatures(question_ids):
+    """question_id -> signature for the given ids that are indexed."""
+    found = {}
+    for chunk in _chunks(question_ids):
+        for question_id, data in QuestionSignature.objects.filter(question_id__in=chunk).values_list(
+            'question_id', 'signature'
+        ):
+            found[question_id] = _unpack(data)
+    return found
+
+
+# --- Index maintenance ---
+
+def index_questions(question_ids):
+    """(Re)compute signatures and buckets for the given questions."""
+    for chunk in _chunks(question_ids):
+        rows = list(Question.objects.filter(id__in=chunk).values_list('id', 'category_id', 'question_text'))
+        sigs = {qid: signature(text) for qid, _, text in rows}
+        with transaction.atomic():
+            SimilarityBucket.objects.filter(question_id__in=chunk).delete()
+            QuestionSignature.objects.bulk_create(
+                [QuestionSignature(question_id=qid, signature=_pack(sig)) for qid, sig in sigs.items()],
+                update_conflicts=True,
+                unique_fields=['question'],
+                update_fields=['signature'],
+            )
+            _insert_buckets(
+                (qid, category_id, key)
+                for qid, category_id, _ in rows
+                for key in band_keys(sigs[qid])
+            )
+
+
+def _insert_buckets(rows):
+    """
+    Insert (question_id, category_id, key) rows. There are BANDS rows per
+    question, so this skips model instances and uses one executemany.
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(SimilarityBucket._meta.get_field(name).column) for name in ('question', 'category', 'key'))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(SimilarityBucket._meta.db_table)} ({columns}) VALUES (%s, %s, %s)',
+            list(rows),
+        )
+
+
+def index_missing(category_id=None):
+    """Index questions that have no signature yet. Returns how many were indexed."""
+    questions = Question.objects.filter(signature__isnull=True)
+    if category_id is not None:
+        questions = questions.filter(category_id=category_id)
+    ids = list(questions.values_list('id', flat=True))
+    index_questions(ids)
+    return len(ids)
+
+
+# --- Lookups ---
+
+def find_similar(text, category_id, exclude_id=None, threshold=THRESHOLD, limit=5):
+    """
+    Return up to ``limit`` (question_id, similarity) pairs for indexed
+    questions of the category that are near-duplicates of ``text``.
+    """
+    sig = signature(text)
+    candidates = set(
+        SimilarityBucket.objects
+        .filter(category_id=category_id, key__in=band_keys(sig))
+        .exclude(question_id=exclude_id)
+        .values_list('question_id', flat=True)[:MAX_BUCKET_CANDIDATES * BANDS]
+    )
+    scored = [
+        (question_id, similarity(sig, other))
+        for question_id, other in _signatures(candidates).items()
+    ]
+    scored = [pair for pair in scored if pair[1] >= threshold]
+    scored.sort(key=lambda pair: (-pair[1], pair[0]))
+    return scored[:limit]
+
+
+class BatchChecker:
+    """
+    Finds near-duplicates for many new questions at once, against the
+    indexed questions and against each other, with one bucket query per
+    batch. Used by the importer.
+    """
+
+    def __init__(self, threshold=THRESHOLD):
+        self.threshold = threshold
+        # (category_id, key) -> [(signature, label)] for questions seen in this run.
+        self._seen = {}
+
+    def check(self, items):
+        """
+        ``items`` is a list of (category_id, text, label). Returns a list with,
+        for each item, the label or question id of its best near-duplicate,
+        or None.
+        """
+        sigs = [signature(text) for _, text, _ in items]
+        keys = [band_keys(sig) for sig in sigs]
+
+        buckets = {}
+        all_keys = {key for item_keys in keys for key in item_keys}
+        category_ids = {category_id for category_id, _, _ in items}
+        for chunk in _chunks(all_keys):
+            rows = SimilarityBucket.objects.filter(
+                key__in=chunk, category_id__in=category_ids,
+            ).values_list('category_id', 'key', 'question_id')
+            for category_id, key, question_id in rows:
+                found = buckets.setdefault((category_id, key), set())
+                if len(found) < MAX_BUCKET_CANDIDATES:
+                    found.add(question_id)
+        stored = _signatures({qid for qids in buckets.values() for qid in qids})
+
+        matches = []
+        for (category_id, _, label), sig, item_keys in zip(items, sigs, keys):
+            best, best_score = None, self.threshold
+            for key in item_keys:
+                for question_id in buckets.get((category_id, key), ()):
+                    score = similarity(sig, stored.get(question_id, ()))
+                    if score >= best_score:
+                        best, best_score = question_id, score
+                for other_sig, other_label in self._seen.get((category_id, key), ()):
+                    score = similarity(sig, other_sig)
+                    if score >= best_score:
+                        best, best_score = other_label, score
+            matches.append(best)
+            for key in item_keys:
+                seen = self._seen.setdefault((category_id, key), [])
+                if len(seen) < MAX_BUCKET_CANDIDATES:
+                    seen.append((sig, label))
+        return matches
+
+
+def duplicate_report(category_id, threshold=THRESHOLD):
+    """
+    Group the category's near-duplicate questions into clusters.
+    Returns a list of clusters, each a sorted list of question ids.
+    Only pairs sharing a bucket are compared, never every pair; within a
+    bucket each question is compared with the next MAX_BUCKET_CANDIDATES.
+    """
+    index_missing(category_id)
+    by_key = {}
+    rows = SimilarityBucket.objects.filter(category_id=category_id).values_list('key', 'question_id')
+    for key, question_id in rows.iterator(chunk_size=5000):
+        by_key.setdefault(key, []).append(question_id)
+    buckets = [ids for ids in by_key.values() if len(ids) > 1]
+    sigs = _signatures({qid for ids in buckets for qid in ids})
+
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    compared = set()
+    for ids in buckets:
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:i + 1 + MAX_BUCKET_CANDIDATES]:
+                pair = (a, b) if a < b else (b, a)
+                if pair in compared:
+                    continue
+                compared.add(pair)
+                if similarity(sigs[a], sigs[b]) >= threshold:
+                    parent[find(a)] = find(b)
+
+    clusters = {}
+    for question_id in parent:
+        clusters.setdefault(find(question_id), []).append(question_id)
+    return sorted((sorted(ids) for ids in clusters.values() if len(ids) > 1), key=lambda ids: ids[0])
@@ -0,0 +1,196 @@
+"""
+Concurrency benchmark of quiz submissions under each database profile.
+
+``compare_profiles()`` measures how many finished quizzes per second the
+site can store with Django's stock SQLite settings ('default') and with the
+tuned profile ('production', see settings.py). For each profile it copies a
+freshly migrated and seeded database, starts several worker processes
+against the copy (as uvicorn runs several workers against one file) and has
+every thread in them submit quizzes for a fixed time, all starting at the
+same moment.
+
+A submission is what the results page does: read the category's question
+bank and answer key (cached after the first time), grade a random set of
+answers, store the attempt with ``attempts.record_attempt`` (which updates
+the dashboard counters and the leaderboard) and count the candidate's
+attempts. The connection is then released as at the end of a request, so
+connection reuse counts too. ``submission_load()`` is that loop, run in
+each worker process by ``manage.py benchmark_sqlite --child``.
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import OperationalError, close_old_connections, connection
+
+from . import attempts, question_bank, scoring
+from .benchmark import category_name
+from .metrics import percentile
+from .models import Attempt, Category
+
+PROFILES = ('default', 'production')
+DEFAULT_SIZE = 200
+
+
+class SqliteBenchmarkError(Exception):
+    """A worker process failed to run."""
+
+
+def submission_load(category_id, threads=4, seconds=10.0, start_at=None, seed=0):
+    """
+    Submit quizzes for ``category_id`` from ``threads`` threads for
+    ``seconds`` (from ``start_at``, a time.time() value, if given). Returns
+    {'submissions', 'errors', 'latencies_ms'}.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    users = [User.objects.create(username=f'sqlite-bench-{run_id}-{n}') for n in range(threads)]
+    close_old_connections()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    if start_at is not None:
+        time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.perf_counter() + seconds
+
+    def submit(user, rng):
+        bank = question_bank.get_bank(category_id)
+        answer_key = scoring.get_answer_key(category_id)
+        graded = [
+            answer_key.grade(question.id, rng.choice(question.answers).id)
+            for question in bank.draw(rng.getrandbits(63))
+        ]
+        attempts.record_attempt(user, category_id, graded, sum(answer_key.marks_for(g.question_id) for g in graded))
+        Attempt.objects.filter(user=user, category_id=category_id).count()
+
+    def one(n):
+        rng = random.Random(f'{seed}:{n}')
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    submit(users[n], rng)
+                except OperationalError as exc:
+                    with lock:
+                        errors.append(str(exc))
+                else:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        latencies.append(round(elapsed, 3))
+                finally:
+                    # As at the end of a request.
+                    close_old_connections()
+        finally:
+            connection.close()
+
+    if threads == 1:
+        one(0)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(one, range(threads)))
+    return {'submissions': len(latencies), 'errors': errors, 'latencies_ms': latencies}
+
+
+def _manage(args, env, **kwargs):
+    return subprocess.run(
+        [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), *args],
+        env=env, cwd=settings.BASE_DIR, check=False, capture_output=True, text=True, **kwargs,
+    )
+
+
+def _env(profile, path):
+    return {**os.environ, 'QUIZ_DB_PROFILE': profile, 'QUIZ_DB_PATH': path}
+
+
+def _prepare_template(directory, size):
+    """A migrated database with one seeded bank of ``size`` questions."""
+    path = os.path.join(directory, 'template.sqlite3')
+    env = _env('default', path)
+    for args in (['migrate', '-v0'], ['seed_benchmark', '--sizes', str(size), '-v0']):
+        done = _manage(args, env)
+        if done.returncode:
+            raise SqliteBenchmarkError(f"{' '.join(args)} failed:\n{done.stderr}")
+    return path
+
+
+def measure_profile(profile, template, directory, processes, threads, seconds, size):
+    """Run the load under ``profile`` against a copy of ``template``."""
+    os.makedirs(os.path.join(directory, profile))
+    path = os.path.join(directory, profile, 'db.sqlite3')
+    shutil.copyfile(template, path)
+    env = _env(profile, path)
+    # Leave the workers time to start and create their users.
+    start_at = time.time() + 2 + processes * 0.5
+    args = ['benchmark_sqlite', '--child', '--category', category_name(size), '--threads', str(threads),
+            '--seconds', str(seconds), '--start-at', str(start_at)]
+    children = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), *args, '--seed', str(n)],
+            env=env, cwd=settings.BASE_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        for n in range(processes)
+    ]
+    results = []
+    for child in children:
+        out, err = child.communicate()
+        if child.returncode:
+            raise SqliteBenchmarkError(f'{profile} worker failed:\n{err}')
+        results.append(json.loads(out))
+    return summarise(profile, results, seconds, processes, threads)
+
+
+def summarise(profile, results, seconds, processes, threads):
+    latencies = sorted(ms for result in results for ms in result['latencies_ms'])
+    errors = [error for result in results for error in result['errors']]
+    submissions = len(latencies)
+    return {
+        'profile': profile,
+        'processes': processes,
+        'threads': threads,
+        'seconds': seconds,
+        'submissions': submissions,
+        'submissions_per_second': round(submissions / seconds, 2) if seconds else 0.0,
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+
+def compare_profiles(profiles=PROFILES, processes=4, threads=4, seconds=10.0, size=DEFAULT_SIZE, progress=None):
+    """
+    Measure every profile in turn on identical databases. Returns a report
+    with one summary per profile and each profile's throughput relative to
+    the first one.
+    """
+    directory = tempfile.mkdtemp(prefix='quiz-sqlite-bench-')
+    try:
+        template = _prepare_template(directory, size)
+        rows = []
+        for profile in profiles:
+            if progress is not None:
+                progress(f'{profile}: {processes} processes x {threads} threads for {seconds}s')
+            rows.append(measure_profile(profile, template, directory, processes, threads, seconds, size))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    base = rows[0]['submissions_per_second']
+    for row in rows:
+        row['speedup'] = round(row['submissions_per_second'] / base, 2) if base else None
+    return {'bank_size': size, 'profiles': rows}
+
+
+def bench_category_id(name):
+    category = Category.objects.filter(name=name).values_list('id', flat=True).first()
+    if category is None:
+        raise SqliteBenchmarkError(f'No category {name!r}; run manage.py seed_benchmark first.')
+    return category
@@ -0,0 +1,153 @@
+"""
+Per-category statistics for the host dashboard.
+
+Each category has a CategoryStats row of running totals (questions, answers,
+marks, attempts and their scores). Instead of counting rows on every page
+load, the totals are adjusted incrementally with ``F()`` updates from the
+model signals in signals.py whenever a question, answer or attempt is
+created, changed or deleted. Bulk writes, which send no model signals,
+recount the affected categories instead.
+
+The dashboard reads everything through ``dashboard()``, which is one cache
+read while nothing has changed. Any counter update deletes the cached value
+(now and again on commit, like the question bank).
+
+Incremental counters can drift if rows are changed behind Django's back
+(raw SQL, ``QuerySet.update()``); ``manage.py recount_stats`` recomputes
+them from the tables and is meant to be run periodically, e.g. nightly.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import Category, Question, Answer, Attempt, CategoryStats
+
+DASHBOARD_KEY = 'quiz:stats:dashboard'
+# Invalidation is explicit; the timeout only bounds the damage of a missed one.
+DASHBOARD_TIMEOUT = 60 * 60
+
+COUNTERS = ('question_count', 'answer_count', 'total_marks', 'attempt_count', 'attempt_score', 'attempt_marks')
+
+
+def _cache():
+    return caches[getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')]
+
+
+def invalidate():
+    """Drop the cached dashboard, now and once the transaction commits."""
+    _cache().delete(DASHBOARD_KEY)
+    transaction.on_commit(lambda: _cache().delete(DASHBOARD_KEY))
+
+
+# --- Incremental updates ---
+
+def adjust(category_id, **deltas):
+    """
+    Add ``deltas`` (counter name -> amount) to a category's totals in one
+    UPDATE. Categories without a stats row (e.g. one being deleted) are
+    skipped; recount() creates missing rows.
+    """
+    changes = {name: F(name) + amount for name, amount in deltas.items() if amount}
+    if category_id is None or not changes:
+        return
+    if CategoryStats.objects.filter(category_id=category_id).update(**changes):
+        invalidate()
+
+
+def attempt_recorded(attempt, sign=1):
+    """Count a finished attempt (or, with ``sign=-1``, uncount a deleted one)."""
+    adjust(
+        attempt.category_id,
+        attempt_count=sign,
+        attempt_score=sign * attempt.score,
+        attempt_marks=sign * attempt.total_marks,
+    )
+
+
+# --- Full recount ---
+
+def _totals(model, group_by, category_ids, **aggregates):
+    rows = model.objects.order_by()
+    if category_ids is not None:
+        rows = rows.filter(**{f'{group_by}__in': category_ids})
+    return {row.pop(group_by): row for row in rows.values(group_by).annotate(**aggregates)}
+
+
+def recount(category_ids=None):
+    """
+    Recompute the totals of the given categories (all if None) from the
+    tables with one grouped query per table. Returns the number of categories.
+    """
+    categories = Category.objects.all()
+    if category_ids is not None:
+        category_ids = list(category_ids)
+        categories = categories.filter(id__in=category_ids)
+    ids = list(categories.values_list('id', flat=True))
+
+    questions = _totals(Question, 'category_id', category_ids, q=Count('id'), m=Sum('marks'))
+    answers = _totals(Answer, 'question__category_id', category_ids, a=Count('id'))
+    attempts = _totals(Attempt, 'category_id', category_ids, n=Count('id'), s=Sum('score'), t=Sum('total_marks'))
+
+    rows = []
+    for category_id in ids:
+        q = questions.get(category_id, {})
+        a = answers.get(category_id, {})
+        t = attempts.get(category_id, {})
+        rows.append(CategoryStats(
+            category_id=category_id,
+            question_count=q.get('q') or 0,
+            total_marks=q.get('m') or 0,
+            answer_count=a.get('a') or 0,
+            attempt_count=t.get('n') or 0,
+            attempt_score=t.get('s') or 0,
+            attempt_marks=t.get('t') or 0,
+        ))
+    CategoryStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['category'], update_fields=list(COUNTERS),
+    )
+    invalidate()
+    return len(rows)
+
+
+# --- Reading ---
+
+def _build_dashboard():
+    rows = (
+        CategoryStats.objects
+        .select_related('category')
+        .order_by('category__name')
+    )
+    categories = []
+    totals = dict.fromkeys(COUNTERS, 0)
+    for row in rows:
+        categories.append({
+            'id': row.category_id,
+            'name': row.category.name,
+            'question_count': row.question_count,
+            'answer_count': row.answer_count,
+            'total_marks': row.total_marks,
+            'attempt_count': row.attempt_count,
+            'average_score': row.average_score,
+            'average_percent': row.average_percent,
+        })
+        for name in COUNTERS:
+            totals[name] += getattr(row, name)
+    totals['category_count'] = len(categories)
+    totals['average_percent'] = (
+        100 * totals['attempt_score'] / totals['attempt_marks'] if totals['attempt_marks'] else None
+    )
+    return {'totals': totals, 'categories': categories}
+
+
+def dashboard():
+    """
+    Return ``{'totals': {...}, 'categories': [{...}, ...]}`` for the host
+    dashboard. One cache read while warm, one query when rebuilt.
+    """
+    cache = _cache()
+    data = cache.get(DASHBOARD_KEY)
+    if data is None:
+        data = _build_dashboard()
+        cache.set(DASHBOARD_KEY, data, DASHBOARD_TIMEOUT)
+    return data
@@ -1,3 +1,1900 @@
-from django.test import TestCase
+import base64
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import attempts, benchmark, bulk_edit, catalogue, checks, exporter, forms, host_views, importer, item_stats, jobs, leaderboard, metrics, pagination, permissions, question_bank, quiz_state, retry, scoring, search, shuffle, similarity, sqlite_benchmark, stats
+from .models import Category, Question, Answer, Attempt, CategoryStats, QuestionStats, AnswerStats, LeaderboardEntry, Job, AttemptAnswer
+
+
+def make_question(category, text, marks=1, correct='Right', wrong=('Wrong 1', 'Wrong 2')):
+    """Create a question with one correct and some wrong answers."""
+    question = Question.objects.create(category=category, question_text=text, marks=marks)
+    Answer.objects.create(question=question, answer_text=correct, is_correct=True)
+    for w in wrong:
+        Answer.objects.create(question=question, answer_text=w, is_correct=False)
+    return question
+
+
+class QuizTestCase(TestCase):
+    """Shared fixtures: one category with three questions and a logged-in user."""
+
+    def setUp(self):
+        cache.clear()
+        question_bank._local_banks.clear()
+        self.category = Category.objects.create(name='Audio')
+        self.questions = [make_question(self.category, f'Question {i}') for i in range(3)]
+        self.user = User.objects.create_user('candidate', password='pw-12345!')
+        self.client.login(username='candidate', password='pw-12345!')
+
+
+class SharedCacheMixin:
+    """
+    Run the test against a file-based cache, which several processes can
+    share like Redis, instead of the per-process memory cache.
+    """
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        shared = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir.name,
+        }})
+        shared.enable()
+        self.addCleanup(shared.disable)
+        super().setUp()
+
+    def other_process(self):
+        """While active, the module-level caches are those of a fresh process."""
+        stack = contextlib.ExitStack()
+        stack.enter_context(mock.patch.object(question_bank, '_local_banks', {}))
+        stack.enter_context(mock.patch.object(scoring, '_local_keys', {}))
+        return stack
+
+
+class QuestionBankTests(QuizTestCase):
+
+    def test_bank_snapshot(self):
+        bank = question_bank.get_bank(self.category.id)
+        self.assertEqual(bank.category_name, 'Audio')
+        self.assertEqual(len(bank), 3)
+        snapshot = bank.get(self.questions[0].id)
+        self.assertEqual(snapshot.question_text, 'Question 0')
+        self.assertEqual(sum(a.is_correct for a in snapshot.answers), 1)
+
+    def test_missing_category(self):
+        self.assertIsNone(question_bank.get_bank(999))
+
+    def test_warm_bank_needs_no_queries(self):
+        question_bank.get_bank(self.category.id)
+        with self.assertNumQueries(0):
+            question_bank.get_bank(self.category.id)
+
+    def test_shared_cache_used_by_other_workers(self):
+        question_bank.get_bank(self.category.id)
+        question_bank._local_banks.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(question_bank.get_bank(self.category.id)), 3)
+
+    def test_invalidated_by_signals(self):
+        question_bank.get_bank(self.category.id)
+        make_question(self.category, 'Question 3')
+        self.assertEqual(len(question_bank.get_bank(self.category.id)), 4)
+
+        answer = self.questions[0].answers.first()
+        answer.answer_text = 'Edited'
+        answer.save()
+        texts = [a.answer_text for a in question_bank.get_bank(self.category.id).get(self.questions[0].id).answers]
+        self.assertIn('Edited', texts)
+
+        self.questions[1].delete()
+        self.assertIsNone(question_bank.get_bank(self.category.id).get(self.questions[1].id))
+
+    def test_concurrent_misses_build_once(self):
+        question_bank.get_bank(self.category.id)
+        question_bank._local_banks.clear()
+        cache.clear()
+        build = mock.Mock(wraps=lambda category_id, version: (time.sleep(0.05), bank)[1])
+        bank = question_bank.build_bank(self.category.id, question_bank._current_version(self.category.id))
+        with mock.patch.object(question_bank, 'build_bank', build):
+            threads = [threading.Thread(target=question_bank.get_bank, args=(self.category.id,)) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(build.call_count, 1)
+        self.assertIs(question_bank._local_banks[self.category.id], bank)
+
+    def test_moving_question_invalidates_both_categories(self):
+        other = Category.objects.create(name='Video')
+        question_bank.get_bank(self.category.id)
+        question_bank.get_bank(other.id)
+        question = self.questions[0]
+        question.category = other
+        question.save()
+        self.assertEqual(len(question_bank.get_bank(self.category.id)), 2)
+        self.assertEqual(len(question_bank.get_bank(other.id)), 1)
+
+
+class SharedCacheTests(SharedCacheMixin, QuizTestCase):
+    """Changes made in one process reach the others through the shared cache."""
+
+    def test_changes_in_another_process_reach_this_one(self):
+        q0 = self.questions[0]
+        bank = question_bank.get_bank(self.category.id)
+        key = scoring.get_answer_key(self.category.id)
+        catalogue_version = catalogue.versions(self.user.pk)[0]
+
+        with self.other_process():
+            question_bank.get_bank(self.category.id)
+            make_question(self.category, 'Question 3')
+            wrong = q0.answers.filter(is_correct=False).first()
+            bulk_edit.apply([{'id': q0.id, 'answers': [{'id': wrong.id, 'is_correct': True}] + [
+                {'id': a.id, 'is_correct': False} for a in q0.answers.filter(is_correct=True)
+            ]}])
+
+        # This process still holds the old bank and key in its local dicts,
+        # but the shared version token has moved on.
+        self.assertIs(question_bank._local_banks[self.category.id], bank)
+        self.assertEqual(len(question_bank.get_bank(self.category.id)), 4)
+        self.assertFalse(key.grade(q0.id, wrong.id).is_correct)
+        self.assertTrue(scoring.get_answer_key(self.category.id).grade(q0.id, wrong.id).is_correct)
+        self.assertNotEqual(catalogue.versions(self.user.pk)[0], catalogue_version)
+
+    def test_process_local_cache_is_reported_with_several_workers(self):
+        self.assertEqual(checks.check_shared_cache(None), [])
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual(checks.check_shared_cache(None), [])
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+                self.assertEqual([w.id for w in checks.check_shared_cache(None)], ['Quiz_App.W001'])
+
+
+class QuizViewTests(QuizTestCase):
+
+    def test_full_quiz_flow(self):
+        url = reverse('quiz', args=[self.category.id])
+        for _ in range(3):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            question = response.context['question']
+            correct = next(a for a in question.answers if a.is_correct)
+            self.client.post(url, {'answer': correct.id})
+        response = self.client.get(url)
+        self.assertRedirects(response, reverse('results', args=[self.category.id]), fetch_redirect_response=False)
+        response = self.client.get(reverse('results', args=[self.category.id]))
+        self.assertEqual(response.context['score'], 3)
+
+        attempt = Attempt.objects.get(user=self.user)
+        self.assertEqual((attempt.score, attempt.total_marks, attempt.total_questions), (3, 3, 3))
+        self.assertEqual(attempt.answers.filter(is_correct=True).count(), 3)
+
+        # Reloading the results page does not store the attempt twice.
+        self.client.get(reverse('results', args=[self.category.id]))
+        self.assertEqual(Attempt.objects.count(), 1)
+
+    def answer_next(self, correct=True):
+        """Answer the current question; returns its id."""
+        url = reverse('quiz', args=[self.category.id])
+        question = self.client.get(url).context['question']
+        answer = next(a for a in question.answers if a.is_correct == correct)
+        self.assertEqual(self.client.post(url, {'answer': answer.id}).status_code, 302)
+        return question.id
+
+    def test_quiz_goes_on_when_a_question_is_added_midway(self):
+        first = self.answer_next()
+        make_question(self.category, 'Question 3')
+        response = self.client.get(reverse('quiz', args=[self.category.id]))
+        # Not restarted: the answered question is not asked again.
+        self.assertEqual(response.context['question_number'], 2)
+        self.assertNotEqual(response.context['question'].id, first)
+        self.answer_next()
+        self.answer_next()
+        self.assertRedirects(self.client.get(reverse('quiz', args=[self.category.id])),
+                             reverse('results', args=[self.category.id]), fetch_redirect_response=False)
+
+        response = self.client.get(reverse('results', args=[self.category.id]))
+        attempt = Attempt.objects.get(user=self.user)
+        self.assertEqual((attempt.score, attempt.total_questions), (3, 3))
+        self.assertEqual(response.context['score'], attempt.score)
+
+    def test_finished_attempt_is_recorded_when_questions_are_deleted(self):
+        answered = [self.answer_next(), self.answer_next(correct=False), self.answer_next()]
+        # The host deletes an answered question before the results page.
+        Question.objects.filter(pk=answered[0]).delete()
+        response = self.client.get(reverse('results', args=[self.category.id]))
+        attempt = Attempt.objects.get(user=self.user)
+        self.assertEqual((attempt.score, attempt.total_questions), (1, 2))
+        self.assertEqual(set(attempt.answers.values_list('question_id', flat=True)), set(answered[1:]))
+        self.assertEqual((response.context['score'], response.context['total_questions']), (1, 2))
+
+    def test_quiz_ends_early_when_unanswered_questions_are_deleted(self):
+        first = self.answer_next()
+        Question.objects.exclude(pk=first).delete()
+        self.assertRedirects(self.client.get(reverse('quiz', args=[self.category.id])),
+                             reverse('results', args=[self.category.id]), fetch_redirect_response=False)
+        self.client.get(reverse('results', args=[self.category.id]))
+        self.assertEqual(Attempt.objects.get(user=self.user).total_questions, 1)
+
+    def test_leaving_early_scores_the_unanswered_questions_as_skipped(self):
+        answered = self.answer_next()
+        response = self.client.get(reverse('results', args=[self.category.id]))
+        attempt = Attempt.objects.get(user=self.user)
+        self.assertEqual((attempt.score, attempt.total_marks, attempt.total_questions), (1, 3, 3))
+        self.assertEqual(attempt.answers.filter(answer__isnull=True).exclude(question_id=answered).count(), 2)
+        self.assertEqual((response.context['score'], response.context['percentage']), (1, 33))
+
+    def test_answering_does_not_write_to_database(self):
+        url = reverse('quiz', args=[self.category.id])
+        question = self.client.get(url).context['question']
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(url, {'answer': question.answers[0].id})
+        writes = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    @override_settings(QUIZ_STATE_BACKEND='cookie')
+    def test_cookie_state_backend(self):
+        self.test_full_quiz_flow()
+
+    @override_settings(QUIZ_STATE_BACKEND='cookie')
+    def test_cookie_does_not_reveal_the_score(self):
+        url = reverse('quiz', args=[self.category.id])
+        question = self.client.get(url).context['question']
+        correct = next(a for a in question.answers if a.is_correct)
+        self.client.post(url, {'answer': correct.id})
+        value = signing.TimestampSigner(salt=quiz_state.SIGNING_SALT).unsign(self.client.cookies[quiz_state.COOKIE_NAME].value)
+        state = quiz_state.QuizState.from_bytes(base64.urlsafe_b64decode(value))
+        self.assertEqual(state.cursor, 1)
+        self.assertFalse(hasattr(state, 'score'))
+        self.assertEqual(quiz_state.load_answers(state), [(question.id, correct.id)])
+
+    @override_settings(QUIZ_STATE_BACKEND='cookie')
+    def test_cookie_does_not_grow_with_the_answers(self):
+        for i in range(3, 40):
+            make_question(self.category, f'Question {i}')
+        self.answer_next()
+        size = len(self.client.cookies[quiz_state.COOKIE_NAME].value)
+        for _ in range(30):
+            self.answer_next()
+        self.assertEqual(len(self.client.cookies[quiz_state.COOKIE_NAME].value), size)
+        self.client.get(reverse('results', args=[self.category.id]))
+        self.assertEqual(Attempt.objects.get(user=self.user).score, 31)
+
+    def test_replaying_an_older_cookie_does_not_rewind(self):
+        url = reverse('quiz', args=[self.category.id])
+        question = self.client.get(url).context['question']
+        earlier = self.client.cookies[quiz_state.COOKIE_NAME].value
+        self.client.post(url, {'answer': question.answers[0].id})
+        self.client.cookies[quiz_state.COOKIE_NAME] = earlier
+        response = self.client.get(url)
+        self.assertEqual(response.context['question_number'], 2)
+        self.assertNotEqual(response.context['question'].id, question.id)
+
+    def test_unknown_category(self):
+        response = self.client.get(reverse('quiz', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ScoringTests(QuizTestCase):
+
+    def test_grades_from_memory(self):
+        question = self.questions[0]
+        correct = question.answers.get(is_correct=True)
+        wrong = question.answers.filter(is_correct=False).first()
+        key = scoring.get_answer_key(self.category.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(key.grade(question.id, correct.id).marks_awarded, 1)
+            self.assertFalse(key.grade(question.id, wrong.id).is_correct)
+            self.assertEqual(key.grade(question.id, None).marks_awarded, 0)
+
+    def test_rejects_answer_from_other_question(self):
+        key = scoring.get_answer_key(self.category.id)
+        foreign = self.questions[1].answers.get(is_correct=True)
+        with self.assertRaises(scoring.InvalidAnswer):
+            key.grade(self.questions[0].id, foreign.id)
+        with self.assertRaises(scoring.InvalidAnswer):
+            key.grade(999, foreign.id)
+
+    def test_quiz_view_rejects_foreign_answer(self):
+        url = reverse('quiz', args=[self.category.id])
+        question = self.client.get(url).context['question']
+        foreign = Answer.objects.exclude(question_id=question.id).first()
+        response = self.client.post(url, {'answer': foreign.id})
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchQuizTests(QuizTestCase):
+
+    def fetch_quiz(self):
+        response = self.client.get(reverse('quiz_questions_json', args=[self.category.id]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def submit(self, payload):
+        return self.client.post(
+            reverse('quiz_submit_json', args=[self.category.id]),
+            data=json.dumps(payload), content_type='application/json',
+        )
+
+    def test_serves_questions_without_correct_answers(self):
+        data = self.fetch_quiz()
+        self.assertEqual(len(data['questions']), 3)
+        self.assertNotIn('is_correct', data['questions'][0]['answers'][0])
+
+    def test_grades_whole_quiz(self):
+        data = self.fetch_quiz()
+        answers = {q['id']: Answer.objects.get(question_id=q['id'], is_correct=True).id for q in data['questions'][:2]}
+        response = self.submit({'token': data['token'], 'answers': answers})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['score'], 2)
+        self.assertEqual(result['total_questions'], 3)
+        attempt = Attempt.objects.get(pk=result['attempt_id'])
+        self.assertEqual(attempt.answers.count(), 3)
+        self.assertEqual(attempt.answers.filter(answer__isnull=True).count(), 1)
+
+    def test_a_token_is_submitted_only_once(self):
+        data = self.fetch_quiz()
+        wrong = {q['id']: Answer.objects.filter(question_id=q['id'], is_correct=False).first().id for q in data['questions']}
+        self.assertEqual(self.submit({'token': data['token'], 'answers': wrong}).status_code, 200)
+        right = {q['id']: Answer.objects.get(question_id=q['id'], is_correct=True).id for q in data['questions']}
+        response = self.submit({'token': data['token'], 'answers': right})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Attempt.objects.filter(user=self.user).get().score, 0)
+
+        # A new quiz gets a new token.
+        self.assertEqual(self.submit({'token': self.fetch_quiz()['token'], 'answers': right}).status_code, 200)
+        self.assertEqual(Attempt.objects.filter(user=self.user).count(), 2)
+
+    def test_rejects_tampered_token(self):
+        data = self.fetch_quiz()
+        response = self.submit({'token': data['token'] + 'x', 'answers': {}})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_foreign_answer(self):
+        data = self.fetch_quiz()
+        q = data['questions'][0]
+        foreign = Answer.objects.exclude(question_id=q['id']).first()
+        response = self.submit({'token': data['token'], 'answers': {q['id']: foreign.id}})
+        self.assertEqual(response.status_code, 400)
+
+
+class AttemptTests(QuizTestCase):
+
+    def test_answers_written_in_one_bulk_insert(self):
+        key = scoring.get_answer_key(self.category.id)
+        graded = [key.grade(q.id, None) for q in self.questions]
+        with CaptureQueriesContext(connection) as queries:
+            attempt = attempts.record_attempt(self.user, self.category.id, graded, total_marks=key.total_marks)
+        answer_inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "Quiz_App_attemptanswer"')]
+        self.assertEqual(len(answer_inserts), 1)
+        self.assertEqual(attempt.answers.count(), 3)
+
+
+class QuizStateTests(QuizTestCase):
+
+    def save_and_load(self, state):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        response = quiz_state.save(request, HttpResponse(), state)
+        request.COOKIES[quiz_state.COOKIE_NAME] = response.cookies[quiz_state.COOKIE_NAME].value
+        return quiz_state.load(request)
+
+    def test_round_trip(self):
+        bank = question_bank.get_bank(self.category.id)
+        state = quiz_state.QuizState.start(bank, self.user.pk)
+        first, second = state.questions(bank)[0], state.questions(bank)[1]
+        state.record(first.id, first.answers[0].id)
+        state.record(second.id, None)
+        restored = self.save_and_load(state)
+        self.assertTrue(restored.matches(bank))
+        self.assertEqual(quiz_state.load_answers(restored), [(first.id, first.answers[0].id), (second.id, None)])
+        self.assertEqual((restored.cursor, restored.total), (2, 3))
+
+    def test_state_size_does_not_grow_with_the_answers(self):
+        for i in range(3, 100):
+            make_question(self.category, f'Question {i}')
+        bank = question_bank.get_bank(self.category.id)
+        state = quiz_state.QuizState.start(bank, self.user.pk)
+        state.record(state.questions(bank)[0].id, None)
+        size = len(state.to_bytes())
+        self.assertLess(size, 40)
+        for question in state.remaining(bank)[:90]:
+            state.record(question.id, question.answers[0].id)
+        restored = self.save_and_load(state)
+        self.assertEqual(len(restored.to_bytes()), size)
+        self.assertEqual(len(quiz_state.load_answers(restored)), 91)
+
+    def test_order_goes_stale_when_questions_change(self):
+        bank = question_bank.get_bank(self.category.id)
+        state = quiz_state.QuizState.start(bank, self.user.pk)
+        make_question(self.category, 'Question 3')
+        self.assertFalse(state.matches(question_bank.get_bank(self.category.id)))
+
+
+class ShuffleTests(TestCase):
+
+    def test_permutation_is_a_bijection(self):
+        for size in (0, 1, 2, 7, 100, 1025):
+            self.assertEqual(sorted(shuffle.SeededPermutation(size, 42)), list(range(size)))
+
+    def test_same_seed_same_order(self):
+        self.assertEqual(list(shuffle.SeededPermutation(50, 7)), list(shuffle.SeededPermutation(50, 7)))
+        self.assertNotEqual(list(shuffle.SeededPermutation(50, 7)), list(shuffle.SeededPermutation(50, 8)))
+
+
+class SamplingTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3, 12):
+            make_question(self.category, f'Question {i}', marks=2 if i % 3 == 0 else 1)
+
+    def draw(self, seed=5):
+        return list(question_bank.get_bank(self.category.id).draw(seed))
+
+    def test_draws_whole_category_by_default(self):
+        self.assertEqual(len({q.id for q in self.draw()}), 12)
+
+    def test_draw_count_samples_without_replacement(self):
+        self.category.draw_count = 5
+        self.category.save()
+        drawn = self.draw()
+        self.assertEqual(len({q.id for q in drawn}), 5)
+        self.assertEqual([q.id for q in drawn], [q.id for q in self.draw()])
+
+    def test_stratified_draw_keeps_marks_proportions(self):
+        # 3 of the 12 questions are worth 2 marks.
+        self.category.draw_count = 8
+        self.category.stratify_by_marks = True
+        self.category.save()
+        for seed in range(5):
+            drawn = self.draw(seed)
+            self.assertEqual(len({q.id for q in drawn}), 8)
+            self.assertEqual(sum(q.marks == 2 for q in drawn), 2)
+
+    def test_quiz_uses_draw_count(self):
+        self.category.draw_count = 4
+        self.category.save()
+        response = self.client.get(reverse('quiz', args=[self.category.id]))
+        self.assertEqual(response.context['total_questions'], 4)
+
+    def test_allocate(self):
+        self.assertEqual(shuffle.allocate([9, 3], 8), [6, 2])
+        self.assertEqual(shuffle.allocate([1, 1, 1], 2), [1, 1, 0])
+        self.assertEqual(shuffle.allocate([2, 5], 50), [2, 5])
+
+
+class ImportTests(QuizTestCase):
+
+    JSONL = (
+        '{"category": "Audio", "question": "Question 0", "answers": [{"text": "a", "correct": true}, {"text": "b"}]}\n'
+        '{"category": "Audio", "question": "  new   question ", "marks": 2, '
+        '"answers": [{"text": "a", "correct": true}, {"text": "b"}]}\n'
+        '{"category": "Audio", "question": "NEW QUESTION", "answers": [{"text": "a", "correct": true}, {"text": "b"}]}\n'
+        '{"category": "Mixing", "question": "Two right", "answers": [{"text": "a", "correct": true}, '
+        '{"text": "b", "correct": true}]}\n'
+        '{"category": "Mixing", "question": "What is a fader?", "answers": [{"text": "a", "correct": true}, '
+        '{"text": "b"}]}\n'
+    )
+
+    CSV = (
+        'category,question,marks,answer,is_correct\n'
+        'Mixing,What is panning?,1,Stereo placement,true\n'
+        'Mixing,What is panning?,1,Volume,false\n'
+        'Mixing,What is a bus?,2,A shared signal path,yes\n'
+        'Mixing,What is a bus?,2,A vehicle,\n'
+    )
+
+    def test_jsonl_import_validates_and_deduplicates(self):
+        question_bank.get_bank(self.category.id)
+        result = importer.import_questions(importer.parse(io.StringIO(self.JSONL), 'jsonl'))
+        self.assertEqual((result.created, result.duplicates, result.invalid), (2, 2, 1))
+        self.assertIn('exactly one correct answer', result.errors[0])
+        self.assertTrue(Question.objects.filter(question_text='new   question', marks=2).exists())
+        # The cached bank was invalidated even though bulk_create sends no signals.
+        self.assertEqual(len(question_bank.get_bank(self.category.id)), 4)
+
+    def test_mistyped_records_are_reported_not_fatal(self):
+        answers = '[{"text": "a", "correct": true}, {"text": "b"}]'
+        jsonl = (
+            f'{{"category": 5, "question": "Numeric category", "answers": {answers}}}\n'
+            f'{{"category": "Audio", "question": ["a", "list"], "answers": {answers}}}\n'
+            '{"category": "Audio", "question": "Numeric answer", "answers": [{"text": 1, "correct": true}, {"text": "b"}]}\n'
+            '{"category": "Audio", "question": "String flag", "answers": [{"text": "a", "correct": "false"}, '
+            '{"text": "b", "correct": true}]}\n'
+            f'{{"category": "Audio", "question": "Fractional marks", "marks": 2.7, "answers": {answers}}}\n'
+            '{"category": "Audio", "question": "Answers not objects", "answers": ["a", "b"]}\n'
+            f'{{"category": "Audio", "question": "Whole marks", "marks": 2.0, "answers": {answers}}}\n'
+        )
+        result = importer.import_questions(importer.parse(io.StringIO(jsonl), 'jsonl'))
+        self.assertEqual((result.created, result.invalid), (1, 6))
+        self.assertEqual([e.split(':')[0] for e in result.errors], [f'line {n}' for n in range(1, 7)])
+        self.assertIn('correct must be true or false', result.errors[3])
+        self.assertIn('marks must be a whole number', result.errors[4])
+        self.assertEqual(Question.objects.get(question_text='Whole marks').marks, 2)
+
+    def test_malformed_input_still_indexes_written_chunks(self):
+        question_bank.get_bank(self.category.id)
+        jsonl = (
+            '{"category": "Audio", "question": "What is a limiter?", "answers": [{"text": "a", "correct": true}, {"text": "b"}]}\n'
+            'not json\n'
+        )
+        with self.assertRaises(importer.ImportFormatError):
+            importer.import_questions(importer.parse(io.StringIO(jsonl), 'jsonl'), chunk_size=1)
+        question = Question.objects.get(question_text='What is a limiter?')
+        self.assertIsNotNone(question_bank.get_bank(self.category.id).get(question.id))
+        self.assertEqual(search.search('limiter'), [question.id])
+
+    def test_csv_import(self):
+        result = importer.import_questions(importer.parse(io.StringIO(self.CSV), 'csv'))
+        self.assertEqual(result.created, 2)
+        bus = Question.objects.get(question_text='What is a bus?')
+        self.assertEqual(bus.marks, 2)
+        self.assertEqual(bus.answers.get(is_correct=True).answer_text, 'A shared signal path')
+
+    def test_dry_run_writes_nothing(self):
+        result = importer.import_questions(importer.parse(io.StringIO(self.CSV), 'csv'), dry_run=True)
+        self.assertEqual(result.created, 2)
+        self.assertFalse(Category.objects.filter(name='Mixing').exists())
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.CSV)
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        call_command('import_questions', f.name, chunk_size=1, stdout=out)
+        self.assertIn('2 created', out.getvalue())
+        self.assertEqual(Question.objects.filter(category__name='Mixing').count(), 2)
+
+
+class ExportTests(QuizTestCase):
+
+    def test_round_trip(self):
+        for fmt in ('csv', 'jsonl'):
+            lines = list(exporter.export(fmt))
+            records = list(importer.parse(io.StringIO(''.join(lines)), fmt))
+            self.assertEqual(len(records), 3)
+            self.assertTrue(all(importer.validate(r) is None for r in records))
+            # Re-importing into the same environment only finds duplicates.
+            result = importer.import_questions(records)
+            self.assertEqual((result.created, result.duplicates), (0, 3))
+
+    def test_export_uses_one_query(self):
+        with self.assertNumQueries(1):
+            lines = list(exporter.export_jsonl())
+        self.assertEqual(len(lines), 3)
+
+    def test_host_download(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('host_question_export') + '?format=csv')
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('category,question,marks,answer,is_correct'))
+        self.assertEqual(body.count('\n'), 10)
+
+    async def test_host_download_streams_asynchronously_under_asgi(self):
+        self.user.is_staff = True
+        await self.user.asave()
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('host_question_export') + '?format=csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertEqual(body, ''.join(await sync_to_async(list)(exporter.export('csv'))))
+
+        batches = [batch async for batch in exporter.aexport('jsonl', batch_lines=2)]
+        self.assertEqual([batch.count('\n') for batch in batches], [2, 1])
+
+    def test_export_command(self):
+        out = io.StringIO()
+        call_command('export_questions', format='jsonl', category=['Audio'], stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class HostQuestionListTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+
+    def test_keyset_pages_cover_every_question_once(self):
+        for i in range(3, 8):
+            make_question(self.category, f'Question {i}')
+        seen = []
+        cursor = None
+        while True:
+            page = pagination.keyset_page(Question.objects.all(), host_views.QUESTION_ORDERING, cursor, per_page=3)
+            seen.extend(q.id for q in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(sorted(seen), sorted(Question.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), 8)
+
+    def test_filters_and_answer_counts(self):
+        other = Category.objects.create(name='Video')
+        make_question(other, 'Frame rates', wrong=('a',))
+        response = self.client.get(reverse('host_question_list'), {'category': other.id})
+        questions = list(response.context['questions'])
+        self.assertEqual([q.question_text for q in questions], ['Frame rates'])
+        self.assertEqual(questions[0].answer_count, 2)
+
+        response = self.client.get(reverse('host_question_list'), {'q': 'question 1'})
+        self.assertEqual(response.context['questions'].items[0].question_text, 'Question 1')
+
+    def test_bad_cursor_gives_first_page(self):
+        response = self.client.get(reverse('host_question_list'), {'after': 'not-a-cursor'})
+        self.assertEqual(len(response.context['questions']), 3)
+
+
+class SearchTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.compressor = make_question(self.category, 'What does a compressor do?', correct='Reduces dynamic range')
+        self.gate = make_question(self.category, 'What does a noise gate do?', correct='Mutes quiet signals, like a compressor')
+
+    def test_index_is_available(self):
+        self.assertTrue(search.fts_available())
+
+    def test_ranked_matches_across_fields(self):
+        # Question text outranks answer text.
+        self.assertEqual(search.search('compress'), [self.compressor.id, self.gate.id])
+        self.assertEqual(search.search('dynamic'), [self.compressor.id])
+        self.assertEqual(len(search.search('audio')), 5)
+
+    def test_index_follows_edits(self):
+        self.gate.question_text = 'What does an expander do?'
+        self.gate.save()
+        self.assertEqual(search.search('expander'), [self.gate.id])
+        self.category.name = 'Sound'
+        self.category.save()
+        self.assertEqual(search.search('audio'), [])
+        self.compressor.delete()
+        self.assertEqual(search.search('dynamic'), [])
+
+    def test_user_input_is_not_fts_syntax(self):
+        self.assertEqual(search.search('compressor" ('), [self.compressor.id, self.gate.id])
+        self.assertEqual(search.search('*** ()'), [])
+
+    def test_fallback_search(self):
+        self.assertEqual(search._fallback_search('compress', None, 10), [self.compressor.id, self.gate.id])
+        self.assertEqual(search._fallback_search('dynamic', self.category.id, 10), [self.compressor.id])
+
+    def test_admin_search_is_ranked_and_uncapped(self):
+        self.user.is_superuser = self.user.is_staff = True
+        self.user.save()
+        url = reverse('admin:Quiz_App_question_changelist')
+        # Newest first would put the gate question first.
+        for fts in (True, False):
+            with mock.patch.object(search, 'fts_available', return_value=fts):
+                response = self.client.get(url, {'q': 'compress'})
+                self.assertEqual([q.id for q in response.context['cl'].result_list], [self.compressor.id, self.gate.id])
+        Question.objects.bulk_create(
+            Question(category=self.category, question_text=f'Question {i}') for i in range(3, 1200)
+        )
+        search.rebuild()
+        response = self.client.get(url, {'q': 'question'})
+        self.assertEqual(response.context['cl'].result_count, 1200)
+
+    def test_bulk_import_is_indexed(self):
+        record = importer.QuestionRecord('Audio', 'What is a limiter?', 1, (('a', True), ('b', False)), 'test')
+        importer.import_questions([record])
+        self.assertEqual(len(search.search('limiter')), 1)
+
+    def test_host_search(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('host_question_list'), {'q': 'compressor'})
+        self.assertEqual([q.id for q in response.context['questions']], [self.compressor.id, self.gate.id])
+
+
+class SimilarityTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.original = make_question(self.category, 'Which frequency range is typically considered bass in a mix?')
+
+    def test_signature_similarity(self):
+        a = similarity.signature('What does a compressor do in audio processing?')
+        b = similarity.signature('What does a compressor do in audio processing')
+        c = similarity.signature('Which microphone needs phantom power?')
+        self.assertEqual(similarity.similarity(a, b), 1.0)
+        self.assertLess(similarity.similarity(a, c), 0.3)
+
+    def test_find_similar_uses_index(self):
+        matches = similarity.find_similar('Which frequency range is typically considered bass in a mix', self.category.id)
+        self.assertEqual([qid for qid, _ in matches], [self.original.id])
+        other = Category.objects.create(name='Video')
+        self.assertEqual(similarity.find_similar(self.original.question_text, other.id), [])
+        self.assertEqual(similarity.find_similar(self.original.question_text, self.category.id, exclude_id=self.original.id), [])
+
+    def test_question_form_flags_near_duplicate(self):
+        data = {'category': self.category.id, 'question_text': 'which frequency range is typically considered bass in a mix', 'marks': 1}
+        form = forms.QuestionForm(data)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.similar_questions, [self.original])
+        form = forms.QuestionForm(dict(data, allow_duplicate='on'))
+        self.assertTrue(form.is_valid())
+        # Editing a question does not flag the question itself.
+        form = forms.QuestionForm(dict(data, question_text=self.original.question_text), instance=self.original)
+        self.assertTrue(form.is_valid())
+
+    def test_import_flags_and_skips_near_duplicates(self):
+        answers = (('a', True), ('b', False))
+        records = [
+            importer.QuestionRecord('Audio', 'Which frequency range is typically considered bass in a mix??', 1, answers, 'r1'),
+            importer.QuestionRecord('Audio', 'How does a limiter differ from a compressor on the master bus?', 1, answers, 'r2'),
+            importer.QuestionRecord('Audio', 'How does a limiter differ from a compressor on the master bus ?!', 1, answers, 'r3'),
+        ]
+        result = importer.import_questions(records, dry_run=True)
+        self.assertEqual(result.near_duplicates, [f'r1: similar to question #{self.original.id}', 'r3: similar to r2'])
+        self.assertEqual(result.duplicates + result.created, 3)
+        result = importer.import_questions(records, skip_near_duplicates=True)
+        self.assertEqual(result.created, 1)
+
+    def test_duplicate_report(self):
+        copy = make_question(self.category, 'Which frequency range is typically considered "bass" in a mix?')
+        self.assertEqual(similarity.duplicate_report(self.category.id), [sorted([self.original.id, copy.id])])
+
+
+class StatsTests(QuizTestCase):
+
+    def assertCountersMatchRecount(self):
+        before = {row.pk: [getattr(row, name) for name in stats.COUNTERS] for row in CategoryStats.objects.all()}
+        stats.recount()
+        after = {row.pk: [getattr(row, name) for name in stats.COUNTERS] for row in CategoryStats.objects.all()}
+        self.assertEqual(before, after)
+
+    def test_counters_follow_changes(self):
+        row = CategoryStats.objects.get(category=self.category)
+        self.assertEqual((row.question_count, row.answer_count, row.total_marks), (3, 9, 3))
+
+        other = Category.objects.create(name='Video')
+        moved = self.questions[0]
+        moved.category = other
+        moved.marks = 4
+        moved.save()
+        self.questions[1].answers.first().delete()
+        self.questions[2].delete()
+        key = scoring.get_answer_key(self.category.id)
+        attempts.record_attempt(self.user, self.category.id, [key.grade(self.questions[1].id, None)], total_marks=1)
+        self.assertCountersMatchRecount()
+
+        row = CategoryStats.objects.get(category=self.category)
+        self.assertEqual((row.question_count, row.answer_count, row.attempt_count, row.average_percent), (1, 2, 1, 0))
+
+    def test_deletes_cost_the_same_for_any_number_of_answers(self):
+        small = make_question(self.category, 'Few answers', wrong=('a', 'b'))
+        large = make_question(self.category, 'Many answers', wrong=tuple('abcdefghijk'))
+        with CaptureQueriesContext(connection) as few:
+            small.delete()
+        with CaptureQueriesContext(connection) as many:
+            large.delete()
+        self.assertEqual(len(many), len(few))
+        self.assertCountersMatchRecount()
+
+        # A queryset delete of answers is refreshed once by its caller.
+        question = self.questions[0]
+        wrong = list(question.answers.filter(is_correct=False))
+        question.answers.create(answer_text='Extra', is_correct=False)
+        with CaptureQueriesContext(connection) as ctx:
+            bulk_edit.apply([{'id': question.id, 'answers': [{'id': a.id, 'delete': True} for a in wrong]}])
+        self.assertEqual(sum('quiz_search' in q['sql'] for q in ctx.captured_queries), 2)
+        self.assertCountersMatchRecount()
+        self.assertEqual(search.search('extra'), [question.id])
+
+    def test_category_delete_is_handled_by_the_category(self):
+        other = Category.objects.create(name='Video')
+        for i in range(5):
+            make_question(other, f'Frame rate {i}', wrong=tuple('abcdef'))
+        with CaptureQueriesContext(connection) as ctx:
+            other.delete()
+        # No per-answer or per-question counter updates or reindexing.
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "Quiz_App_categorystats"')]
+        self.assertEqual(updates, [])
+        self.assertEqual(sum('quiz_search' in q['sql'] for q in ctx.captured_queries), 1)
+        self.assertEqual(search.search('frame'), [])
+        self.assertCountersMatchRecount()
+
+    def test_bulk_import_recounts(self):
+        records = [importer.QuestionRecord('Audio', 'Imported?', 2, (('Yes', True), ('No', False)), 'line 1')]
+        importer.import_questions(records)
+        row = CategoryStats.objects.get(category=self.category)
+        self.assertEqual((row.question_count, row.answer_count, row.total_marks), (4, 11, 5))
+
+    def test_dashboard_is_one_cache_read(self):
+        staff = User.objects.create_user('host', password='pw-12345!', is_staff=True)
+        self.client.force_login(staff)
+        self.client.get(reverse('host_dashboard'))
+        # Session and user lookups only; the statistics come from the cache.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('host_dashboard'))
+        self.assertEqual(response.context['questions_count'], 3)
+        self.assertEqual(response.context['category_stats'][0]['name'], 'Audio')
+
+        make_question(self.category, 'Question 3')
+        response = self.client.get(reverse('host_dashboard'))
+        self.assertEqual(response.context['questions_count'], 4)
+
+    def test_recount_command(self):
+        CategoryStats.objects.update(question_count=0)
+        call_command('recount_stats', stdout=io.StringIO())
+        self.assertEqual(CategoryStats.objects.get(category=self.category).question_count, 3)
+
+
+class ItemStatsTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        key = scoring.get_answer_key(self.category.id)
+        self.easy, self.hard, self.medium = self.questions
+        self.wrong = self.hard.answers.filter(is_correct=False).first()
+        # Everyone gets the easy question right; strong candidates also get
+        # the other two right, weak ones pick the same wrong answers.
+        for strong in (True, True, False, False, False):
+            graded = [key.grade(self.easy.id, self.easy.answers.get(is_correct=True).id)]
+            for question in (self.hard, self.medium):
+                answer = question.answers.get(is_correct=True) if strong else question.answers.filter(is_correct=False).first()
+                graded.append(key.grade(question.id, answer.id))
+            attempts.record_attempt(self.user, self.category.id, graded, total_marks=3)
+
+    def test_point_biserial(self):
+        # Scores 1,1,0,0 against rest scores 1,1,0,0: perfect correlation.
+        self.assertAlmostEqual(item_stats.point_biserial(4, 2, 2.0, 2.0, 2.0), 1.0)
+        self.assertIsNone(item_stats.point_biserial(4, 4, 2.0, 2.0, 2.0))
+
+    def test_compute(self):
+        self.assertEqual(item_stats.compute(), (3, 5))
+        hard = QuestionStats.objects.get(question=self.hard)
+        self.assertEqual((hard.responses, hard.correct), (5, 2))
+        self.assertAlmostEqual(hard.p_value, 0.4)
+        self.assertAlmostEqual(hard.discrimination, 1.0)
+        self.assertAlmostEqual(hard.top_distractor_rate, 0.6)
+        self.assertAlmostEqual(AnswerStats.objects.get(answer=self.wrong).selection_rate, 0.6)
+
+        easy = QuestionStats.objects.get(question=self.easy)
+        self.assertEqual(easy.p_value, 1.0)
+        self.assertIsNone(easy.discrimination)
+
+        # Recomputing replaces rather than duplicates.
+        self.assertEqual(item_stats.compute([self.category.id]), (3, 5))
+        self.assertEqual(QuestionStats.objects.count(), 3)
+
+    def test_flags_and_question_list(self):
+        call_command('compute_item_stats', stdout=io.StringIO())
+        stats = QuestionStats.objects.get(question=self.hard)
+        self.assertEqual(item_stats.flags(stats), [])
+        stats.responses = item_stats.MIN_RESPONSES
+        self.assertEqual(item_stats.flags(stats), ['ambiguous'])
+
+        staff = User.objects.create_user('host', password='pw-12345!', is_staff=True)
+        self.client.force_login(staff)
+        make_question(self.category, 'Never answered')
+        response = self.client.get(reverse('host_question_list'))
+        by_text = {q.question_text: q for q in response.context['questions']}
+        self.assertAlmostEqual(by_text[self.hard.question_text].stats.p_value, 0.4)
+        self.assertIsNone(by_text['Never answered'].stats)
+
+
+class LeaderboardTests(QuizTestCase):
+
+    def finish(self, user, correct, category=None):
+        """Record an attempt in which the first ``correct`` questions were answered correctly."""
+        category = category or self.category
+        key = scoring.get_answer_key(category.id)
+        graded = []
+        for i, question in enumerate(category.questions.order_by('id')):
+            answer = question.answers.get(is_correct=True) if i < correct else None
+            graded.append(key.grade(question.id, answer.id if answer else None))
+        with self.captureOnCommitCallbacks(execute=True):
+            return attempts.record_attempt(user, category.id, graded, total_marks=key.total_marks)
+
+    def test_board_follows_attempts(self):
+        rival = User.objects.create_user('rival')
+        self.finish(self.user, 1)
+        board = leaderboard.get_board(self.category.id)
+        self.assertEqual(board.rank(self.user.pk), 1)
+
+        self.finish(rival, 2)
+        self.finish(self.user, 0)  # A worse attempt changes nothing.
+        # The cached board was patched, not rebuilt.
+        with self.assertNumQueries(0):
+            board = leaderboard.get_board(self.category.id)
+        self.assertEqual([row[2] for row in board.ranked_top()], ['rival', 'candidate'])
+        self.assertEqual(board.rank(self.user.pk), 2)
+
+        self.finish(self.user, 3)
+        board = leaderboard.get_board(self.category.id)
+        self.assertEqual((board.rank(self.user.pk), board.rank(rival.pk)), (1, 2))
+        self.assertEqual(leaderboard.get_board().points[self.user.pk], 10000)
+
+    def test_global_board_sums_category_bests(self):
+        other = Category.objects.create(name='Video')
+        make_question(other, 'Video question')
+        self.finish(self.user, 3)
+        self.finish(self.user, 1, category=other)
+        entry = LeaderboardEntry.objects.get(category=None, user=self.user)
+        self.assertEqual(entry.points, 20000)
+
+        before = sorted(LeaderboardEntry.objects.values_list('category_id', 'user_id', 'points'), key=str)
+        call_command('rebuild_leaderboards', stdout=io.StringIO())
+        after = sorted(LeaderboardEntry.objects.values_list('category_id', 'user_id', 'points'), key=str)
+        self.assertEqual(before, after)
+
+    def test_ties_share_a_rank(self):
+        board = leaderboard.Board(None, [(1, 'a', 900), (2, 'b', 800), (3, 'c', 800), (4, 'd', 700)])
+        self.assertEqual([rank for rank, *_ in board.ranked_top()], [1, 2, 2, 4])
+        board.update(4, 'd', 800)
+        self.assertEqual([row[0] for row in board.top], [1, 2, 3, 4])
+        self.assertEqual(board.rank(4), 2)
+
+    def test_view_is_served_from_cache(self):
+        self.finish(self.user, 2)
+        url = reverse('category_leaderboard', args=[self.category.id])
+        self.client.get(url)
+        # Session and user lookups only.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.context['my_rank'], 1)
+        self.assertContains(response, 'candidate')
+        self.assertEqual(self.client.get(reverse('category_leaderboard', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('leaderboard')).status_code, 200)
+
+
+class HomeTests(QuizTestCase):
+
+    def test_listing_is_one_query_then_cached(self):
+        make_question(self.category, 'Worth two', marks=2)
+        # Session, user and the single category query.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, '4 Questions &middot; 5 Marks')
+        # Warm: only the session and user lookups remain.
+        with self.assertNumQueries(2):
+            self.client.get(reverse('home'))
+
+    def test_fragment_follows_changes(self):
+        self.client.get(reverse('home'))
+        make_question(self.category, 'Question 3')
+        self.assertContains(self.client.get(reverse('home')), '4 Questions')
+
+        key = scoring.get_answer_key(self.category.id)
+        graded = [key.grade(q.id, q.answers.get(is_correct=True).id) for q in self.questions]
+        attempts.record_attempt(self.user, self.category.id, graded, total_marks=3)
+        self.assertContains(self.client.get(reverse('home')), 'Your last score: 3 / 3')
+
+        # Other users keep their own listing.
+        User.objects.create_user('other', password='pw-12345!')
+        self.client.login(username='other', password='pw-12345!')
+        self.assertNotContains(self.client.get(reverse('home')), 'Your last score')
+
+
+class QueryBudgetTests(QuizTestCase):
+    """
+    Query counts for every view, with enough rows that a per-row query
+    would show. Session and user lookups are included in each budget.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3, 8):
+            self.questions.append(make_question(self.category, f'Question {i}', wrong=('W1', 'W2', 'W3')))
+        key = scoring.get_answer_key(self.category.id)
+        for _ in range(3):
+            graded = [key.grade(q.id, q.answers.get(is_correct=True).id) for q in self.questions]
+            attempts.record_attempt(self.user, self.category.id, graded, total_marks=len(graded))
+        self.host = User.objects.create_user('host', password='pw-12345!', is_staff=True)
+
+    def assertBudget(self, budget, method, url, data=None, status=None):
+        with self.assertNumQueries(budget):
+            response = getattr(self.client, method)(url, data or {})
+        if status is not None:
+            self.assertEqual(response.status_code, status)
+        return response
+
+    def answer_form_data(self, question, prefix='answers'):
+        data = {
+            f'{prefix}-TOTAL_FORMS': '3', f'{prefix}-INITIAL_FORMS': '0',
+            f'{prefix}-MIN_NUM_FORMS': '0', f'{prefix}-MAX_NUM_FORMS': '1000',
+        }
+        for i, (text, correct) in enumerate([('A', True), ('B', False), ('C', False)]):
+            data[f'{prefix}-{i}-answer_text'] = text
+            if correct:
+                data[f'{prefix}-{i}-is_correct'] = 'on'
+        return data
+
+    def test_candidate_views(self):
+        c = self.category.id
+        self.assertBudget(3, 'get', reverse('home'))
+        self.assertBudget(2, 'get', reverse('home'))
+
+        # The question bank is warm: the step-by-step quiz only authenticates.
+        response = self.assertBudget(2, 'get', reverse('quiz', args=[c]))
+        question = response.context['question']
+        self.assertBudget(2, 'post', reverse('quiz', args=[c]), {'answer': question.answers[0].id}, status=302)
+        # Category, then the attempt and its derived data in one transaction.
+        self.assertBudget(9, 'get', reverse('results', args=[c]))
+
+        self.assertBudget(2, 'get', reverse('quiz_single', args=[c]))
+        token = self.assertBudget(2, 'get', reverse('quiz_questions_json', args=[c])).json()['token']
+        with self.assertNumQueries(8):
+            self.client.post(
+                reverse('quiz_submit_json', args=[c]), json.dumps({'token': token, 'answers': {}}),
+                content_type='application/json',
+            )
+
+        self.assertBudget(3, 'get', reverse('category_leaderboard', args=[c]))
+        self.assertBudget(2, 'get', reverse('category_leaderboard', args=[c]))
+        self.assertBudget(3, 'get', reverse('leaderboard'))
+
+    def test_auth_views(self):
+        self.assertBudget(4, 'get', reverse('logout'), status=302)
+        self.assertBudget(0, 'get', reverse('login'))
+        self.assertBudget(9, 'post', reverse('login'), {'username': 'candidate', 'password': 'pw-12345!'}, status=302)
+        self.client.logout()
+        self.assertBudget(0, 'get', reverse('register'))
+        data = {'username': 'newbie', 'email': 'n@example.com', 'password1': 'Zx9!long-pass', 'password2': 'Zx9!long-pass'}
+        self.assertBudget(11, 'post', reverse('register'), data, status=302)
+
+    def test_host_views(self):
+        self.client.force_login(self.host)
+        self.assertBudget(3, 'get', reverse('host_dashboard'))
+        self.assertBudget(2, 'get', reverse('host_dashboard'))
+
+        self.assertBudget(3, 'get', reverse('host_category_list'))
+        self.assertBudget(2, 'get', reverse('host_category_create'))
+        self.assertBudget(8, 'post', reverse('host_category_create'), {'name': 'Video'}, status=302)
+        video = Category.objects.get(name='Video')
+        self.assertBudget(3, 'get', reverse('host_category_edit', args=[video.id]))
+        self.assertBudget(6, 'post', reverse('host_category_edit', args=[video.id]), {'name': 'Film'}, status=302)
+        self.assertBudget(3, 'get', reverse('host_category_delete', args=[video.id]))
+        self.assertBudget(10, 'post', reverse('host_category_delete', args=[video.id]), status=302)
+
+        self.assertBudget(4, 'get', reverse('host_question_list'))
+        self.assertBudget(5, 'get', reverse('host_question_list'), {'q': 'Question'})
+        response = self.client.get(reverse('host_question_export'))
+        with self.assertNumQueries(1):
+            b''.join(response.streaming_content)
+
+        question = self.questions[0]
+        self.assertBudget(3, 'get', reverse('host_question_create'))
+        self.assertBudget(5, 'get', reverse('host_question_edit', args=[question.id]))
+        self.assertBudget(3, 'get', reverse('host_question_delete', args=[question.id]))
+        # The whole category: its questions, all their answers and the category picker.
+        self.assertBudget(6, 'get', reverse('host_question_bulk_edit', args=[self.category.id]))
+
+    def test_host_writes(self):
+        # Writes also keep the bank, search index, near-duplicate index and
+        # statistics in step. Answers are saved in bulk, so a new question
+        # costs the same however many answers it has.
+        self.client.force_login(self.host)
+        data = {'category': self.category.id, 'question_text': 'Brand new thing entirely', 'marks': 1}
+        data.update(self.answer_form_data(None))
+        self.assertBudget(41, 'post', reverse('host_question_create'), data, status=302)
+        self.assertBudget(15, 'post', reverse('host_question_delete', args=[self.questions[0].id]), status=302)
+
+    def test_admin_views(self):
+        self.host.is_superuser = True
+        self.host.save()
+        self.client.force_login(self.host)
+        self.assertBudget(6, 'get', reverse('admin:Quiz_App_question_changelist'))
+        # The inline answers are loaded with their question in one query.
+        self.assertBudget(6, 'get', reverse('admin:Quiz_App_question_change', args=[self.questions[0].id]))
+        self.assertBudget(6, 'get', reverse('admin:Quiz_App_answer_changelist'))
+        self.assertBudget(8, 'get', reverse('admin:Quiz_App_attempt_changelist'))
+        self.assertBudget(5, 'get', reverse('admin:Quiz_App_category_changelist'))
+
+    def test_answer_str_needs_no_query(self):
+        answers = list(Answer.objects.all())
+        with self.assertNumQueries(0):
+            labels = [str(a) for a in answers]
+        self.assertIn(f'(for question #{self.questions[0].id})', labels[0])
+        formset_answers = [f.instance for f in forms.AnswerFormSet(instance=self.questions[0]).forms]
+        with self.assertNumQueries(0):
+            self.assertIn('Question 0', str(formset_answers[0]))
+
+
+@override_settings(QUIZ_PROFILING=True, QUIZ_PROFILING_HEADERS=True)
+class ProfilingTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.host = User.objects.create_user('host', password='pw-12345!', is_staff=True, is_superuser=True)
+
+    def test_headers_and_aggregates(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response['X-Quiz-Queries'], '3')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.client.get(reverse('home'))
+        self.assertEqual(self.client.get(reverse('home'))['X-Quiz-Queries'], '2')
+
+        summary = metrics.snapshot()['home']
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['max_queries'], 3)
+        self.assertGreater(summary['avg_template_ms'], 0)
+        self.assertGreater(summary['cache_hit_ratio'], 0)
+
+    def test_duplicate_queries_are_detected(self):
+        self.client.force_login(self.host)
+        # The admin changelist counts the same rows twice.
+        response = self.client.get(reverse('admin:Quiz_App_question_changelist'))
+        self.assertEqual(response['X-Quiz-Duplicate-Queries'], '1')
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('home'))
+        self.client.force_login(self.host)
+        data = self.client.get(reverse('host_metrics')).json()
+        self.assertTrue(data['profiling'])
+        self.assertEqual(data['routes']['home']['requests'], 1)
+        self.client.post(reverse('host_metrics'))
+        self.assertNotIn('home', self.client.get(reverse('host_metrics')).json()['routes'])
+
+    @override_settings(QUIZ_PROFILING=False)
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('X-Quiz-Queries', response)
+        self.assertEqual(metrics.snapshot(), {})
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        question_bank._local_banks.clear()
+
+    def test_synthetic_banks_are_reproducible(self):
+        first = list(benchmark.synthetic_records('Benchmark 30', 30, seed=1))
+        self.assertEqual(first, list(benchmark.synthetic_records('Benchmark 30', 30, seed=1)))
+        self.assertNotEqual(first, list(benchmark.synthetic_records('Benchmark 30', 30, seed=2)))
+        self.assertEqual(len({record.question_text for record in first}), 30)
+
+        self.assertEqual(benchmark.seed_banks([5, 30]), {'Benchmark 5': 5, 'Benchmark 30': 30})
+        self.assertEqual(benchmark.seed_banks([5, 30]), {'Benchmark 5': 0, 'Benchmark 30': 0})
+        self.assertIsNone(Category.objects.get(name='Benchmark 5').draw_count)
+        self.assertEqual(Category.objects.get(name='Benchmark 30').draw_count, benchmark.DRAW_COUNT)
+        self.assertEqual([name for _, name in benchmark.benchmark_categories()], ['Benchmark 5', 'Benchmark 30'])
+
+    def test_candidate_flow(self):
+        benchmark.seed_banks([3])
+        recorder = benchmark.Recorder()
+        session = benchmark.ClientSession()
+        benchmark.candidate(session, recorder, 'bench-1', benchmark.benchmark_categories(), random.Random(0))
+
+        report = benchmark.summarise(recorder.samples, 1.0, users=1)
+        steps = report['steps']
+        self.assertEqual(steps['answer']['requests'], 3)
+        self.assertEqual(steps['results']['requests'], 1)
+        self.assertTrue(all(row['errors'] == 0 for row in steps.values()))
+        self.assertEqual(steps['answer']['avg_queries'], 2)
+        self.assertEqual(Attempt.objects.get(user__username='bench-1').answers.count(), 3)
+
+    def test_compare_reports_regressions(self):
+        samples = [('quiz', 0.010, 2, True)] * 50 + [('answer', 0.020, 2, True)] * 50
+        baseline = benchmark.summarise(samples, 1.0)
+        self.assertEqual(benchmark.compare(baseline, baseline), [])
+
+        slower = benchmark.summarise([('quiz', 0.020, 2, True)] * 50 + [('answer', 0.020, 4, True)] * 50, 2.0)
+        regressions = benchmark.compare(slower, baseline)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(regressions[0].startswith('quiz: p95'))
+        self.assertTrue(regressions[1].startswith('answer: 4.0 queries'))
+        self.assertTrue(regressions[2].startswith('throughput'))
+
+        # Too few samples to compare latency; queries are still checked.
+        few = benchmark.summarise([('quiz', 0.050, 2, True)] * 5, 1.0)
+        self.assertEqual(benchmark.compare(few, benchmark.summarise([('quiz', 0.010, 2, True)] * 5, 1.0)), [])
+
+    def test_command_checks_queries_by_default_and_latency_locally(self):
+        with open(benchmark.QUERY_BASELINE_PATH, encoding='utf-8') as f:
+            baseline = json.load(f)
+        self.assertIn('answer', baseline['steps'])
+        # Nothing machine-dependent is checked in.
+        self.assertNotIn('requests_per_second', baseline)
+        self.assertNotIn('p95_ms', baseline['steps']['answer'])
+
+        def report(seconds, extra_queries=0):
+            samples = [
+                (step, seconds, row['avg_queries'] + extra_queries, True)
+                for step, row in baseline['steps'].items() for _ in range(row['requests'])
+            ]
+            return benchmark.summarise(samples, 10.0, users=baseline['users'], categories=enumerate(baseline['categories']))
+
+        def command(result, **options):
+            out = io.StringIO()
+            with mock.patch.object(benchmark, 'run', return_value=result):
+                call_command('benchmark', stdout=out, stderr=io.StringIO(), **options)
+            return out.getvalue()
+
+        # However slow this machine is, only queries are compared by default.
+        self.assertIn('No regressions against the baseline', command(report(5.0)))
+        with self.assertRaises(CommandError):
+            command(report(0.01, extra_queries=1))
+        self.assertNotIn('baseline', command(report(0.01, extra_queries=1), no_baseline=True))
+
+        # Latency is compared against a report saved on this machine.
+        with tempfile.TemporaryDirectory() as tmp:
+            local = os.path.join(tmp, 'baseline.json')
+            command(report(0.01), save_baseline=True, baseline=local)
+            self.assertIn('No regressions', command(report(0.01), baseline=local))
+            with self.assertRaises(CommandError):
+                command(report(0.05), baseline=local)
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark', save_baseline=True, no_baseline=True, stdout=io.StringIO())
+
+
+class AsyncViewTests(QuizTestCase):
+    """The candidate views are async; drive them with the async test client."""
+
+    async def test_quiz_flow(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('quiz', args=[self.category.id])
+        for _ in self.questions:
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            answer_id = response.context['question'].answers[0].id
+            response = await self.async_client.post(url, {'answer': answer_id})
+            self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get(url)
+        self.assertRedirects(response, reverse('results', args=[self.category.id]), fetch_redirect_response=False)
+
+        response = await self.async_client.get(reverse('results', args=[self.category.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_questions'], 3)
+        attempt = await Attempt.objects.aget(user=self.user)
+        self.assertEqual(await attempt.answers.acount(), 3)
+
+    async def test_home_and_json_endpoints(self):
+        response = await self.async_client.get(reverse('home'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, 'Audio')
+
+        data = (await self.async_client.get(reverse('quiz_questions_json', args=[self.category.id]))).json()
+        answers = {str(q['id']): q['answers'][0]['id'] for q in data['questions']}
+        response = await self.async_client.post(
+            reverse('quiz_submit_json', args=[self.category.id]),
+            json.dumps({'token': data['token'], 'answers': answers}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['total_questions'], 3)
+        self.assertEqual(await Attempt.objects.filter(user=self.user).acount(), 1)
+
+    def test_asgi_application(self):
+        from Quiz_Base.asgi import application
+
+        async def get(path):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 1), 'server': ('testserver', 80),
+            }
+            communicator = ApplicationCommunicator(application, scope)
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output(5)
+            body = await communicator.receive_output(5)
+            await communicator.wait()
+            return start['status'], body['body']
+
+        status, body = async_to_sync(get)(reverse('login'))
+        self.assertEqual(status, 200)
+        self.assertIn(b'csrfmiddlewaretoken', body)
+
+
+class HostPermissionTests(SharedCacheMixin, QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.group = Group.objects.create(name=permissions.HOST_GROUP)
+        self.author = User.objects.create_user('author', password='pw-12345!')
+        self.author.groups.add(self.group)
+        self.client.force_login(self.author)
+
+    def group_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, sum('auth_user_groups' in q['sql'] for q in ctx.captured_queries)
+
+    def test_group_membership_is_cached(self):
+        response, queries = self.group_queries(reverse('host_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 1)
+        for name in ('host_dashboard', 'host_category_list', 'host_question_list'):
+            response, queries = self.group_queries(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(queries, 0)
+
+    def test_membership_changes_invalidate(self):
+        self.assertEqual(self.client.get(reverse('host_dashboard')).status_code, 200)
+        self.author.groups.remove(self.group)
+        self.assertEqual(self.client.get(reverse('host_dashboard')).status_code, 403)
+        self.group.user_set.add(self.author)
+        self.assertEqual(self.client.get(reverse('host_dashboard')).status_code, 200)
+        self.group.user_set.clear()
+        self.assertEqual(self.client.get(reverse('host_dashboard')).status_code, 403)
+
+    def test_role_is_not_cached_across_requests_in_a_local_cache(self):
+        # Another process could not invalidate it, so every request asks
+        # the database once.
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            for _ in range(2):
+                response, queries = self.group_queries(reverse('host_dashboard'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(queries, 1)
+            self.assertIsNone(cache.get(permissions._role_key(self.author.pk)))
+
+    def test_revocation_in_another_process_applies_at_once(self):
+        self.assertEqual(self.client.get(reverse('host_dashboard')).status_code, 200)
+        with self.other_process():
+            self.author.groups.remove(self.group)
+        self.assertEqual(self.client.get(reverse('host_dashboard')).status_code, 403)
+
+    def test_non_hosts_are_turned_away(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('host_question_list')).status_code, 403)
+        self.assertEqual(self.client.post(reverse('host_category_create'), {'name': 'X'}).status_code, 403)
+        self.assertFalse(Category.objects.filter(name='X').exists())
+        self.client.logout()
+        self.assertRedirects(self.client.get(reverse('host_dashboard')), reverse('login'), fetch_redirect_response=False)
+
+
+class BulkEditTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = User.objects.create_user('host', password='pw-12345!', is_staff=True)
+        self.client.force_login(self.host)
+        self.other = Category.objects.create(name='Video')
+
+    def post_changes(self, changes):
+        return self.client.post(reverse('host_question_bulk_api'), json.dumps({'questions': changes}),
+                                content_type='application/json')
+
+    def test_api_applies_everything_at_once(self):
+        q0, q1, q2 = self.questions
+        wrong = q0.answers.filter(is_correct=False).first()
+        right = q0.answers.get(is_correct=True)
+        changes = [
+            {'id': q0.id, 'question_text': 'Question zero, reworded', 'answers': [
+                {'id': right.id, 'is_correct': False}, {'id': wrong.id, 'is_correct': True},
+                {'answer_text': 'An extra choice'},
+            ]},
+            {'id': q1.id, 'category': self.other.id, 'marks': 3},
+            {'id': q2.id, 'delete': True},
+            {'category': self.other.id, 'question_text': 'A brand new question', 'marks': 2, 'answers': [
+                {'answer_text': 'Yes', 'is_correct': True}, {'answer_text': 'No'},
+            ]},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_changes(changes)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['updated'], [q0.id, q1.id])
+        self.assertEqual(data['deleted'], [q2.id])
+        self.assertEqual(len(data['created']), 1)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "Quiz_App_question"') for q in ctx.captured_queries), 1)
+        self.assertEqual(sum(q['sql'].startswith('INSERT INTO "Quiz_App_answer"') for q in ctx.captured_queries), 1)
+
+        q0.refresh_from_db()
+        self.assertEqual(q0.question_text, 'Question zero, reworded')
+        self.assertEqual(q0.answers.get(is_correct=True).id, wrong.id)
+        self.assertEqual(q0.answers.count(), 4)
+        self.assertEqual(Question.objects.get(pk=q1.id).category_id, self.other.id)
+        self.assertFalse(Question.objects.filter(pk=q2.id).exists())
+        self.assertEqual(CategoryStats.objects.get(category=self.category).question_count, 1)
+        self.assertEqual(CategoryStats.objects.get(category=self.other).question_count, 2)
+        self.assertEqual(CategoryStats.objects.get(category=self.other).total_marks, 5)
+        self.assertEqual(len(question_bank.get_bank(self.other.id)), 2)
+        self.assertEqual(search.search('reworded'), [q0.id])
+
+    def test_api_rejects_the_whole_change_set(self):
+        q0, q1, _ = self.questions
+        response = self.post_changes([
+            {'id': q0.id, 'question_text': 'Changed'},
+            {'id': q1.id, 'answers': [{'answer_text': 'Also right', 'is_correct': True}]},
+            {'id': 999999, 'delete': True},
+            {'question_text': 'No category', 'answers': []},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([error['index'] for error in errors], [1, 2, 3, 3])
+        self.assertIn('exactly one correct answer', errors[0]['message'])
+        q0.refresh_from_db()
+        self.assertEqual(q0.question_text, 'Question 0')
+
+        self.assertEqual(self.post_changes('not a list').status_code, 400)
+        self.assertEqual(self.client.post(reverse('host_question_bulk_api'), 'nope', content_type='application/json').status_code, 400)
+
+    def test_unchanged_rows_are_not_written(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_changes([{'id': q.id, 'question_text': q.question_text} for q in self.questions])
+        self.assertEqual(response.json(), {'created': [], 'updated': [], 'deleted': []})
+        self.assertFalse(any(q['sql'].startswith(('UPDATE', 'INSERT', 'DELETE')) for q in ctx.captured_queries))
+
+    def test_apply_refreshes_the_bank_or_writes_nothing(self):
+        q0, q1, _ = self.questions
+        question_bank.get_bank(self.category.id)
+        result = bulk_edit.apply([{'id': q0.id, 'question_text': 'Applied directly'}])
+        self.assertEqual(result.as_dict(), {'created': [], 'updated': [q0.id], 'deleted': []})
+        bank = question_bank.get_bank(self.category.id)
+        self.assertEqual(bank.get(q0.id).question_text, 'Applied directly')
+
+        with self.assertRaises(bulk_edit.BulkEditError) as raised:
+            bulk_edit.apply([{'id': q1.id, 'question_text': 'Not applied'}, {'id': 0, 'marks': 2}])
+        self.assertEqual(raised.exception.errors, [{'index': 1, 'field': 'id', 'message': 'question 0 does not exist'}])
+        q1.refresh_from_db()
+        self.assertEqual(q1.question_text, 'Question 1')
+
+    def test_spreadsheet_view(self):
+        url = reverse('host_question_bulk_edit', args=[self.category.id])
+        response = self.client.get(url)
+        self.assertContains(response, 'Question 2')
+        rows = response.context['rows']
+        self.assertEqual(len(rows), 3 + host_views.QuestionBulkEditView.NEW_ROWS)
+
+        # Submit the sheet as rendered, with one edit and one new question.
+        data = {'rows': len(rows)}
+        for i, row in enumerate(rows):
+            data.update({
+                f'q-{i}-id': row['id'] or '', f'q-{i}-category': row['category'],
+                f'q-{i}-question_text': row['question_text'], f'q-{i}-marks': row['marks'],
+                f'q-{i}-answers': len(row['answers']),
+            })
+            for j, answer in enumerate(row['answers']):
+                data[f'q-{i}-a-{j}-id'] = answer['id'] or ''
+                data[f'q-{i}-a-{j}-answer_text'] = answer['answer_text']
+                if answer['is_correct']:
+                    data[f'q-{i}-correct'] = str(j)
+        data['q-0-question_text'] = 'Edited in the sheet'
+        data.update({'q-3-question_text': 'Added in the sheet', 'q-3-a-0-answer_text': 'Yes',
+                     'q-3-a-1-answer_text': 'No', 'q-3-correct': '0'})
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Question.objects.filter(question_text='Edited in the sheet').exists())
+        self.assertEqual(self.category.questions.count(), 4)
+
+        # An invalid row saves nothing and points at the row.
+        data['q-1-question_text'] = 'Should not be saved'
+        data['q-1-correct'] = ''
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(response, 'Row 2', status_code=400)
+        self.assertFalse(Question.objects.filter(question_text='Should not be saved').exists())
+
+    def test_correct_answer_moves_to_an_earlier_answer(self):
+        # The earlier row is updated first, while the later one is still
+        # correct, unless the old correct answer is cleared beforehand.
+        question = self.questions[0]
+        answers = list(question.answers.order_by('id'))
+        Answer.objects.filter(pk=answers[0].pk).update(is_correct=False)
+        Answer.objects.filter(pk=answers[-1].pk).update(is_correct=True)
+        response = self.post_changes([{'id': question.id, 'answers': [
+            {'id': answers[0].id, 'is_correct': True}, {'id': answers[-1].id, 'is_correct': False},
+        ]}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(question.answers.get(is_correct=True).id, answers[0].id)
+
+    def test_question_create_validates_answers_first(self):
+        data = {'category': self.category.id, 'question_text': 'Something completely different', 'marks': 1,
+                'answers-TOTAL_FORMS': '1', 'answers-INITIAL_FORMS': '0',
+                'answers-MIN_NUM_FORMS': '0', 'answers-MAX_NUM_FORMS': '1000',
+                'answers-0-answer_text': 'x' * 300}
+        response = self.client.post(reverse('host_question_create'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Question.objects.filter(question_text='Something completely different').exists())
+
+
+@jobs.task('test_flaky')
+def flaky_task(ctx, failures):
+    """Fails the first ``failures`` attempts, reporting progress as it goes."""
+    ctx.progress(ctx.job.attempts, failures + 1, 'trying')
+    if ctx.job.attempts <= failures:
+        raise RuntimeError('not yet')
+    return {'attempts': ctx.job.attempts}
+
+
+class JobTests(SharedCacheMixin, QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.job_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.job_dir.cleanup)
+        overrides = override_settings(QUIZ_JOB_DIR=self.job_dir.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.host = User.objects.create_user('host', password='pw-12345!', is_staff=True)
+        self.client.force_login(self.host)
+        # Failing jobs log their traceback; keep it out of the test output.
+        logger = logging.getLogger('Quiz_App.jobs')
+        self.addCleanup(setattr, logger, 'disabled', logger.disabled)
+        logger.disabled = True
+
+    def run_retries(self, job):
+        """Run ``job`` until it stops being retried, skipping the back-off."""
+        while True:
+            Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(run_after=timezone.now())
+            if not jobs.run_pending():
+                break
+        job.refresh_from_db()
+        return job
+
+    def test_job_runs_once_and_records_result(self):
+        job = jobs.enqueue('recount_stats', user=self.host)
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, {'categories': 1})
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('no_such_task')
+
+    def test_failures_are_retried_with_back_off(self):
+        job = jobs.enqueue('test_flaky', {'failures': 1})
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('not yet', job.error)
+        self.assertGreater(job.run_after, timezone.now())
+        # Not due yet, so nothing runs.
+        self.assertEqual(jobs.run_pending(), 0)
+
+        job = self.run_retries(job)
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, {'attempts': 2})
+        self.assertEqual((job.progress_done, job.progress_total, job.percent), (2, 2, 100))
+
+    def test_job_fails_after_max_attempts(self):
+        job = self.run_retries(jobs.enqueue('test_flaky', {'failures': 5}, max_attempts=2))
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('RuntimeError', job.error)
+
+    def test_a_job_is_claimed_once(self):
+        job = jobs.enqueue('recount_stats')
+        self.assertEqual(jobs.claim('a').pk, job.pk)
+        self.assertIsNone(jobs.claim('b'))
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = jobs.enqueue('recount_stats')
+        jobs.claim('crashed')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - jobs.STALE_AFTER * 2)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+
+    def test_abandoned_runs_count_as_attempts(self):
+        job = jobs.enqueue('recount_stats', max_attempts=2)
+        for expected in (Job.QUEUED, Job.FAILED):
+            # A worker claims the job, counts the attempt and dies.
+            jobs.claim('crashed')
+            Job.objects.filter(pk=job.pk).update(
+                attempts=F('attempts') + 1, heartbeat_at=timezone.now() - jobs.STALE_AFTER * 2,
+            )
+            jobs.requeue_stale()
+            job.refresh_from_db()
+            self.assertEqual(job.status, expected)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('heartbeats', job.error)
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_heartbeat_only_stamps_its_own_run(self):
+        job = jobs.enqueue('recount_stats')
+        job = jobs.claim('alive')
+        old = timezone.now() - jobs.STALE_AFTER * 2
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=old)
+        self.assertTrue(jobs.Heartbeat(job).beat())
+        self.assertEqual(jobs.requeue_stale(), 0)
+
+        Job.objects.filter(pk=job.pk).update(status=Job.QUEUED, worker='', heartbeat_at=old)
+        self.assertFalse(jobs.Heartbeat(job).beat())
+        job.refresh_from_db()
+        self.assertEqual(job.heartbeat_at, old)
+
+    def test_heartbeats_continue_while_a_task_runs_silently(self):
+        beaten = threading.Event()
+
+        @jobs.task('test_silent')
+        def silent_task(ctx):
+            # Reports no progress; only the heartbeat thread shows it is alive.
+            return {'beat': beaten.wait(5)}
+
+        self.addCleanup(jobs.TASKS.pop, 'test_silent')
+        with mock.patch.object(jobs, 'HEARTBEAT_INTERVAL', 0.01), \
+                mock.patch.object(jobs.Heartbeat, 'beat', side_effect=lambda: beaten.set()):
+            job = jobs.enqueue('test_silent')
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'beat': True})
+        self.assertFalse(any(t.name.startswith('quiz-heartbeat-') for t in threading.enumerate()))
+
+    def test_worker_command_drains_the_queue(self):
+        for _ in range(3):
+            jobs.enqueue('recount_stats')
+        out = io.StringIO()
+        call_command('run_quiz_worker', '--burst', '--threads', '1', stdout=out)
+        self.assertIn('Processed 3 jobs', out.getvalue())
+        self.assertEqual(Job.objects.filter(status=Job.SUCCEEDED).count(), 3)
+
+    def test_worker_command_needs_a_shared_cache(self):
+        jobs.enqueue('recount_stats')
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(CommandError):
+                call_command('run_quiz_worker', '--burst', '--threads', '1', stdout=io.StringIO())
+            self.assertEqual(Job.objects.get().status, Job.QUEUED)
+            call_command('run_quiz_worker', '--burst', '--threads', '1', '--allow-local-cache', stdout=io.StringIO())
+        self.assertEqual(Job.objects.get().status, Job.SUCCEEDED)
+
+    def test_import_run_by_another_process_reaches_this_one(self):
+        self.assertEqual(len(question_bank.get_bank(self.category.id)), 3)
+        name = jobs.store_upload(SimpleUploadedFile('bank.jsonl', json.dumps({
+            'category': 'Audio', 'question': 'What is a gate?',
+            'answers': [{'text': 'A dynamics processor', 'correct': True}, {'text': 'A door', 'correct': False}],
+        }).encode() + b'\n'), '.jsonl')
+        jobs.enqueue('import_questions', {'file': name})
+        with self.other_process():
+            jobs.run_pending()
+        self.assertEqual(len(question_bank.get_bank(self.category.id)), 4)
+
+    def test_import_upload_is_queued_and_run(self):
+        upload = SimpleUploadedFile('bank.jsonl', json.dumps({
+            'category': 'Video', 'question': 'What is a codec?',
+            'answers': [{'text': 'A coder-decoder', 'correct': True}, {'text': 'A cable', 'correct': False}],
+        }).encode() + b'\n')
+        response = self.client.post(reverse('host_job_import'), {'file': upload, 'format': 'auto', 'create_categories': 'on'})
+        self.assertRedirects(response, reverse('host_job_list'))
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.params['format'], job.created_by), ('import_questions', 'jsonl', self.host))
+        # Nothing is imported until a worker runs the job.
+        self.assertFalse(Question.objects.filter(question_text='What is a codec?').exists())
+
+        jobs.run_pending()
+        self.assertTrue(Question.objects.filter(question_text='What is a codec?').exists())
+        status = self.client.get(reverse('host_job_status', args=[job.pk])).json()
+        self.assertEqual(status['status'], Job.SUCCEEDED)
+        self.assertEqual(status['result']['created'], 1)
+
+    def test_broken_import_fails_without_retrying(self):
+        job = jobs.enqueue('import_questions', {'file': jobs.store_upload(SimpleUploadedFile('x.jsonl', b'{not json\n'), '.jsonl')})
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 1))
+
+    def test_export_job_can_be_downloaded(self):
+        response = self.client.post(reverse('host_job_list'), {'kind': 'export_questions', 'format': 'csv',
+                                                              'category': self.category.pk})
+        self.assertRedirects(response, reverse('host_job_list'))
+        job = Job.objects.get()
+        status = self.client.get(reverse('host_job_status', args=[job.pk])).json()
+        self.assertEqual((status['status'], status['download']), (Job.QUEUED, None))
+
+        jobs.run_pending()
+        status = self.client.get(reverse('host_job_status', args=[job.pk])).json()
+        self.assertEqual(status['download'], reverse('host_job_download', args=[job.pk]))
+        response = self.client.get(status['download'])
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('Question 2', body)
+
+        # Purging old jobs removes their files too.
+        Job.objects.filter(pk=job.pk).update(finished_at=timezone.now() - jobs.RETENTION * 2)
+        self.assertEqual(jobs.purge(), 1)
+        self.assertFalse(os.listdir(self.job_dir.name))
+
+    def test_job_list_and_queueing_need_a_host(self):
+        response = self.client.get(reverse('host_job_list'))
+        self.assertContains(response, 'Background jobs')
+        self.assertEqual(self.client.post(reverse('host_job_list'), {'kind': 'test_flaky'}).status_code, 400)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('host_job_list')).status_code, 403)
+        self.assertEqual(self.client.post(reverse('host_job_list'), {'kind': 'recount_stats'}).status_code, 403)
+        self.assertFalse(Job.objects.exists())
+
+
+class SqliteProfileTests(QuizTestCase):
+
+    @classmethod
+    def flaky(cls, failures, message='database is locked'):
+        calls = []
+
+        def func():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return len(calls)
+        return func, calls
+
+    @mock.patch('Quiz_App.retry.time.sleep')
+    def test_busy_errors_are_retried(self, sleep):
+        func, calls = self.flaky(2)
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(retry.retry_on_busy(func)(), 3)
+            self.assertEqual(sleep.call_count, 2)
+
+            func, calls = self.flaky(9)
+            with self.assertRaises(OperationalError):
+                retry.retry_on_busy(func, attempts=3)()
+            self.assertEqual(len(calls), 3)
+
+            func, calls = self.flaky(1, 'no such table: x')
+            with self.assertRaises(OperationalError):
+                retry.retry_on_busy(func)()
+            self.assertEqual(len(calls), 1)
+
+    def test_no_retry_inside_an_outer_transaction(self):
+        func, calls = self.flaky(1)
+        with transaction.atomic(), self.assertRaises(OperationalError):
+            retry.retry_on_busy(func)()
+        self.assertEqual(len(calls), 1)
+
+    @skipUnless(settings.QUIZ_DB_PROFILE == 'production', 'needs the production database profile')
+    def test_production_profile_is_applied(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL with WAL, which only a QUIZ_DB_PATH database uses.
+            expected = 1 if settings.QUIZ_DB_PATH else 2  # NORMAL, FULL
+            self.assertEqual(cursor.fetchone()[0], expected)
+
+    def test_submission_load_stores_attempts(self):
+        result = sqlite_benchmark.submission_load(self.category.id, threads=1, seconds=0.2)
+        self.assertGreater(result['submissions'], 0)
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(Attempt.objects.filter(user__username__startswith='sqlite-bench-').count(), result['submissions'])
+        summary = sqlite_benchmark.summarise('default', [result], 0.2, 1, 1)
+        self.assertEqual(summary['submissions'], result['submissions'])
+        self.assertLessEqual(summary['p50_ms'], summary['p99_ms'])
+
+
+class RecordAttemptRetryTests(TransactionTestCase):
+    """Outside a test transaction, so record_attempt's own transaction is the outermost one."""
+
+    @mock.patch('Quiz_App.retry.time.sleep')
+    def test_locked_attempt_is_rolled_back_and_written_again(self, sleep):
+        category = Category.objects.create(name='Audio')
+        questions = [make_question(category, f'Question {i}') for i in range(2)]
+        user = User.objects.create_user('candidate')
+        key = scoring.get_answer_key(category.id)
+        graded = [key.grade(q.id, None) for q in questions]
+        real_bulk_create = AttemptAnswer.objects.bulk_create
+        calls = []
+
+        def locked_once(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return real_bulk_create(*args, **kwargs)
+
+        with mock.patch.object(AttemptAnswer.objects, 'bulk_create', side_effect=locked_once):
+            attempt = attempts.record_attempt(user, category.id, graded, total_marks=key.total_marks)
+        self.assertEqual(Attempt.objects.count(), 1)
+        self.assertEqual(attempt.answers.count(), 2)
+
+
+class QueryPlanTests(QuizTestCase):
+    """
+    EXPLAIN QUERY PLAN of the hot queries: each should be served by the index
+    built for it, reading rows in the order they are needed (no temporary
+    sort), rather than scanning the table.
+    """
+
+    def plans(self, func, *args, **kwargs):
+        """Run ``func`` and return [(sql, plan)] for each SELECT it ran."""
+        with CaptureQueriesContext(connection) as ctx:
+            func(*args, **kwargs)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                if query['sql'].startswith('SELECT'):
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plans.append((query['sql'], '\n'.join(row[-1] for row in cursor.fetchall())))
+        return plans
+
+    def plan_for(self, func, table, *args, **kwargs):
+        """The plan of the one query ``func`` runs that selects from ``table``."""
+        matches = [plan for sql, plan in self.plans(func, *args, **kwargs) if f'FROM "{table}"' in sql]
+        self.assertEqual(len(matches), 1, matches)
+        return matches[0]
+
+    def assertUsesIndex(self, plan, index):
+        # Matches "USING INDEX x" and "USING COVERING INDEX x".
+        self.assertRegex(plan, rf'USING (COVERING )?INDEX {index}\b')
+
+    def assertNoSort(self, plan):
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_question_bank_reads_by_category(self):
+        question_bank._local_banks.clear()
+        plans = dict(self.plans(question_bank.build_bank, self.category.id))
+        question_plan = next(plan for sql, plan in plans.items() if sql.startswith('SELECT "Quiz_App_question"'))
+        answer_plan = next(plan for sql, plan in plans.items() if sql.startswith('SELECT "Quiz_App_answer"'))
+        self.assertUsesIndex(question_plan, 'question_cat_created')
+        self.assertUsesIndex(answer_plan, 'question_cat_created')
+        self.assertUsesIndex(answer_plan, 'answer_question_correct')
+
+    def test_host_question_list_reads_one_page_in_index_order(self):
+        self.client.force_login(User.objects.create_user('host', is_staff=True))
+        url = reverse('host_question_list')
+        plan = self.plan_for(self.client.get, 'Quiz_App_question', url, {'category': self.category.id})
+        self.assertUsesIndex(plan, 'question_cat_created')
+        self.assertNoSort(plan)
+        plan = self.plan_for(self.client.get, 'Quiz_App_question', url)
+        self.assertUsesIndex(plan, 'question_created')
+        self.assertNoSort(plan)
+
+    def test_correct_answer_lookup(self):
+        question = self.questions[0]
+        plan = self.plan_for(lambda: question.answers.get(is_correct=True), 'Quiz_App_answer')
+        self.assertRegex(plan, r'SEARCH Quiz_App_answer USING (COVERING )?INDEX answer_(one_correct_per_question|question_correct)')
+
+    def test_latest_attempt_per_category(self):
+        plan = self.plan_for(
+            lambda: Attempt.objects.filter(user=self.user, category=self.category).order_by('-finished_at').first(),
+            'Quiz_App_attempt',
+        )
+        self.assertUsesIndex(plan, 'attempt_user_cat_finished')
+        self.assertNoSort(plan)
+
+    def test_one_correct_answer_per_question(self):
+        question = self.questions[0]
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Answer.objects.create(question=question, answer_text='Also right', is_correct=True)
+        # Any number of wrong answers is fine.
+        Answer.objects.create(question=question, answer_text='Also wrong', is_correct=False)
+
+    def test_answer_formset_moves_the_correct_answer(self):
+        question = self.questions[0]
+        answers = list(question.answers.order_by('id'))
+        data = {
+            'answers-TOTAL_FORMS': str(len(answers)), 'answers-INITIAL_FORMS': str(len(answers)),
+            'answers-MIN_NUM_FORMS': '0', 'answers-MAX_NUM_FORMS': '1000',
+        }
+        for i, answer in enumerate(answers):
+            data[f'answers-{i}-id'] = str(answer.id)
+            data[f'answers-{i}-answer_text'] = answer.answer_text
+        # Make the last answer the correct one, then move it back to the
+        # first, which the formset saves before it reaches the last.
+        Answer.objects.filter(question=question).update(is_correct=False)
+        Answer.objects.filter(pk=answers[-1].pk).update(is_correct=True)
+        data['answers-0-is_correct'] = 'on'
+        formset = forms.AnswerFormSet(data, instance=question)
+        self.assertTrue(formset.is_valid(), formset.errors)
+        formset.save()
+        self.assertEqual(question.answers.get(is_correct=True).id, answers[0].id)
+
+        data[f'answers-{len(answers) - 1}-is_correct'] = 'on'
+        formset = forms.AnswerFormSet(data, instance=question)
+        self.assertFalse(formset.is_valid())
+        self.assertIn('Only one answer can be marked correct.', formset.non_form_errors())
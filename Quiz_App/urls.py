@@ -15,16 +15,32 @@ urlpatterns = [
     # Quiz URLs
     path('quiz/<int:category_id>/', views.quiz, name='quiz'),
     path('results/<int:category_id>/', views.results, name='results'),
+    # Single-page quiz: one request for all questions, one for all answers
+    path('quiz/<int:category_id>/single/', views.quiz_single, name='quiz_single'),
+    path('quiz/<int:category_id>/questions.json', views.quiz_questions_json, name='quiz_questions_json'),
+    path('quiz/<int:category_id>/submit.json', views.quiz_submit_json, name='quiz_submit_json'),
+    # Leaderboards
+    path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('leaderboard/<int:category_id>/', views.leaderboard_view, name='category_leaderboard'),
     # Host admin panel
-    path('host/', host_views.dashboard, name='host_dashboard'),
-    path('host/categories/', host_views.category_list, name='host_category_list'),
-    path('host/categories/create/', host_views.category_create, name='host_category_create'),
-    path('host/categories/<int:pk>/edit/', host_views.category_edit, name='host_category_edit'),
-    path('host/categories/<int:pk>/delete/', host_views.category_delete, name='host_category_delete'),
+    path('host/', host_views.DashboardView.as_view(), name='host_dashboard'),
+    path('host/metrics/', host_views.MetricsView.as_view(), name='host_metrics'),
+    path('host/categories/', host_views.CategoryListView.as_view(), name='host_category_list'),
+    path('host/categories/create/', host_views.CategoryFormView.as_view(), name='host_category_create'),
+    path('host/categories/<int:pk>/edit/', host_views.CategoryFormView.as_view(), name='host_category_edit'),
+    path('host/categories/<int:pk>/delete/', host_views.CategoryDeleteView.as_view(), name='host_category_delete'),
 
-    path('host/questions/', host_views.question_list, name='host_question_list'),
-    path('host/questions/create/', host_views.question_create, name='host_question_create'),
-    path('host/questions/<int:pk>/edit/', host_views.question_edit, name='host_question_edit'),
-    path('host/questions/<int:pk>/delete/', host_views.question_delete, name='host_question_delete'),
+    path('host/questions/', host_views.QuestionListView.as_view(), name='host_question_list'),
+    path('host/questions/export/', host_views.QuestionExportView.as_view(), name='host_question_export'),
+    path('host/questions/create/', host_views.QuestionCreateView.as_view(), name='host_question_create'),
+    path('host/questions/<int:pk>/edit/', host_views.QuestionEditView.as_view(), name='host_question_edit'),
+    path('host/questions/<int:pk>/delete/', host_views.QuestionDeleteView.as_view(), name='host_question_delete'),
+    path('host/categories/<int:category_id>/bulk-edit/', host_views.QuestionBulkEditView.as_view(), name='host_question_bulk_edit'),
+    path('host/questions/bulk.json', host_views.QuestionBulkApiView.as_view(), name='host_question_bulk_api'),
+    # Background jobs
+    path('host/jobs/', host_views.JobListView.as_view(), name='host_job_list'),
+    path('host/jobs/import/', host_views.JobImportView.as_view(), name='host_job_import'),
+    path('host/jobs/<int:pk>.json', host_views.JobStatusView.as_view(), name='host_job_status'),
+    path('host/jobs/<int:pk>/download/', host_views.JobDownloadView.as_view(), name='host_job_download'),
     # (Proctoring routes removed)
 ]
@@ -1,19 +1,54 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from .models import Category, Question, Answer
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, aget_object_or_404
+from .models import Category
 from .forms import RegistrationForm, LoginForm
-from django.contrib.auth import login, logout, authenticate
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
-import random
-from django.http import JsonResponse
+import json
+import uuid
+from django.core import signing
+from django.db import IntegrityError
+from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from datetime import datetime, timezone as dt_timezone
+from . import attempts, catalogue, leaderboard, question_bank, quiz_state, scoring, shuffle
 
-def home(request):
+# The candidate-facing quiz views below are async: under an ASGI server a
+# worker can hold many slow connections at once without a thread for each.
+# They read banks, answer keys and quiz state through the async cache API and
+# only hand database writes (and cold cache builds) to a thread.
+
+
+async def _auser(request):
+    """
+    Load the user without blocking and set it as ``request.user``, so that
+    templates and context processors do not load it again synchronously.
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def home(request):
     """
     If the user is authenticated, show the quiz categories.
     Otherwise, redirect them to the login page.
+
+    The listing is a cached template fragment (see catalogue.py): while it
+    is warm the category query is never evaluated.
     """
-    if request.user.is_authenticated:
-        categories = Category.objects.all()
-        return render(request, 'home.html', {'categories': categories})
+    user = await _auser(request)
+    if user.is_authenticated:
+        catalogue_version, user_version = await catalogue.aversions(user.pk)
+        # Rendered in a thread: the template evaluates the category queryset
+        # when the fragment is not cached.
+        return await sync_to_async(render)(request, 'home.html', {
+            'categories': catalogue.categories_for(user),
+            'catalogue_version': catalogue_version,
+            'user_version': user_version,
+            'cache_alias': catalogue.cache_alias(),
+            'fragment_timeout': catalogue.FRAGMENT_TIMEOUT,
+        })
     return redirect('login')
 
 
@@ -44,12 +79,10 @@ def login_view(request):
     if request.method == 'POST':
         form = LoginForm(request, data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                return redirect('home')
+            # The form has already authenticated the user; doing it again
+            # would hash the password a second time.
+            login(request, form.get_user())
+            return redirect('home')
     else:
         form = LoginForm()
     return render(request, 'login.html', {'form': form})
@@ -65,58 +98,69 @@ def logout_view(request):
 # --- Quiz Views (Protected) ---
 
 @login_required
-def quiz(request, category_id):
+async def quiz(request, category_id):
     """
     Handles the main quiz logic. Requires user to be logged in.
+    Questions come from the cached question bank and progress is kept in a
+    compact QuizState, so answering a question causes no database writes.
     """
-    category = get_object_or_404(Category, id=category_id)
-
-    if 'quiz_questions' not in request.session or request.session.get('current_category_id') != category_id:
-        questions = list(category.questions.all())
-        random.shuffle(questions)
-        request.session['quiz_questions'] = [q.id for q in questions]
-        request.session['score'] = 0
-        request.session['question_number'] = 0
-        request.session['current_category_id'] = category_id
+    user = await _auser(request)
+    bank = await question_bank.aget_bank(category_id)
+    if bank is None:
+        raise Http404('No Category matches the given query.')
+    category = {'id': bank.category_id, 'name': bank.category_name}
 
-    question_ids = request.session['quiz_questions']
-    question_number = request.session['question_number']
+    state = await quiz_state.aload(request)
+    if state is None or state.category_id != bank.category_id:
+        state = quiz_state.QuizState.start(bank, user.pk)
 
-    if question_number >= len(question_ids):
-        return redirect('results', category_id=category_id)
-
-    current_question_id = question_ids[question_number]
-    question = get_object_or_404(Question, id=current_question_id)
+    # Carries on over the current questions if the category changed, which
+    # needs the answers given so far to leave them out.
+    answered = () if state.matches(bank) else await quiz_state.aload_answers(state)
+    question = state.next_question(bank, answered)
+    if question is None:
+        return await quiz_state.asave(request, redirect('results', category_id=category_id), state)
 
     if request.method == 'POST':
-        selected_answer_id = request.POST.get('answer')
-        if selected_answer_id:
-            selected_answer = get_object_or_404(Answer, id=selected_answer_id)
-            if selected_answer.is_correct:
-                request.session['score'] += question.marks
-
-        request.session['question_number'] += 1
-        return redirect('quiz', category_id=category_id)
+        answer_key = await scoring.aget_answer_key(category_id)
+        try:
+            graded = answer_key.grade(question.id, scoring.parse_id(request.POST.get('answer')))
+        except scoring.InvalidAnswer as exc:
+            return HttpResponseBadRequest(str(exc))
+        state.record(question.id, graded.answer_id)
+        return await quiz_state.asave(request, redirect('quiz', category_id=category_id), state)
 
     context = {
         'question': question,
         'category': category,
-        'total_questions': len(question_ids)
+        'question_number': state.cursor + 1,
+        'total_questions': state.total
     }
-    return render(request, 'quiz.html', context)
-    return render(request, 'quiz.html', context)
+    return await quiz_state.asave(request, render(request, 'quiz.html', context), state)
 
 @login_required
-def results(request, category_id):
+async def results(request, category_id):
     """
-    Displays the final quiz results. Requires user to be logged in.
+    Displays the final quiz results and stores the finished attempt.
+    Leaving the quiz early finishes it: the questions not reached count as
+    skipped. Requires user to be logged in.
     """
-    category = get_object_or_404(Category, id=category_id)
-    score = request.session.get('score', 0)
-    total_questions = len(request.session.get('quiz_questions', []))
-    
-    if total_questions > 0:
-        percentage_raw = (score / total_questions) * 100
+    await _auser(request)
+    category = await aget_object_or_404(Category, id=category_id)
+    state = await quiz_state.aload(request)
+    if state is None or state.category_id != category_id:
+        state = None
+
+    # The state carries no score; it is worked out as the attempt is stored.
+    attempt = None
+    if state is not None and state.cursor:
+        attempt = await _record_state_attempt(request, state)
+    score = attempt.score if attempt else 0
+    total_questions = attempt.total_questions if attempt else 0
+    total_marks = attempt.total_marks if attempt else 0
+
+    if total_marks > 0:
+        percentage_raw = (score / total_marks) * 100
         percentage = round(percentage_raw)
         circumference = 2 * 3.14159 * 45
         stroke_dasharray = (percentage_raw / 100) * circumference
@@ -131,9 +175,180 @@ def results(request, category_id):
         'percentage': percentage,
         'percentage_for_svg': stroke_dasharray,
     }
-    
-    for key in ['quiz_questions', 'score', 'question_number', 'current_category_id']:
-        if key in request.session:
-            del request.session[key]
 
-    return render(request, 'results.html', context)
+    response = render(request, 'results.html', context)
+    if state is not None:
+        await quiz_state.aclear(request, response, state)
+    return response
+
+
+async def _record_state_attempt(request, state):
+    """
+    Grade the quiz kept in the quiz state against the current answer key and
+    store it as an Attempt. As in the single-page quiz, every question of the
+    draw counts: questions not reached yet are scored as skipped. Questions
+    deleted since they were answered are left out; an answer whose choice was
+    deleted counts as skipped.
+    """
+    bank = await question_bank.aget_bank(state.category_id)
+    answer_key = await scoring.aget_answer_key(state.category_id)
+    if bank is None or answer_key is None:
+        return None
+    answered = await quiz_state.aload_answers(state)
+    graded = []
+    for question_id, answer_id in answered:
+        if question_id not in answer_key:
+            continue
+        try:
+            graded.append(answer_key.grade(question_id, answer_id))
+        except scoring.InvalidAnswer:
+            graded.append(answer_key.grade(question_id, None))
+    graded.extend(answer_key.grade(q.id, None) for q in state.remaining(bank, answered) if q.id in answer_key)
+    return await sync_to_async(attempts.record_attempt)(
+        request.user,
+        state.category_id,
+        graded,
+        total_marks=sum(answer_key.marks_for(g.question_id) for g in graded),
+        started_at=datetime.fromtimestamp(state.started_at, tz=dt_timezone.utc),
+    )
+
+
+# --- Single-page Quiz Mode (Protected) ---
+
+BATCH_TOKEN_SALT = 'quiz.batch'
+# How long a candidate has to submit a single-page quiz, in seconds.
+BATCH_TOKEN_MAX_AGE = 60 * 60 * 6
+
+
+@login_required
+async def quiz_single(request, category_id):
+    """
+    Renders the single-page quiz. The page loads every question in one
+    request and submits all answers in one request.
+    """
+    await _auser(request)
+    bank = await question_bank.aget_bank(category_id)
+    if bank is None:
+        raise Http404('No Category matches the given query.')
+    category = {'id': bank.category_id, 'name': bank.category_name}
+    return render(request, 'quiz_single.html', {'category': category})
+
+
+@login_required
+async def quiz_questions_json(request, category_id):
+    """
+    Returns the attempt's shuffled question set as JSON, without correct
+    answers.
+    The response carries a signed token recording which questions were
+    served, so the submission can be graded against exactly that set, and a
+    nonce, so it can be submitted only once.
+    """
+    user = await _auser(request)
+    bank = await question_bank.aget_bank(category_id)
+    if bank is None:
+        raise Http404('No Category matches the given query.')
+
+    questions = list(bank.draw(shuffle.new_seed()))
+    token = signing.dumps(
+        {'c': category_id, 'u': user.pk, 'q': [q.id for q in questions], 'n': uuid.uuid4().hex},
+        salt=BATCH_TOKEN_SALT,
+        compress=True,
+    )
+    return JsonResponse({
+        'category': {'id': bank.category_id, 'name': bank.category_name},
+        'token': token,
+        'questions': [
+            {
+                'id': q.id,
+                'question_text': q.question_text,
+                'marks': q.marks,
+                'answers': [{'id': a.id, 'answer_text': a.answer_text} for a in q.answers],
+            }
+            for q in questions
+        ],
+    })
+
+
+@login_required
+@require_POST
+async def quiz_submit_json(request, category_id):
+    """
+    Grades a whole quiz in one pass. Expects a JSON body of the form
+    ``{"token": "...", "answers": {"<question id>": <answer id>, ...}}``.
+    Unanswered questions score zero. A token that was already submitted is
+    rejected with 409, so the results of one quiz cannot be replayed into
+    further attempts.
+    """
+    user = await _auser(request)
+    try:
+        payload = json.loads(request.body)
+        token = signing.loads(payload['token'], salt=BATCH_TOKEN_SALT, max_age=BATCH_TOKEN_MAX_AGE)
+        nonce = token['n']
+        submitted = {int(qid): aid for qid, aid in payload.get('answers', {}).items()}
+    except (ValueError, KeyError, TypeError, AttributeError, signing.BadSignature):
+        return JsonResponse({'error': 'Malformed or expired submission.'}, status=400)
+    if token['c'] != category_id or token['u'] != user.pk:
+        return JsonResponse({'error': 'This submission belongs to another quiz.'}, status=400)
+
+    answer_key = await scoring.aget_answer_key(category_id)
+    if answer_key is None:
+        raise Http404('No Category matches the given query.')
+
+    # Questions deleted since the quiz was served are left out of the result.
+    question_ids = [qid for qid in token['q'] if qid in answer_key]
+    try:
+        graded = [answer_key.grade(qid, scoring.parse_id(submitted.get(qid))) for qid in question_ids]
+    except scoring.InvalidAnswer as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    try:
+        attempt = await sync_to_async(attempts.record_attempt)(
+            user,
+            category_id,
+            graded,
+            total_marks=sum(answer_key.marks_for(qid) for qid in question_ids),
+            nonce=nonce,
+        )
+    except IntegrityError:
+        return JsonResponse({'error': 'This quiz has already been submitted.'}, status=409)
+    return JsonResponse({
+        'attempt_id': attempt.id,
+        'score': attempt.score,
+        'total_marks': attempt.total_marks,
+        'total_questions': attempt.total_questions,
+        'results': [{'question_id': g.question_id, 'is_correct': g.is_correct} for g in graded],
+    })
+
+
+# --- Leaderboards (Protected) ---
+
+@login_required
+def leaderboard_view(request, category_id=None):
+    """
+    Shows the top of a category's leaderboard, or the global one, and the
+    current user's rank. Served from the cached board: no queries when warm.
+    """
+    title = 'All categories'
+    if category_id is not None:
+        bank = question_bank.get_bank(category_id)
+        if bank is None:
+            raise Http404('No Category matches the given query.')
+        title = bank.category_name
+
+    board = leaderboard.get_board(category_id)
+    rows = [
+        {'rank': rank, 'username': username, 'score': points / 100, 'is_me': user_id == request.user.pk}
+        for rank, user_id, username, points in board.ranked_top()
+    ]
+    my_points = board.points.get(request.user.pk)
+    context = {
+        'title': title,
+        'category_id': category_id,
+        'rows': rows,
+        'entrants': len(board),
+        'my_rank': board.rank(request.user.pk),
+        'my_score': None if my_points is None else my_points / 100,
+        # The global board sums percentages across categories.
+        'is_global': category_id is None,
+    }
+    return render(request, 'leaderboard.html', context)
@@ -3,14 +3,28 @@ ASGI config for Quiz_Base project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+This is how the site is served in production (see the Dockerfile and
+docker-compose.yml): uvicorn worker processes, each running one event loop.
+The candidate-facing quiz views are async, so a worker holds many slow
+connections at once instead of one thread per candidate.
+
+With DEBUG on, static files are served by Django as ``runserver`` would;
+otherwise serve STATIC_ROOT from a reverse proxy.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Quiz_Base.settings')
 
 application = get_asgi_application()
+
+if settings.DEBUG:
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    application = ASGIStaticFilesHandler(application)
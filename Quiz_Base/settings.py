@@ -34,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Opt-in per-request profiling; removes itself unless QUIZ_PROFILING is set.
+    'Quiz_App.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,13 +69,109 @@ WSGI_APPLICATION = 'Quiz_Base.wsgi.application'
 # ==============================================================================
 # DATABASE
 # ==============================================================================
-# Note: sqlite3 is not recommended for production. Consider PostgreSQL or MySQL.
+# SQLite, tuned for serving quizzes unless QUIZ_DB_PROFILE=default, which
+# keeps Django's stock settings (used as the baseline by
+# ``manage.py benchmark_sqlite``). The 'production' profile:
+#
+# * runs in WAL mode, so readers never block the writer or each other, and
+#   with synchronous=NORMAL, which only fsyncs at checkpoints; a power cut
+#   can lose the last transactions but never corrupts the database;
+# * waits up to busy_timeout ms for the write lock instead of failing, and
+#   takes it when a transaction begins (BEGIN IMMEDIATE), so a transaction
+#   that reads and then writes cannot deadlock against another one;
+# * memory-maps the file and keeps a larger page cache per connection;
+# * keeps connections open between requests for QUIZ_DB_CONN_MAX_AGE
+#   seconds. Set it to 0 under uvicorn, where every request runs in a new
+#   thread and cannot reuse a connection (see docker-compose.yml).
+#
+# WAL keeps two files next to the database (-wal and -shm); processes that
+# share the database must share its directory, not just the file.
+#
+# Unlike the other pragmas, journal_mode=WAL is stored in the database file
+# itself. It is therefore only applied to a database placed with
+# QUIZ_DB_PATH (the ./data volume in docker-compose.yml); the development
+# db.sqlite3 tracked in the repository keeps its rollback journal and the
+# default synchronous=FULL, which is the safe setting without WAL.
+QUIZ_DB_PROFILE = os.environ.get('QUIZ_DB_PROFILE', 'production')
+QUIZ_DB_PATH = os.environ.get('QUIZ_DB_PATH')
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -32000,  # KiB
+    'temp_store': 'MEMORY',
+}
+if not QUIZ_DB_PATH:
+    del SQLITE_PRAGMAS['journal_mode'], SQLITE_PRAGMAS['synchronous']
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': QUIZ_DB_PATH or BASE_DIR / 'db.sqlite3',
     }
 }
+if QUIZ_DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('QUIZ_DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+
+
+# ==============================================================================
+# CACHES
+# ==============================================================================
+# The local-memory cache is per process, which is fine for runserver and the
+# tests. With several uvicorn workers, or the background job worker next to
+# them, every process would keep its own version tokens and invalidations
+# (a host editing questions, an import, a recount) would not reach the
+# others. Set QUIZ_CACHE_URL to a Redis URL (redis://host:6379/0) to share
+# one cache between all of them, as docker-compose.yml does; the quiz
+# app's system check warns when WEB_CONCURRENCY > 1 without it.
+QUIZ_CACHE_URL = os.environ.get('QUIZ_CACHE_URL', '')
+if QUIZ_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': QUIZ_CACHE_URL,
+            'KEY_PREFIX': 'quiz',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'quiz-default',
+        }
+    }
+
+# Cache alias used by the quiz app for question banks and other derived data.
+QUIZ_CACHE_ALIAS = 'default'
+
+# Where in-progress quiz state is kept: 'cache' (QUIZ_CACHE_ALIAS, keyed by a
+# token in a cookie) or, as an opt-in, 'cookie' (a signed cookie, which lets a
+# candidate resend an older cookie to rewind the quiz). The answers given are
+# kept in QUIZ_CACHE_ALIAS either way. See Quiz_App/quiz_state.py.
+QUIZ_STATE_BACKEND = os.environ.get('QUIZ_STATE_BACKEND', 'cache')
+# Seconds before an unfinished quiz is forgotten.
+QUIZ_STATE_TTL = 60 * 60 * 6
+
+# Per-request profiling (query count, SQL and template time, duplicate
+# queries, cache hit ratio) aggregated by URL name and served to hosts at
+# /host/metrics/. See Quiz_App/middleware.py. Response headers with the
+# figures are sent in DEBUG; requests slower than QUIZ_PROFILING_SLOW_MS
+# are logged.
+QUIZ_PROFILING = os.environ.get('QUIZ_PROFILING', '') == '1'
+QUIZ_PROFILING_HEADERS = DEBUG
+QUIZ_PROFILING_SLOW_MS = 500
+
+# Background jobs queued by the host panel and run by
+# ``manage.py run_quiz_worker`` (see Quiz_App/jobs.py). Uploaded imports and
+# finished exports are kept in QUIZ_JOB_DIR until the job is purged.
+QUIZ_JOB_DIR = os.environ.get('QUIZ_JOB_DIR', str(BASE_DIR / 'media' / 'jobs'))
 
 
 # ==============================================================================
@@ -6,7 +6,7 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Quiz_Base.settings')
 django.setup()
 
-from Quiz_App.models import Category, Question, Answer
+from Quiz_App.importer import QuestionRecord, import_questions
 
 def populate_audio_engineering_quiz():
     """
@@ -102,49 +102,20 @@ def populate_audio_engineering_quiz():
 
     print("Starting to populate the Audio Engineering quiz...")
 
-    # --- 2. Create or Get the Category ---
-    category, created = Category.objects.get_or_create(name="Audio Engineering")
-
-    # === FIX IS HERE ===
-    if created:
-        print(f"Category '{category.name}' created.")
-        # If the category is new, there are no existing questions.
-        existing_questions = set()
-    else:
-        print(f"Category '{category.name}' already exists.")
-        # If the category exists, get the set of questions to avoid duplicates.
-        existing_questions = set(Question.objects.filter(category=category).values_list('question_text', flat=True))
-
-
-    # --- 3. Loop Through Questions and Create Database Objects ---
-    new_questions_added = 0
-    for q_data in audio_questions:
-        question_text = q_data["question"]
-        
-        # This check will now work correctly in all cases
-        if question_text not in existing_questions:
-            question_marks = q_data["marks"]
-
-            # Create the Question object
-            question = Question.objects.create(
-                category=category,
-                question_text=question_text,
-                marks=question_marks
-            )
-            print(f"  - Creating question: {question.question_text}")
-            new_questions_added += 1
-
-            # Create the corresponding Answer objects
-            for a_text, is_correct in q_data["answers"]:
-                Answer.objects.create(
-                    question=question,
-                    answer_text=a_text,
-                    is_correct=is_correct
-                )
+    # --- 2. Import through the bulk pipeline ---
+    # The category is created if needed, questions that already exist in it
+    # are skipped, and everything is written with a couple of bulk inserts.
+    records = (
+        QuestionRecord("Audio Engineering", q_data["question"], q_data["marks"], tuple(q_data["answers"]), f"question {i}")
+        for i, q_data in enumerate(audio_questions, start=1)
+    )
+    result = import_questions(records)
 
     print("\nPopulation complete!")
-    if new_questions_added > 0:
-        print(f"Added {new_questions_added} new questions to the '{category.name}' category.")
+    for error in result.errors:
+        print(f"  - Skipped invalid {error}")
+    if result.created > 0:
+        print(f"Added {result.created} new questions to the 'Audio Engineering' category.")
     else:
         print("No new questions were added as they already exist in the database.")
 